@@ -0,0 +1,165 @@
+# Training volume statistics computed with NumPy from the logged sets.
+# The sets are read in bulk into column arrays and summed into one row per muscle group and one
+# column per week. Later refreshes only read the sets saved since, unless some were deleted.
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+WEEK = 7 * 24 * 3600
+# Monday 1970-01-05 00:00 UTC, weeks start on Mondays
+WEEK_ORIGIN = 4 * 24 * 3600
+# Weeks summed by the rolling volume and averaged by the frequency
+ROLLING_WEEKS = 4
+# Weeks fitted by the trend line
+TREND_WEEKS = 12
+
+# Logged sets in a range of set ids. Session times and muscle groups are looked up in NumPy,
+# which is faster than joining them in for every set. Sets of a deleted exercise count as
+# exercise 0, which has no muscle group.
+SETS_SQL = """
+    SELECT session_id, COALESCE(exercise_id, 0), COALESCE(reps, 0), COALESCE(weight, 0)
+    FROM session_sets
+    WHERE id > ? AND id <= ?
+"""
+SESSIONS_SQL = "SELECT id, started_at FROM workout_sessions ORDER BY id"
+EXERCISES_SQL = "SELECT 0, 0 UNION ALL SELECT id, COALESCE(muscle_group_id, 0) FROM exercises ORDER BY 1"
+
+SET_DTYPE = np.dtype([("session", "i8"), ("exercise", "i8"), ("reps", "f8"), ("weight", "f8")])
+
+# Statistics of one muscle group: tonnage is reps x kg; rolling_volume the tonnage of the last
+# ROLLING_WEEKS weeks; frequency the sessions per week training the group over those weeks;
+# trend the slope of the weekly tonnage over the last TREND_WEEKS weeks, in kg per week
+GroupStats = namedtuple("GroupStats", "group_id tonnage sets rolling_volume frequency trend")
+# Statistics of every trained muscle group, by decreasing rolling volume
+TrainingStats = namedtuple("TrainingStats", "weeks sets tonnage groups")
+
+
+# Sums over the last n columns at every column of a matrix
+def rolling_sum(matrix, n):
+    totals = np.cumsum(matrix, axis=1)
+    totals[:, n:] -= totals[:, :-n].copy()
+    return totals
+
+
+# Least squares slope of every row of a matrix against the column index
+def trend_slopes(matrix):
+    x = np.arange(matrix.shape[1], dtype=float)
+    x -= x.mean()
+    denominator = (x * x).sum()
+    if not denominator:
+        return np.zeros(matrix.shape[0])
+    return (matrix - matrix.mean(axis=1, keepdims=True)) @ x / denominator
+
+
+class TrainingVolume:
+    def __init__(self, utc_offset=None):
+        # Weeks follow local time, with the offset fixed when created so they never shift
+        self.utc_offset = time.localtime().tm_gmtoff if utc_offset is None else utc_offset
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._last_id = 0
+        self._count = 0
+        self._group_index = {}
+        self._first_week = None
+        self._tonnage = np.zeros((0, 0))
+        self._sets = np.zeros((0, 0))
+        self._sessions = np.zeros((0, 0))
+        self._session_keys = np.zeros(0, dtype=np.int64)
+
+    # Read the sets saved since the last refresh, or all of them when some were deleted.
+    # Returns the number of sets read; safe to call from a query thread.
+    def refresh(self, conn):
+        with self._lock:
+            # Every read sees the same snapshot, so no session or exercise goes missing in between
+            conn.execute("BEGIN")
+            try:
+                total, max_id = conn.execute(
+                    "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM session_sets").fetchone()
+                sets, times, groups = self._read(conn, self._last_id, max_id)
+                if total != self._count + len(sets):
+                    self._reset()
+                    sets, times, groups = self._read(conn, 0, max_id)
+            finally:
+                conn.rollback()
+            self._add(sets, times, groups)
+            self._count = total
+            self._last_id = max_id
+            return len(sets)
+
+    # Sets with the start time of their session and the muscle group of their exercise
+    def _read(self, conn, after_id, max_id):
+        sets = np.fromiter(conn.execute(SETS_SQL, (after_id, max_id)).fetchall(), dtype=SET_DTYPE)
+        if not len(sets):
+            return sets, np.zeros(0), np.zeros(0, dtype=np.int64)
+        sessions = np.array(conn.execute(SESSIONS_SQL).fetchall(), dtype=float).reshape(-1, 2)
+        exercises = np.array(conn.execute(EXERCISES_SQL).fetchall(), dtype=np.int64).reshape(-1, 2)
+        times = sessions[np.searchsorted(sessions[:, 0], sets["session"]), 1]
+        groups = exercises[np.searchsorted(exercises[:, 0], sets["exercise"]), 1]
+        return sets, times, groups
+
+    def _week(self, timestamps):
+        return np.floor_divide(np.asarray(timestamps) + self.utc_offset - WEEK_ORIGIN, WEEK).astype(np.int64)
+
+    # Add sets to the weekly sums of their muscle group
+    def _add(self, sets, times, group_ids):
+        if not len(sets):
+            return
+        group_ids, inverse = np.unique(group_ids, return_inverse=True)
+        index = np.array([self._group_index.setdefault(int(g), len(self._group_index)) for g in group_ids])
+        groups = index[inverse]
+        weeks = self._week(times)
+        self._grow(weeks.min(), weeks.max())
+        columns = weeks - self._first_week
+        shape = self._tonnage.shape
+        cells = np.ravel_multi_index((groups, columns), shape)
+        size = shape[0] * shape[1]
+        self._tonnage += np.bincount(cells, sets["reps"] * sets["weight"], size).reshape(shape)
+        self._sets += np.bincount(cells, minlength=size).reshape(shape)
+
+        # A session counts once per muscle group, even when its sets arrive in several refreshes
+        keys = (sets["session"] << 32) + groups
+        keys, first = np.unique(keys, return_index=True)
+        new = ~np.isin(keys, self._session_keys, assume_unique=True)
+        self._sessions += np.bincount(cells[first[new]], minlength=size).reshape(shape)
+        self._session_keys = np.union1d(self._session_keys, keys[new])
+
+    # Widen the matrices to every known muscle group and to the weeks first to last
+    def _grow(self, first, last):
+        if self._first_week is None:
+            self._first_week = first
+        rows = len(self._group_index)
+        before = max(0, self._first_week - first)
+        after = max(0, last - (self._first_week + self._tonnage.shape[1] - 1))
+        if rows == self._tonnage.shape[0] and not before and not after:
+            return
+        pad = ((0, rows - self._tonnage.shape[0]), (before, after))
+        self._tonnage = np.pad(self._tonnage, pad)
+        self._sets = np.pad(self._sets, pad)
+        self._sessions = np.pad(self._sessions, pad)
+        self._first_week -= before
+
+    # Statistics per muscle group up to the week of now
+    def stats(self, now=None):
+        with self._lock:
+            if not self._group_index:
+                return TrainingStats(0, 0, 0.0, [])
+            current = int(self._week(time.time() if now is None else now))
+            self._grow(current, current)
+            end = current - self._first_week + 1
+            tonnage = self._tonnage[:, :end]
+            rolling = rolling_sum(tonnage, ROLLING_WEEKS)[:, -1]
+            frequency = self._sessions[:, max(0, end - ROLLING_WEEKS):end].sum(axis=1) / ROLLING_WEEKS
+            trend = trend_slopes(tonnage[:, -TREND_WEEKS:])
+            totals = tonnage.sum(axis=1)
+            sets = self._sets[:, :end].sum(axis=1)
+            group_ids = np.array(list(self._group_index))
+            order = np.lexsort((-totals, -rolling))
+            groups = [GroupStats(int(group_ids[i]), float(totals[i]), int(sets[i]), float(rolling[i]),
+                                 float(frequency[i]), float(trend[i]))
+                      for i in order if sets[i]]
+            return TrainingStats(end, int(sets.sum()), float(totals.sum()), groups)
+
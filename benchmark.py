@@ -0,0 +1,392 @@
+# Benchmarks of the data layer and of list building, runnable on a machine without a display.
+# Each size seeds a fresh database through the app schema, then times the catalog and screen
+# queries, the training statistics, weight saving, a sync of one change, a cold WorkoutApp.build
+# and the building of the executor lists.
+#
+#   python benchmark.py                                  every size, written to benchmark.json
+#   python benchmark.py --sizes 10,1000 --no-ui          data layer only
+#   python benchmark.py --baseline benchmark-base.json   compare with an earlier run
+#
+# Comparing with a baseline exits with status 1 when a median got slower than the threshold.
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from analytics import TrainingVolume
+from database import (Catalog, ConnectionManager, WeightWriteQueue, apply_migrations,
+                      load_workout_detail, load_workout_run, record_weights, search_exercises)
+from progression import ProgressionEngine
+from sync import SyncClient
+from sync_server import LocalTransport, SyncServer
+
+RESULTS_VERSION = 1
+
+# Muscle groups and exercises of each seeded database
+SIZES = (10, 1000, 10000)
+# Weight samples of each seeded database
+WEIGHT_ROWS = 100000
+# Exercises are spread over this many groups, so a group holds a long list
+BUSY_GROUPS = 10
+# Exercises of the first workout, the one opened by the preview and execution benchmarks
+WORKOUT_EXERCISES = 1000
+# Exercises of every other workout
+OTHER_WORKOUT_EXERCISES = 10
+# Logged workouts of each seeded database: five years of four sessions a week
+SESSION_WEEKS = 5 * 52
+SESSIONS_PER_WEEK = 4
+SETS_PER_SESSION = 20
+# Weight edits queued per save_weight sample
+WEIGHT_EDITS = 1000
+
+REPEAT = 7
+# Fresh app processes per size, each gives one cold build sample
+UI_RUNS = 3
+# A median this many times slower than the baseline is a regression
+THRESHOLD = 1.2
+
+
+# Fill a new database through the app schema
+def seed_database(path, size, weight_rows=WEIGHT_ROWS):
+    rng = random.Random(size)
+    conn = sqlite3.connect(path)
+    try:
+        apply_migrations(conn)
+        busy_groups = min(size, BUSY_GROUPS)
+        workouts = max(1, size // 100)
+        conn.executemany("INSERT INTO muscle_groups (id, name) VALUES (?, ?)",
+                         [(i, f"Gruppo {i:05d}") for i in range(1, size + 1)])
+        conn.executemany("INSERT INTO exercises (id, name, muscle_group_id) VALUES (?, ?, ?)",
+                         [(i, f"Esercizio {i:05d}", i % busy_groups + 1) for i in range(1, size + 1)])
+        conn.executemany("INSERT INTO workouts (id, name, timer) VALUES (?, ?, ?)",
+                         [(i, f"Scheda {i}", 60) for i in range(1, workouts + 1)])
+        workout_exercises = [(1, rng.randint(1, size), 4, 8) for _ in range(min(size, WORKOUT_EXERCISES))]
+        workout_exercises += [(w, rng.randint(1, size), 3, 10)
+                              for w in range(2, workouts + 1) for _ in range(OTHER_WORKOUT_EXERCISES)]
+        conn.executemany("INSERT INTO workout_exercises (workout_id, exercise_id, sets, reps) VALUES (?, ?, ?, ?)",
+                         workout_exercises)
+        seed_sessions(conn, size, rng)
+        start = time.time() - 365 * 24 * 3600
+        record_weights(conn, [(rng.randint(1, size), round(rng.uniform(10, 150), 1), start + i * 300)
+                              for i in range(weight_rows)])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# Sessions of the last SESSION_WEEKS weeks, each with SETS_PER_SESSION sets
+def seed_sessions(conn, size, rng):
+    exercises = min(size, 100)
+    start = time.time() - SESSION_WEEKS * 7 * 24 * 3600
+    sessions = SESSION_WEEKS * SESSIONS_PER_WEEK
+    interval = 7 * 24 * 3600 / SESSIONS_PER_WEEK
+    conn.executemany("""INSERT INTO workout_sessions (id, workout_id, started_at, ended_at, duration)
+                        VALUES (?, 1, ?, ?, 3600)""",
+                     [(i, start + i * interval, start + i * interval + 3600) for i in range(1, sessions + 1)])
+    conn.executemany("""INSERT INTO session_sets (session_id, exercise_id, set_index, reps, weight)
+                        VALUES (?, ?, ?, ?, ?)""",
+                     [(i, rng.randint(1, exercises), n, rng.randint(5, 12), round(rng.uniform(10, 150), 1))
+                      for i in range(1, sessions + 1) for n in range(1, SETS_PER_SESSION + 1)])
+
+
+# Call fn repeat times, returning the elapsed milliseconds of each call
+def measure(fn, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+# Summary of the samples of one benchmark; ops counts the items handled by each call
+def summarize(samples, ops=None):
+    result = {
+        "samples_ms": [round(s, 3) for s in samples],
+        "min_ms": round(min(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.mean(samples), 3),
+    }
+    if ops:
+        result["ops"] = ops
+        result["ops_per_s"] = round(ops / (statistics.median(samples) / 1000), 1)
+    return result
+
+
+# Queries behind the exercise, workout detail, executor and statistics screens, and weight saving
+def run_data_benchmarks(path, size, repeat):
+    results = {}
+    db = ConnectionManager(path)
+    try:
+        with db.reader() as conn:
+            rows = Catalog.fetch(conn)
+            results["catalog_fetch"] = summarize(measure(lambda: Catalog.fetch(conn), repeat))
+
+            # Screens read the catalog once populated; the sorted lists are built on first use
+            catalog = Catalog()
+
+            def fresh_catalog():
+                catalog.invalidate()
+                catalog.populate(rows)
+
+            results["load_muscle_groups"] = summarize(measure(catalog.groups, repeat, fresh_catalog))
+            results["load_exercises"] = summarize(
+                measure(lambda: catalog.exercises_in_group(1), repeat, fresh_catalog))
+            results["search_exercises"] = summarize(
+                measure(lambda: search_exercises(conn, "eserc 1"), repeat))
+            results["load_preview"] = summarize(measure(lambda: load_workout_detail(conn, 1), repeat))
+            results["load_workout_exercises"] = summarize(measure(lambda: load_workout_run(conn, 1), repeat))
+
+            # Targets of every exercise of the first workout, computed afresh each time
+            cards = load_workout_run(conn, 1).exercises
+            results["suggest_targets"] = summarize(
+                measure(lambda: ProgressionEngine().suggest(conn, 1, cards), repeat), ops=len(cards))
+
+            # Statistics of the whole history, then brought up to date with no new sets
+            def training_stats(volume):
+                volume.refresh(conn)
+                return volume.stats()
+
+            results["training_stats"] = summarize(measure(lambda: training_stats(TrainingVolume()), repeat))
+            volume = TrainingVolume()
+            training_stats(volume)
+            results["training_stats_refresh"] = summarize(measure(lambda: training_stats(volume), repeat))
+
+        edits = min(size, WEIGHT_EDITS)
+        queue = WeightWriteQueue(db, delay=0)
+        try:
+            def save_weights():
+                for exercise_id in range(1, edits + 1):
+                    queue.put(exercise_id, float(exercise_id % 150))
+                queue.flush()
+
+            results["save_weight"] = summarize(measure(save_weights, repeat), ops=edits)
+        finally:
+            queue.close()
+
+        # One edit synced with a server, every earlier change counting as pushed: the cost follows
+        # the changes, not the rows of the database
+        with db.writer() as conn:
+            conn.execute("UPDATE sync_state SET pushed = version")
+        server = SyncServer(path + "-sync")
+        client = SyncClient(db, LocalTransport(server))
+
+        def sync_one_change():
+            with db.writer() as conn:
+                conn.execute("UPDATE workouts SET timer = timer + 1 WHERE id = 1")
+            client.sync()
+
+        try:
+            results["sync_one_change"] = summarize(measure(sync_one_change, repeat))
+        finally:
+            server.close()
+    finally:
+        db.close()
+    return results
+
+
+# Environment of the app processes: no console log, no window on screen
+def headless_env():
+    env = dict(os.environ)
+    env.setdefault("KIVY_NO_ARGS", "1")
+    env.setdefault("KIVY_NO_CONSOLELOG", "1")
+    env.setdefault("SDL_VIDEODRIVER", "offscreen")
+    env.setdefault("KIVY_WINDOW", "sdl2")
+    return env
+
+
+# Run the app once per UI run in a new process, merging the samples of every run
+def run_ui_benchmarks(path, runs, repeat):
+    samples = {}
+    for _ in range(runs):
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            output = f.name
+        try:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--ui-child", path, output,
+                            "--repeat", str(repeat)],
+                           env=headless_env(), check=True, stdout=subprocess.DEVNULL, timeout=600)
+            with open(output, encoding="utf-8") as f:
+                run = json.load(f)
+        except (subprocess.SubprocessError, OSError, ValueError) as e:
+            print(f"UI benchmark error: {e}")
+            return {}
+        finally:
+            os.remove(output)
+        for name, values in run.items():
+            samples.setdefault(name, []).extend(values)
+    return {name: summarize(values) for name, values in samples.items()}
+
+
+# Inside the app process: time the cold build, then the executor lists once the catalog is loaded
+def ui_child(path, output, repeat):
+    import main
+    from kivy.clock import Clock
+    from kivy.uix.screenmanager import NoTransition
+
+    samples = {}
+
+    # Time a list built from scratch, with no pooled rows to reuse
+    def time_rows(rv, rows):
+        def clear():
+            rv.data = []
+            rv.refresh_views()
+            main.trim_row_pool()
+
+        def build():
+            rv.data = rows
+            rv.refresh_views()
+
+        return measure(build, repeat, clear)
+
+    class BenchmarkApp(main.WorkoutApp):
+        def get_database_path(self):
+            return path
+
+        def build(self):
+            start = time.perf_counter()
+            root = super().build()
+            samples["app_build"] = [(time.perf_counter() - start) * 1000]
+            return root
+
+        def on_start(self):
+            self.root.transition = NoTransition()
+            Clock.schedule_once(self._show_executor, 0)
+
+        def _show_executor(self, dt):
+            if not self.catalog.loaded:
+                Clock.schedule_once(self._show_executor, 0.05)
+                return
+            self.root.current = "executor"
+            Clock.schedule_once(self._workout_cards, 0.1)
+
+        def _workout_cards(self, dt):
+            screen = self.root.get_screen("executor")
+            cards = [screen._workout_card(workout) for workout in self.catalog.workouts()]
+            samples["build_workout_cards"] = time_rows(screen.ids.execution_list, cards)
+            screen.ids.workout_screen_manager.transition = NoTransition()
+            screen._update_view_state(False)
+            Clock.schedule_once(self._exercise_cards, 0.1)
+
+        def _exercise_cards(self, dt):
+            screen = self.root.get_screen("executor")
+            with self.db.reader() as conn:
+                view = load_workout_run(conn, 1)
+            rows = list(screen._exercise_cards(view.exercises))
+            samples["build_exercise_cards"] = time_rows(screen.ids.exercise_execution_list, rows)
+            self.stop()
+
+    BenchmarkApp().run()
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(samples, f)
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def run(sizes, repeat, ui_runs, ui=True):
+    results = {
+        "version": RESULTS_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": environment(),
+        "weight_rows": WEIGHT_ROWS,
+        "sizes": {},
+    }
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "workout.db")
+            print(f"Seeding {size} groups and exercises, {WEIGHT_ROWS} weights...")
+            seed_database(path, size)
+            size_results = run_data_benchmarks(path, size, repeat)
+            if ui:
+                size_results.update(run_ui_benchmarks(path, ui_runs, repeat))
+            results["sizes"][str(size)] = size_results
+        print_results(size, size_results)
+    return results
+
+
+def print_results(size, results):
+    print(f"\n{size} groups and exercises")
+    for name, result in results.items():
+        rate = f"  {result['ops_per_s']:.0f}/s" if "ops_per_s" in result else ""
+        print(f"  {name:<24} median {result['median_ms']:9.3f} ms  min {result['min_ms']:9.3f} ms{rate}")
+
+
+# Compare medians with a baseline run, returning the benchmarks slower than the threshold
+def compare(results, baseline, threshold=THRESHOLD):
+    regressions = []
+    print(f"\nCompared with the baseline of {baseline.get('created', '?')}")
+    for size, benchmarks in results["sizes"].items():
+        base_benchmarks = baseline.get("sizes", {}).get(size, {})
+        for name, result in benchmarks.items():
+            base = base_benchmarks.get(name)
+            if not base or not base.get("median_ms"):
+                continue
+            ratio = result["median_ms"] / base["median_ms"]
+            flag = "  REGRESSION" if ratio > threshold else ""
+            print(f"  {size:>6} {name:<24} {base['median_ms']:9.3f} -> {result['median_ms']:9.3f} ms"
+                  f"  x{ratio:.2f}{flag}")
+            if flag:
+                regressions.append((size, name, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the workout app data layer and lists")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in SIZES),
+                        help="comma separated muscle group and exercise counts")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="samples per benchmark")
+    parser.add_argument("--ui-runs", type=int, default=UI_RUNS, help="app processes started per size")
+    parser.add_argument("--no-ui", action="store_true", help="skip the app and list benchmarks")
+    parser.add_argument("--output", default="benchmark.json", help="results file")
+    parser.add_argument("--baseline", help="results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="slowdown ratio reported as a regression")
+    parser.add_argument("--ui-child", nargs=2, metavar=("DB", "OUTPUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.ui_child:
+        ui_child(*args.ui_child, args.repeat)
+        return 0
+
+    try:
+        sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    except ValueError:
+        parser.error("--sizes takes comma separated numbers")
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Baseline read error: {e}")
+            return 2
+
+    results = run(sizes, args.repeat, args.ui_runs, ui=not args.no_ui)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if baseline is not None and compare(results, baseline, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1239 @@
+# SQLite data layer shared by every screen of the app
+import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from queue import LifoQueue, Empty
+
+# Pragmas applied to every connection when it is opened
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -8000",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA foreign_keys = ON",
+)
+
+# Number of prepared statements kept by each connection
+STATEMENT_CACHE_SIZE = 256
+
+# Keeps exercise_weights as the latest-value table of weight_history
+WEIGHT_HISTORY_TRIGGER = """CREATE TRIGGER IF NOT EXISTS weight_history_latest
+       AFTER INSERT ON weight_history
+       WHEN NEW.exercise_id IS NOT NULL
+       BEGIN
+           INSERT INTO exercise_weights (exercise_id, weight, last_updated)
+           VALUES (NEW.exercise_id, NEW.weight, datetime(NEW.recorded_at, 'unixepoch'))
+           ON CONFLICT (exercise_id) DO UPDATE
+           SET weight = excluded.weight, last_updated = excluded.last_updated
+           WHERE excluded.last_updated >= exercise_weights.last_updated;
+       END"""
+
+# Sets of more reps than this give no one-rep max estimate, the formulas drift beyond it
+RECORD_MAX_REPS = 12
+
+# Estimated one-rep max of a set by the Epley and Brzycki formulas; a single is its own max
+EPLEY_SQL = """CASE WHEN {reps} = 1 THEN {weight}
+                    WHEN {reps} BETWEEN 2 AND {max_reps} THEN {weight} * (1 + {reps} / 30.0) END"""
+BRZYCKI_SQL = """CASE WHEN {reps} = 1 THEN {weight}
+                      WHEN {reps} BETWEEN 2 AND {max_reps} THEN {weight} * 36.0 / (37 - {reps}) END"""
+
+
+def _one_rep_max_sql(formula, reps, weight):
+    return formula.format(reps=reps, weight=weight, max_reps=RECORD_MAX_REPS)
+
+
+# Keep exercise_records up to date with every saved weight and logged set, in O(1) per row.
+# A saved weight can only raise the heaviest weight, a set also the one-rep max estimates.
+# History left by a deleted exercise has no exercise and no records.
+EXERCISE_RECORD_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS exercise_records_weight
+       AFTER INSERT ON weight_history
+       WHEN NEW.weight > 0 AND NEW.exercise_id IS NOT NULL
+       BEGIN
+           INSERT INTO exercise_records (exercise_id, max_weight)
+           VALUES (NEW.exercise_id, NEW.weight)
+           ON CONFLICT (exercise_id) DO UPDATE
+           SET max_weight = excluded.max_weight
+           WHERE excluded.max_weight > COALESCE(exercise_records.max_weight, 0);
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS exercise_records_set
+       AFTER INSERT ON session_sets
+       WHEN NEW.weight > 0 AND NEW.exercise_id IS NOT NULL
+       BEGIN
+           INSERT INTO exercise_records (exercise_id, max_weight, epley_1rm, brzycki_1rm)
+           VALUES (NEW.exercise_id, NEW.weight,
+                   {_one_rep_max_sql(EPLEY_SQL, "NEW.reps", "NEW.weight")},
+                   {_one_rep_max_sql(BRZYCKI_SQL, "NEW.reps", "NEW.weight")})
+           ON CONFLICT (exercise_id) DO UPDATE
+           SET max_weight = MAX(COALESCE(max_weight, 0), excluded.max_weight),
+               epley_1rm = NULLIF(MAX(COALESCE(epley_1rm, 0), COALESCE(excluded.epley_1rm, 0)), 0),
+               brzycki_1rm = NULLIF(MAX(COALESCE(brzycki_1rm, 0), COALESCE(excluded.brzycki_1rm, 0)), 0);
+       END""",
+)
+
+# Recompute every record from the weight history and the logged sets
+REBUILD_RECORDS = (
+    "DELETE FROM exercise_records",
+    f"""INSERT INTO exercise_records (exercise_id, max_weight, epley_1rm, brzycki_1rm)
+       SELECT exercise_id, MAX(weight), NULLIF(MAX(COALESCE(epley, 0)), 0), NULLIF(MAX(COALESCE(brzycki, 0)), 0)
+       FROM (SELECT exercise_id, weight, NULL AS epley, NULL AS brzycki
+             FROM weight_history WHERE weight > 0 AND exercise_id IS NOT NULL
+             UNION ALL
+             SELECT exercise_id, weight,
+                    {_one_rep_max_sql(EPLEY_SQL, "reps", "weight")},
+                    {_one_rep_max_sql(BRZYCKI_SQL, "reps", "weight")}
+             FROM session_sets WHERE weight > 0 AND exercise_id IS NOT NULL)
+       GROUP BY exercise_id""",
+)
+
+# Keep session_sets.started_at, a copy of the start time of the session of each set, so that the
+# sets of an exercise can be read in time order from one index whatever the session ids
+SESSION_TIME_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS session_sets_started_at
+       AFTER INSERT ON session_sets
+       BEGIN
+           UPDATE session_sets
+           SET started_at = (SELECT started_at FROM workout_sessions WHERE id = NEW.session_id)
+           WHERE id = NEW.id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS workout_sessions_started_at
+       AFTER UPDATE OF started_at ON workout_sessions
+       BEGIN
+           UPDATE session_sets SET started_at = NEW.started_at WHERE session_id = NEW.id;
+       END""",
+)
+
+# Keep the exercise_search full-text index in sync with exercises and muscle groups
+EXERCISE_SEARCH_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS exercise_search_insert
+       AFTER INSERT ON exercises
+       BEGIN
+           INSERT INTO exercise_search (rowid, name, group_name)
+           VALUES (NEW.id, NEW.name,
+                   (SELECT name FROM muscle_groups WHERE id = NEW.muscle_group_id));
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS exercise_search_update
+       AFTER UPDATE OF name, muscle_group_id ON exercises
+       BEGIN
+           DELETE FROM exercise_search WHERE rowid = OLD.id;
+           INSERT INTO exercise_search (rowid, name, group_name)
+           VALUES (NEW.id, NEW.name,
+                   (SELECT name FROM muscle_groups WHERE id = NEW.muscle_group_id));
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS exercise_search_delete
+       AFTER DELETE ON exercises
+       BEGIN
+           DELETE FROM exercise_search WHERE rowid = OLD.id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS exercise_search_group_rename
+       AFTER UPDATE OF name ON muscle_groups
+       BEGIN
+           UPDATE exercise_search SET group_name = NEW.name
+           WHERE rowid IN (SELECT id FROM exercises WHERE muscle_group_id = NEW.id);
+       END""",
+)
+
+# Indexes of every table with foreign keys, recreated whenever such a table is rebuilt
+TABLE_INDEXES = (
+    """CREATE INDEX IF NOT EXISTS idx_exercises_group
+       ON exercises (muscle_group_id, name)""",
+    """CREATE INDEX IF NOT EXISTS idx_workout_exercises_workout
+       ON workout_exercises (workout_id, exercise_id, sets, reps)""",
+    """CREATE INDEX IF NOT EXISTS idx_workout_exercises_exercise
+       ON workout_exercises (exercise_id)""",
+    """CREATE INDEX IF NOT EXISTS idx_weight_history_exercise_time
+       ON weight_history (exercise_id, recorded_at, weight)""",
+    """CREATE UNIQUE INDEX IF NOT EXISTS idx_workout_sessions_workout_start
+       ON workout_sessions (workout_id, started_at)""",
+    """CREATE INDEX IF NOT EXISTS idx_session_sets_session
+       ON session_sets (session_id)""",
+    """CREATE INDEX IF NOT EXISTS idx_session_sets_exercise
+       ON session_sets (exercise_id, session_id)""",
+)
+
+# Tables rebuilt with ON DELETE actions on their foreign keys, in dependency order. The catalog,
+# the plans and the latest weights go with what they belong to; the history outlives them.
+CASCADE_TABLES = (
+    ("exercises", """(id INTEGER PRIMARY KEY,
+           name TEXT,
+           muscle_group_id INTEGER,
+           FOREIGN KEY (muscle_group_id) REFERENCES muscle_groups (id) ON DELETE CASCADE)"""),
+    ("workout_exercises", """(id INTEGER PRIMARY KEY,
+           workout_id INTEGER,
+           exercise_id INTEGER,
+           sets INTEGER,
+           reps INTEGER,
+           FOREIGN KEY (workout_id) REFERENCES workouts (id) ON DELETE CASCADE,
+           FOREIGN KEY (exercise_id) REFERENCES exercises (id) ON DELETE CASCADE)"""),
+    ("exercise_weights", """(id INTEGER PRIMARY KEY,
+           exercise_id INTEGER UNIQUE,
+           weight REAL,
+           last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           FOREIGN KEY (exercise_id) REFERENCES exercises (id) ON DELETE CASCADE)"""),
+    ("weight_history", """(id INTEGER PRIMARY KEY,
+           exercise_id INTEGER,
+           weight REAL NOT NULL,
+           recorded_at REAL NOT NULL,
+           FOREIGN KEY (exercise_id) REFERENCES exercises (id) ON DELETE SET NULL)"""),
+    ("workout_sessions", """(id INTEGER PRIMARY KEY,
+           workout_id INTEGER,
+           started_at REAL NOT NULL,
+           ended_at REAL,
+           duration INTEGER,
+           FOREIGN KEY (workout_id) REFERENCES workouts (id) ON DELETE SET NULL)"""),
+    ("session_sets", """(id INTEGER PRIMARY KEY,
+           session_id INTEGER NOT NULL,
+           exercise_id INTEGER,
+           set_index INTEGER NOT NULL,
+           reps INTEGER,
+           weight REAL,
+           FOREIGN KEY (session_id) REFERENCES workout_sessions (id) ON DELETE CASCADE,
+           FOREIGN KEY (exercise_id) REFERENCES exercises (id) ON DELETE SET NULL)"""),
+)
+
+# Tables of CASCADE_TABLES recording history, whose rows stay when their exercise is deleted
+HISTORY_TABLES = ("weight_history", "session_sets")
+
+
+# Statements rebuilding a table with a new definition, keeping its rows
+def _rebuild_table(name, definition):
+    return (
+        f"CREATE TABLE {name}_new {definition}",
+        f"INSERT INTO {name}_new SELECT * FROM {name}",
+        f"DROP TABLE {name}",
+        f"ALTER TABLE {name}_new RENAME TO {name}",
+    )
+
+
+# Tables replicated by sync in dependency order, with their synced fields; fields referencing another
+# synced table travel as that row's uid. Derived tables (latest weights, records, search) are rebuilt
+# locally by their own triggers and never synced.
+SYNC_TABLES = {
+    "muscle_groups": ("name",),
+    "exercises": ("name", "muscle_group_id"),
+    "workouts": ("name", "timer"),
+    "workout_exercises": ("workout_id", "exercise_id", "sets", "reps"),
+    "weight_history": ("exercise_id", "weight", "recorded_at"),
+    "workout_sessions": ("workout_id", "started_at", "ended_at", "duration"),
+    "session_sets": ("session_id", "exercise_id", "set_index", "reps", "weight"),
+}
+SYNC_REFERENCES = {
+    "muscle_group_id": "muscle_groups",
+    "exercise_id": "exercises",
+    "workout_id": "workouts",
+    "session_id": "workout_sessions",
+}
+
+# Natural keys of the rows a device is likely to create on its own as well, the same ones the
+# import/export uses: muscle groups by name, exercises by group and name. Rows created with the
+# same key on two devices become one row once synced. {row} is NEW or the scanned table.
+SYNC_NATURAL_UIDS = {
+    "muscle_groups": "'muscle_groups:' || {row}.name",
+    "exercises": """'exercises:' || length(COALESCE(g.name, '')) || ':' || COALESCE(g.name, '')
+                    || ':' || {row}.name""",
+}
+SYNC_NATURAL_JOINS = {
+    "exercises": "LEFT JOIN muscle_groups g ON g.id = {row}.muscle_group_id",
+}
+
+# Current time in milliseconds, and the version and stamp of the change being logged.
+# Stamps order changes by a hybrid clock that never goes backwards on a device, then by version
+# and device, and compare as text.
+SYNC_NOW_MS = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+SYNC_TICK = f"UPDATE sync_state SET version = version + 1, clock = MAX(clock + 1, {SYNC_NOW_MS})"
+SYNC_VERSION = "(SELECT version FROM sync_state)"
+SYNC_STAMP_COLUMNS = "printf('%013d.%010d.%s', clock, version, device)"
+SYNC_STAMP = f"(SELECT {SYNC_STAMP_COLUMNS} FROM sync_state)"
+SYNC_LOCAL = "(SELECT applying FROM sync_state) = 0"
+
+
+# Uid of a new row: its natural key, or the device and the version of the insert, which keep the
+# uid index growing at its end, and a random suffix telling apart copies of one database file
+SYNC_NEW_UID = "(SELECT printf('%s-%010d-%s', device, version, lower(hex(randomblob(4)))) FROM sync_state)"
+
+
+def _sync_uid_sql(table, row):
+    natural = SYNC_NATURAL_UIDS.get(table)
+    if natural is None:
+        return SYNC_NEW_UID
+    key = natural.format(row=row)
+    join = SYNC_NATURAL_JOINS.get(table, "").format(row=row)
+    # A key missing or already used, even by a deleted row, falls back to a new uid
+    return f"""(SELECT CASE WHEN {key} IS NULL OR EXISTS (SELECT 1 FROM sync_rows WHERE uid = {key})
+                            THEN {SYNC_NEW_UID} ELSE {key} END
+                FROM (SELECT 1) {join})"""
+
+
+# Change log triggers of one synced table. Local writes bump the version of the row in sync_rows,
+# inserts stamp the whole row and updates stamp only the fields that changed. Deletes leave a
+# tombstone. Writes applied by sync itself (applying = 1) are logged by the sync client instead.
+def _sync_triggers(table, fields):
+    changed = " OR ".join(f"OLD.{field} IS NOT NEW.{field}" for field in fields)
+    changed_fields = " UNION ALL ".join(
+        f"SELECT '{field}' AS field WHERE OLD.{field} IS NOT NEW.{field}" for field in fields)
+    return (
+        f"""CREATE TRIGGER IF NOT EXISTS sync_{table}_insert
+           AFTER INSERT ON {table}
+           WHEN {SYNC_LOCAL}
+           BEGIN
+               {SYNC_TICK};
+               INSERT INTO sync_rows (uid, tbl, row_id, version, stamp)
+               SELECT {_sync_uid_sql(table, "NEW")}, '{table}', NEW.id, version, {SYNC_STAMP_COLUMNS}
+               FROM sync_state;
+           END""",
+        f"""CREATE TRIGGER IF NOT EXISTS sync_{table}_update
+           AFTER UPDATE ON {table}
+           WHEN {SYNC_LOCAL} AND ({changed})
+           BEGIN
+               {SYNC_TICK};
+               UPDATE sync_rows SET version = {SYNC_VERSION} WHERE tbl = '{table}' AND row_id = NEW.id;
+               INSERT OR REPLACE INTO sync_stamps (uid, field, stamp)
+               SELECT uid, field, {SYNC_STAMP}
+               FROM sync_rows, ({changed_fields})
+               WHERE tbl = '{table}' AND row_id = NEW.id;
+           END""",
+        f"""CREATE TRIGGER IF NOT EXISTS sync_{table}_delete
+           AFTER DELETE ON {table}
+           BEGIN
+               {SYNC_TICK} WHERE applying = 0;
+               INSERT OR REPLACE INTO sync_stamps (uid, field, stamp)
+               SELECT uid, '_deleted', {SYNC_STAMP}
+               FROM sync_rows
+               WHERE tbl = '{table}' AND row_id = OLD.id AND {SYNC_LOCAL};
+               UPDATE sync_rows
+               SET row_id = NULL, deleted = 1,
+                   version = CASE WHEN {SYNC_LOCAL} THEN {SYNC_VERSION} ELSE version END
+               WHERE tbl = '{table}' AND row_id = OLD.id;
+           END""",
+    )
+
+
+SYNC_TRIGGERS = tuple(statement for table, fields in SYNC_TABLES.items()
+                      for statement in _sync_triggers(table, fields))
+
+
+# Uid of an existing row without a natural key: the device and the table and id of the row, so
+# that rows of devices set up apart never share a uid, as with new rows
+SYNC_BACKFILL_UID = "printf('%s-{table}-%d', (SELECT device FROM sync_state), {row}.id)"
+
+
+# Give every existing row a uid, keyed by natural key or else by device, table and id. Rows left
+# out by the first statement, with a missing or repeated natural key, are left to the second.
+def _sync_backfill(table):
+    statements = []
+    if table in SYNC_NATURAL_UIDS:
+        uid = SYNC_NATURAL_UIDS[table].format(row=table)
+        join = SYNC_NATURAL_JOINS.get(table, "").format(row=table)
+        statements.append(f"""INSERT OR IGNORE INTO sync_rows (uid, tbl, row_id, version, stamp)
+                               SELECT {uid}, '{table}', {table}.id, 1, '' FROM {table} {join}
+                               WHERE {uid} IS NOT NULL""")
+    statements.append(f"""INSERT OR IGNORE INTO sync_rows (uid, tbl, row_id, version, stamp)
+                           SELECT {SYNC_BACKFILL_UID.format(table=table, row=table)}, '{table}', id, 1, ''
+                           FROM {table}""")
+    return statements
+
+
+# Earlier backfills keyed rows by table and id alone, as 'table#id'. Databases that never synced
+# get the device scoped uids instead; those that did keep theirs, the server already holds them.
+SYNC_UNSYNCED = "(SELECT server_id IS NULL AND pulled = 0 FROM sync_state)"
+SYNC_OLD_BACKFILL = "substr({uid}, 1, length(tbl) + 1) = tbl || '#'"
+SYNC_RENAME_BACKFILL = (
+    f"""UPDATE sync_stamps
+        SET uid = (SELECT device FROM sync_state) || '-' || replace(uid, '#', '-')
+        WHERE {SYNC_UNSYNCED}
+        AND uid IN (SELECT uid FROM sync_rows WHERE {SYNC_OLD_BACKFILL.format(uid="uid")})""",
+    f"""UPDATE sync_rows
+        SET uid = (SELECT device FROM sync_state) || '-' || replace(uid, '#', '-')
+        WHERE {SYNC_UNSYNCED} AND {SYNC_OLD_BACKFILL.format(uid="uid")}""",
+)
+
+
+# Ordered schema migrations, applied once each and tracked by PRAGMA user_version
+MIGRATIONS = (
+    # 1: base tables
+    (
+        """CREATE TABLE IF NOT EXISTS muscle_groups
+           (id INTEGER PRIMARY KEY, name TEXT UNIQUE)""",
+        """CREATE TABLE IF NOT EXISTS exercises
+           (id INTEGER PRIMARY KEY,
+           name TEXT,
+           muscle_group_id INTEGER,
+           FOREIGN KEY (muscle_group_id) REFERENCES muscle_groups (id))""",
+        """CREATE TABLE IF NOT EXISTS workouts
+           (id INTEGER PRIMARY KEY,
+           name TEXT,
+           timer INTEGER)""",
+        """CREATE TABLE IF NOT EXISTS workout_exercises
+           (id INTEGER PRIMARY KEY,
+           workout_id INTEGER,
+           exercise_id INTEGER,
+           sets INTEGER,
+           reps INTEGER,
+           FOREIGN KEY (workout_id) REFERENCES workouts (id),
+           FOREIGN KEY (exercise_id) REFERENCES exercises (id))""",
+        """CREATE TABLE IF NOT EXISTS exercise_weights
+           (id INTEGER PRIMARY KEY,
+           exercise_id INTEGER UNIQUE,
+           weight REAL,
+           last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           FOREIGN KEY (exercise_id) REFERENCES exercises (id))""",
+    ),
+    # 2: covering indexes for the per-group exercise lists and the workout joins
+    (
+        """CREATE INDEX IF NOT EXISTS idx_exercises_group
+           ON exercises (muscle_group_id, name)""",
+        """CREATE INDEX IF NOT EXISTS idx_workout_exercises_workout
+           ON workout_exercises (workout_id, exercise_id, sets, reps)""",
+        """CREATE INDEX IF NOT EXISTS idx_workout_exercises_exercise
+           ON workout_exercises (exercise_id)""",
+    ),
+    # 3: append-only weight history; exercise_weights becomes its latest-value table
+    (
+        """CREATE TABLE IF NOT EXISTS weight_history
+           (id INTEGER PRIMARY KEY,
+           exercise_id INTEGER NOT NULL,
+           weight REAL NOT NULL,
+           recorded_at REAL NOT NULL,
+           FOREIGN KEY (exercise_id) REFERENCES exercises (id))""",
+        """CREATE INDEX IF NOT EXISTS idx_weight_history_exercise_time
+           ON weight_history (exercise_id, recorded_at, weight)""",
+        """INSERT INTO weight_history (exercise_id, weight, recorded_at)
+           SELECT exercise_id, weight,
+                  CAST(strftime('%s', COALESCE(last_updated, CURRENT_TIMESTAMP)) AS REAL)
+           FROM exercise_weights
+           WHERE weight IS NOT NULL""",
+        WEIGHT_HISTORY_TRIGGER,
+    ),
+    # 4: recorded workout sessions and their per-set log
+    (
+        """CREATE TABLE IF NOT EXISTS workout_sessions
+           (id INTEGER PRIMARY KEY,
+           workout_id INTEGER,
+           started_at REAL NOT NULL,
+           ended_at REAL,
+           duration INTEGER,
+           FOREIGN KEY (workout_id) REFERENCES workouts (id))""",
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_workout_sessions_workout_start
+           ON workout_sessions (workout_id, started_at)""",
+        """CREATE TABLE IF NOT EXISTS session_sets
+           (id INTEGER PRIMARY KEY,
+           session_id INTEGER NOT NULL,
+           exercise_id INTEGER NOT NULL,
+           set_index INTEGER NOT NULL,
+           reps INTEGER,
+           weight REAL,
+           FOREIGN KEY (session_id) REFERENCES workout_sessions (id),
+           FOREIGN KEY (exercise_id) REFERENCES exercises (id))""",
+        """CREATE INDEX IF NOT EXISTS idx_session_sets_session
+           ON session_sets (session_id)""",
+        """CREATE INDEX IF NOT EXISTS idx_session_sets_exercise
+           ON session_sets (exercise_id, session_id)""",
+    ),
+    # 5: full-text exercise search with the muscle group name denormalized in
+    (
+        """CREATE VIRTUAL TABLE IF NOT EXISTS exercise_search USING fts5
+           (name, group_name,
+           tokenize = 'unicode61 remove_diacritics 2',
+           prefix = '1 2 3')""",
+        """INSERT INTO exercise_search (rowid, name, group_name)
+           SELECT e.id, e.name, mg.name FROM exercises e
+           LEFT JOIN muscle_groups mg ON e.muscle_group_id = mg.id""",
+        *EXERCISE_SEARCH_TRIGGERS,
+    ),
+    # 6: remove orphaned rows left by manual deletes, then declare ON DELETE cascades
+    (
+        "DROP TRIGGER IF EXISTS weight_history_latest",
+        "DROP TRIGGER IF EXISTS exercise_search_insert",
+        "DROP TRIGGER IF EXISTS exercise_search_update",
+        "DROP TRIGGER IF EXISTS exercise_search_delete",
+        "DROP TRIGGER IF EXISTS exercise_search_group_rename",
+        """DELETE FROM exercises
+           WHERE muscle_group_id IS NOT NULL
+           AND muscle_group_id NOT IN (SELECT id FROM muscle_groups)""",
+        """DELETE FROM workout_exercises
+           WHERE workout_id NOT IN (SELECT id FROM workouts)
+           OR exercise_id NOT IN (SELECT id FROM exercises)""",
+        "DELETE FROM exercise_weights WHERE exercise_id NOT IN (SELECT id FROM exercises)",
+        "DELETE FROM weight_history WHERE exercise_id NOT IN (SELECT id FROM exercises)",
+        """UPDATE workout_sessions SET workout_id = NULL
+           WHERE workout_id NOT IN (SELECT id FROM workouts)""",
+        """DELETE FROM session_sets
+           WHERE session_id NOT IN (SELECT id FROM workout_sessions)
+           OR exercise_id NOT IN (SELECT id FROM exercises)""",
+        "DELETE FROM exercise_search WHERE rowid NOT IN (SELECT id FROM exercises)",
+        *(statement for name, definition in CASCADE_TABLES
+          for statement in _rebuild_table(name, definition)),
+        *TABLE_INDEXES,
+        WEIGHT_HISTORY_TRIGGER,
+        *EXERCISE_SEARCH_TRIGGERS,
+    ),
+    # 7: personal records per exercise, maintained by triggers and filled from the existing data
+    (
+        """CREATE TABLE IF NOT EXISTS exercise_records
+           (exercise_id INTEGER PRIMARY KEY,
+           max_weight REAL,
+           epley_1rm REAL,
+           brzycki_1rm REAL,
+           FOREIGN KEY (exercise_id) REFERENCES exercises (id) ON DELETE CASCADE)""",
+        *EXERCISE_RECORD_TRIGGERS,
+        *REBUILD_RECORDS,
+    ),
+    # 8: change log for delta sync between devices, with a uid for every existing row
+    (
+        """CREATE TABLE IF NOT EXISTS sync_state
+           (id INTEGER PRIMARY KEY CHECK (id = 1),
+           device TEXT NOT NULL,
+           version INTEGER NOT NULL DEFAULT 0,
+           clock INTEGER NOT NULL DEFAULT 0,
+           applying INTEGER NOT NULL DEFAULT 0,
+           pushed INTEGER NOT NULL DEFAULT 0,
+           pulled INTEGER NOT NULL DEFAULT 0,
+           server TEXT,
+           server_id TEXT)""",
+        "INSERT OR IGNORE INTO sync_state (id, device, version) VALUES (1, lower(hex(randomblob(8))), 1)",
+        """CREATE TABLE IF NOT EXISTS sync_rows
+           (uid TEXT NOT NULL PRIMARY KEY,
+           tbl TEXT NOT NULL,
+           row_id INTEGER,
+           version INTEGER NOT NULL,
+           deleted INTEGER NOT NULL DEFAULT 0,
+           stamp TEXT NOT NULL,
+           UNIQUE (tbl, row_id))""",
+        "CREATE INDEX IF NOT EXISTS idx_sync_rows_version ON sync_rows (version)",
+        """CREATE TABLE IF NOT EXISTS sync_stamps
+           (uid TEXT NOT NULL,
+           field TEXT NOT NULL,
+           stamp TEXT NOT NULL,
+           PRIMARY KEY (uid, field)) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS sync_pending
+           (uid TEXT PRIMARY KEY,
+           parent TEXT NOT NULL,
+           change TEXT NOT NULL)""",
+        "CREATE INDEX IF NOT EXISTS idx_sync_pending_parent ON sync_pending (parent)",
+        *(statement for table in SYNC_TABLES for statement in _sync_backfill(table)),
+        *SYNC_TRIGGERS,
+    ),
+    # 9: keep the weight history and the logged sets of a deleted exercise, without the exercise.
+    # Rebuilding drops the triggers of both tables, so they are created again.
+    (
+        *(statement for name, definition in CASCADE_TABLES if name in HISTORY_TABLES
+          for statement in _rebuild_table(name, definition)),
+        *TABLE_INDEXES,
+        WEIGHT_HISTORY_TRIGGER,
+        *EXERCISE_RECORD_TRIGGERS,
+        *(statement for table in HISTORY_TABLES for statement in _sync_triggers(table, SYNC_TABLES[table])),
+    ),
+    # 10: start time of the session on every logged set, for reading the sets of an exercise by time
+    (
+        "ALTER TABLE session_sets ADD COLUMN started_at REAL",
+        """UPDATE session_sets
+           SET started_at = (SELECT started_at FROM workout_sessions WHERE id = session_sets.session_id)""",
+        """CREATE INDEX IF NOT EXISTS idx_session_sets_exercise_time
+           ON session_sets (exercise_id, started_at, session_id, weight, reps)""",
+        *SESSION_TIME_TRIGGERS,
+    ),
+    # 11: device scoped uids for the rows backfilled without a natural key, unless already synced
+    SYNC_RENAME_BACKFILL,
+)
+
+# Maximum number of rows returned by an exercise search, and of candidates it considers
+SEARCH_LIMIT = 50
+SEARCH_CANDIDATES = 500
+
+# Schema version of a fully migrated database
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+# Read the schema version stored in the database header
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+# Apply pending migrations in order, each one in its own transaction.
+# Foreign keys are off while migrating so tables can be rebuilt.
+def apply_migrations(conn):
+    version = get_schema_version(conn)
+    if version >= SCHEMA_VERSION:
+        return 0
+
+    foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+    conn.execute("PRAGMA foreign_keys = OFF")
+    applied = 0
+    try:
+        for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for statement in statements:
+                    conn.execute(statement)
+                # Older versions may hold orphans until the cleanup migration, so only
+                # the final state is checked
+                if number == SCHEMA_VERSION and conn.execute("PRAGMA foreign_key_check").fetchone():
+                    raise sqlite3.IntegrityError("foreign key violations after migration")
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                print(f"Database migration {number} failed: {e}")
+                raise
+            applied += 1
+    finally:
+        conn.execute(f"PRAGMA foreign_keys = {foreign_keys}")
+    return applied
+
+
+# Append weight samples as (exercise_id, weight, recorded_at) rows;
+# the latest value per exercise is kept in exercise_weights by a trigger.
+# Samples of exercises deleted in the meantime are skipped.
+def record_weights(conn, samples):
+    conn.executemany("""
+        INSERT INTO weight_history (exercise_id, weight, recorded_at)
+        SELECT id, ?, ? FROM exercises WHERE id = ?
+    """, [(weight, recorded_at, exercise_id) for exercise_id, weight, recorded_at in samples])
+
+
+# Recompute the personal records from all the saved data, returning how many exercises have one.
+# The triggers only ever raise a record, so this is needed after deleting history or sessions.
+def rebuild_records(conn):
+    for statement in REBUILD_RECORDS:
+        conn.execute(statement)
+    return conn.execute("SELECT COUNT(*) FROM exercise_records").fetchone()[0]
+
+
+# Estimated one-rep max of a set, as computed by the record triggers; None beyond RECORD_MAX_REPS
+def epley_1rm(weight, reps):
+    if reps == 1:
+        return weight
+    if reps and 2 <= reps <= RECORD_MAX_REPS:
+        return weight * (1 + reps / 30.0)
+    return None
+
+
+def brzycki_1rm(weight, reps):
+    if reps == 1:
+        return weight
+    if reps and 2 <= reps <= RECORD_MAX_REPS:
+        return weight * 36.0 / (37 - reps)
+    return None
+
+
+# Record after a saved weight (reps None) or a logged set, like the triggers apply it on disk
+def raise_record(record, weight, reps=None):
+    if not weight or weight <= 0:
+        return record
+    record = record or ExerciseRecord(None, None, None)
+    if reps is None:
+        return record._replace(max_weight=max(record.max_weight or 0, weight))
+    return ExerciseRecord(
+        max(record.max_weight or 0, weight),
+        max(record.epley_1rm or 0, epley_1rm(weight, reps) or 0) or None,
+        max(record.brzycki_1rm or 0, brzycki_1rm(weight, reps) or 0) or None,
+    )
+
+
+# Weight samples of an exercise between two unix timestamps, oldest first
+def weight_range(conn, exercise_id, start, end):
+    return conn.execute("""
+        SELECT recorded_at, weight FROM weight_history
+        WHERE exercise_id = ? AND recorded_at >= ? AND recorded_at < ?
+        ORDER BY recorded_at
+    """, (exercise_id, start, end)).fetchall()
+
+
+# Most recent weight samples of an exercise, newest first
+def latest_weights(conn, exercise_id, limit=10):
+    return conn.execute("""
+        SELECT recorded_at, weight FROM weight_history
+        WHERE exercise_id = ?
+        ORDER BY recorded_at DESC
+        LIMIT ?
+    """, (exercise_id, limit)).fetchall()
+
+
+# One point per bucket (a week by default) as (bucket_start, max, average, samples)
+def downsample_weights(conn, exercise_id, bucket_seconds=7 * 24 * 3600, start=0, end=float("inf")):
+    return conn.execute("""
+        SELECT CAST(recorded_at / ? AS INTEGER) * ? AS bucket,
+               MAX(weight), AVG(weight), COUNT(*)
+        FROM weight_history
+        WHERE exercise_id = ? AND recorded_at >= ? AND recorded_at < ?
+        GROUP BY bucket
+        ORDER BY bucket
+    """, (bucket_seconds, bucket_seconds, exercise_id, start, end)).fetchall()
+
+
+# Exercises whose name or muscle group starts with every typed word, as (id, name, group_name).
+# Matching ignores case and diacritics. Candidates are capped and ordered in Python, names
+# starting with the first word first, which stays fast even for one-letter queries.
+def search_exercises(conn, text, limit=SEARCH_LIMIT):
+    words = re.findall(r"\w+", text)
+    if not words:
+        return []
+    query = " ".join(f'"{word}"*' for word in words)
+    rows = conn.execute("""
+        SELECT rowid, name, group_name FROM exercise_search
+        WHERE exercise_search MATCH ?
+        LIMIT ?
+    """, (query, SEARCH_CANDIDATES)).fetchall()
+    first = words[0].casefold()
+    rows.sort(key=lambda row: (not row[1].casefold().startswith(first), row[1].casefold()))
+    return rows[:limit]
+
+
+# View models of the screens reading workouts. Each loader fills one in a single statement,
+# the SQL text is constant so every connection prepares it once and reuses it from its cache.
+Workout = namedtuple("Workout", "id name timer")
+# Exercise of a workout in the workout detail preview
+PreviewRow = namedtuple("PreviewRow", "group_name exercise_name sets reps workout_exercise_id")
+# Personal records of an exercise: heaviest weight and best estimated one-rep max by formula
+ExerciseRecord = namedtuple("ExerciseRecord", "max_weight epley_1rm brzycki_1rm")
+# Exercise of a workout in the executor, with the last weight saved for it and its records
+ExerciseCard = namedtuple("ExerciseCard", "group_name exercise_name sets reps workout_exercise_id exercise_id weight "
+                                          "max_weight epley_1rm brzycki_1rm")
+WorkoutDetailView = namedtuple("WorkoutDetailView", "workout preview")
+WorkoutRunView = namedtuple("WorkoutRunView", "workout exercises")
+
+WORKOUT_DETAIL_SQL = """
+    SELECT w.id, w.name, w.timer, mg.name, e.name, we.sets, we.reps, we.id
+    FROM workouts w
+    LEFT JOIN workout_exercises we ON we.workout_id = w.id
+    LEFT JOIN exercises e ON e.id = we.exercise_id
+    LEFT JOIN muscle_groups mg ON mg.id = e.muscle_group_id
+    WHERE w.id = ?
+    ORDER BY mg.name, we.id
+"""
+
+PREVIEW_ROW_SQL = """
+    SELECT mg.name, e.name, we.sets, we.reps, we.id
+    FROM workout_exercises we
+    JOIN exercises e ON e.id = we.exercise_id
+    JOIN muscle_groups mg ON mg.id = e.muscle_group_id
+    WHERE we.id = ?
+"""
+
+WORKOUT_RUN_SQL = """
+    SELECT w.id, w.name, w.timer, mg.name, e.name, we.sets, we.reps, we.id, e.id,
+           COALESCE(ew.weight, 0), er.max_weight, er.epley_1rm, er.brzycki_1rm
+    FROM workouts w
+    LEFT JOIN workout_exercises we ON we.workout_id = w.id
+    LEFT JOIN exercises e ON e.id = we.exercise_id
+    LEFT JOIN muscle_groups mg ON mg.id = e.muscle_group_id
+    LEFT JOIN exercise_weights ew ON ew.exercise_id = e.id
+    LEFT JOIN exercise_records er ON er.exercise_id = e.id
+    WHERE w.id = ?
+    ORDER BY mg.name, we.id
+"""
+
+
+# Rows of a workout joined with its exercises: the workout from the first row, and one item per
+# exercise. A workout without exercises comes back as a single row with NULL exercise columns.
+def _workout_view(rows, item):
+    if not rows:
+        return None, []
+    return Workout._make(rows[0][:3]), [item._make(row[3:]) for row in rows if row[3] is not None]
+
+
+# Workout detail screen: the workout and its exercises, grouped by muscle group; None if it was deleted
+def load_workout_detail(conn, workout_id):
+    workout, preview = _workout_view(conn.execute(WORKOUT_DETAIL_SQL, (workout_id,)).fetchall(), PreviewRow)
+    return WorkoutDetailView(workout, preview) if workout else None
+
+
+# One preview row, read back after adding an exercise to a workout
+def load_preview_row(conn, workout_exercise_id):
+    row = conn.execute(PREVIEW_ROW_SQL, (workout_exercise_id,)).fetchone()
+    return PreviewRow._make(row) if row else None
+
+
+# Workout executor: the workout and its exercise cards with their saved weights and records;
+# None if it was deleted
+def load_workout_run(conn, workout_id):
+    workout, exercises = _workout_view(conn.execute(WORKOUT_RUN_SQL, (workout_id,)).fetchall(), ExerciseCard)
+    return WorkoutRunView(workout, exercises) if workout else None
+
+
+# Long-lived connection pool with one writer and reusable readers
+class ConnectionManager:
+    def __init__(self, path, max_readers=2):
+        self.path = path
+        self.max_readers = max_readers
+        self._writer = None
+        self._write_lock = threading.RLock()
+        self._readers = LifoQueue()
+        self._reader_count = 0
+        self._pool_lock = threading.Lock()
+        self._closed = False
+
+    # Open a new connection with WAL journaling and tuned pragmas
+    def _connect(self):
+        try:
+            conn = sqlite3.connect(
+                self.path,
+                check_same_thread=False,
+                cached_statements=STATEMENT_CACHE_SIZE
+            )
+        except sqlite3.Error as e:
+            print(f"Database connection error: {e}")
+            raise
+        conn.execute("PRAGMA journal_mode = WAL")
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    # Get the single writer connection, opening it on first use
+    def _get_writer(self):
+        if self._writer is None:
+            self._writer = self._connect()
+        return self._writer
+
+    # Take an idle reader from the pool or open a new one
+    def _acquire_reader(self):
+        try:
+            return self._readers.get_nowait()
+        except Empty:
+            pass
+        with self._pool_lock:
+            if self._reader_count < self.max_readers:
+                self._reader_count += 1
+                try:
+                    return self._connect()
+                except sqlite3.Error:
+                    self._reader_count -= 1
+                    raise
+        return self._readers.get()
+
+    # Give a reader back to the pool
+    def _release_reader(self, conn):
+        if self._closed:
+            conn.close()
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        self._readers.put(conn)
+
+    # Borrow a reader connection for the duration of a with block
+    @contextmanager
+    def reader(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection manager is closed")
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            self._release_reader(conn)
+
+    # Borrow the writer connection, committing on success and rolling back on error
+    @contextmanager
+    def writer(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection manager is closed")
+        with self._write_lock:
+            conn = self._get_writer()
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    # Close every pooled connection
+    def close(self):
+        self._closed = True
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except Empty:
+                break
+        with self._pool_lock:
+            self._reader_count = 0
+
+
+# Write-behind queue that debounces weight edits and appends them to the history in batches
+class WeightWriteQueue:
+    def __init__(self, db, delay=1.5):
+        self.db = db
+        self.delay = delay
+        self._pending = {}
+        self._flush_all = False
+        self._flushed = 0
+        self._requested = 0
+        self._running = True
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="weight-writer", daemon=True)
+        self._thread.start()
+
+    # Queue the latest weight for an exercise, restarting its debounce delay
+    def put(self, exercise_id, weight):
+        with self._cond:
+            self._pending[exercise_id] = (weight, time.time(), time.monotonic() + self.delay)
+            self._cond.notify()
+
+    # Write every pending edit now, optionally waiting until it is on disk
+    def flush(self, wait=True):
+        with self._cond:
+            self._flush_all = True
+            self._requested += 1
+            ticket = self._requested
+            self._cond.notify()
+            if wait and threading.current_thread() is not self._thread:
+                while self._flushed < ticket and self._thread.is_alive():
+                    self._cond.wait(0.1)
+
+    # Flush pending edits and stop the background thread
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+
+    # Pop the edits that are due, or all of them when a flush was requested
+    def _take_due(self):
+        now = time.monotonic()
+        if self._flush_all or not self._running:
+            due = list(self._pending.items())
+            self._pending.clear()
+        else:
+            due = [(ex_id, item) for ex_id, item in self._pending.items() if item[2] <= now]
+            for ex_id, _ in due:
+                del self._pending[ex_id]
+        return [(ex_id, weight, recorded_at) for ex_id, (weight, recorded_at, _) in due]
+
+    # Seconds until the next pending edit is due
+    def _next_timeout(self):
+        if not self._pending:
+            return None
+        return max(0, min(item[2] for item in self._pending.values()) - time.monotonic())
+
+    # Background loop writing due edits in a single transaction per batch
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._flush_all:
+                    timeout = self._next_timeout()
+                    if timeout == 0:
+                        break
+                    self._cond.wait(timeout)
+                ticket = self._requested
+                batch = self._take_due()
+                self._flush_all = False
+                running = self._running
+
+            if batch:
+                try:
+                    with self.db.writer() as conn:
+                        record_weights(conn, batch)
+                except sqlite3.Error as e:
+                    print(f"Weight save error: {e}")
+
+            with self._cond:
+                self._flushed = max(self._flushed, ticket)
+                self._cond.notify_all()
+            if not running:
+                return
+
+
+# Runs queries on worker threads and delivers results through a scheduler callback
+class QueryExecutor:
+    def __init__(self, db, schedule, max_workers=2, setup=None):
+        self.db = db
+        self.schedule = schedule
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db-query")
+        self._ready = threading.Event()
+        if setup is None:
+            self._ready.set()
+        else:
+            self._pool.submit(self._run_setup, setup)
+
+    # Run setup(conn) on the writer connection, holding back every other query until it is done
+    def _run_setup(self, setup):
+        try:
+            with self.db.writer() as conn:
+                setup(conn)
+        except Exception as e:
+            print(f"Database setup error: {e}")
+        finally:
+            self._ready.set()
+
+    # Run query_fn(conn, *args) on a reader connection
+    def read(self, query_fn, *args, on_result=None, on_error=None):
+        return self._submit(self.db.reader, query_fn, args, on_result, on_error)
+
+    # Run query_fn(conn, *args) on the writer connection inside a transaction
+    def write(self, query_fn, *args, on_result=None, on_error=None):
+        return self._submit(self.db.writer, query_fn, args, on_result, on_error)
+
+    # Run fn(*args) on a query thread, for tasks borrowing connections themselves
+    def run(self, fn, *args, on_result=None, on_error=None):
+        def task():
+            self._ready.wait()
+            return fn(*args)
+
+        future = self._pool.submit(task)
+        future.add_done_callback(lambda f: self._deliver(f, on_result, on_error))
+        return future
+
+    # Wait for running queries and stop the worker threads
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+    def _submit(self, borrow, query_fn, args, on_result, on_error):
+        def task():
+            self._ready.wait()
+            with borrow() as conn:
+                return query_fn(conn, *args)
+
+        future = self._pool.submit(task)
+        future.add_done_callback(lambda f: self._deliver(f, on_result, on_error))
+        return future
+
+    # Hand the outcome of a finished query back to the scheduler's thread
+    def _deliver(self, future, on_result, on_error):
+        error = future.exception()
+        if error is not None:
+            if on_error is not None:
+                self.schedule(lambda dt: on_error(error))
+            else:
+                print(f"Database error: {error}")
+        elif on_result is not None:
+            result = future.result()
+            self.schedule(lambda dt: on_result(result))
+
+
+# In-memory copy of the mostly static catalog tables, patched by the write paths
+class Catalog:
+    def __init__(self):
+        self.loaded = False
+        self._groups = {}
+        self._exercises = {}
+        self._workouts = {}
+        self._group_exercises = {}
+        self._sorted_groups = None
+        self._sorted_exercises = {}
+
+    # Read the catalog tables in one pass, safe to call from a worker thread
+    @staticmethod
+    def fetch(conn):
+        groups = conn.execute("SELECT id, name FROM muscle_groups").fetchall()
+        exercises = conn.execute("SELECT id, name, muscle_group_id FROM exercises").fetchall()
+        workouts = conn.execute("SELECT id, name, timer FROM workouts").fetchall()
+        return groups, exercises, workouts
+
+    # Fill the indexes from fetched rows, unless another load got there first
+    def populate(self, rows):
+        if self.loaded:
+            return
+        groups, exercises, workouts = rows
+        self._groups = dict(groups)
+        self._workouts = {row[0]: row for row in workouts}
+        self._exercises = {}
+        self._group_exercises = {}
+        for exercise_id, name, group_id in exercises:
+            self._exercises[exercise_id] = (name, group_id)
+            self._group_exercises.setdefault(group_id, set()).add(exercise_id)
+        self._sorted_groups = None
+        self._sorted_exercises = {}
+        self.loaded = True
+
+    # Drop everything so the next reader reloads from the database
+    def invalidate(self):
+        self.loaded = False
+        self._groups = {}
+        self._exercises = {}
+        self._workouts = {}
+        self._group_exercises = {}
+        self._sorted_groups = None
+        self._sorted_exercises = {}
+
+    # Muscle group name by id
+    def group_name(self, group_id):
+        return self._groups.get(group_id)
+
+    # All muscle groups as (id, name), sorted by name
+    def groups(self):
+        if self._sorted_groups is None:
+            self._sorted_groups = sorted(self._groups.items(), key=lambda g: (g[1].casefold(), g[0]))
+        return self._sorted_groups
+
+    # Exercise (name, muscle_group_id) by id
+    def exercise(self, exercise_id):
+        return self._exercises.get(exercise_id)
+
+    # Exercises of a muscle group as (id, name), sorted by name
+    def exercises_in_group(self, group_id):
+        if group_id not in self._sorted_exercises:
+            rows = [(eid, self._exercises[eid][0]) for eid in self._group_exercises.get(group_id, ())]
+            self._sorted_exercises[group_id] = sorted(rows, key=lambda e: (e[1].casefold(), e[0]))
+        return self._sorted_exercises[group_id]
+
+    # Workout (id, name, timer) by id
+    def workout(self, workout_id):
+        return self._workouts.get(workout_id)
+
+    # All workouts as (id, name, timer), in creation order
+    def workouts(self):
+        return [self._workouts[wid] for wid in sorted(self._workouts)]
+
+    # Patch in a newly inserted muscle group
+    def add_group(self, group_id, name):
+        self._groups[group_id] = name
+        self._sorted_groups = None
+
+    # Remove a muscle group together with its exercises
+    def remove_group(self, group_id):
+        self._groups.pop(group_id, None)
+        for exercise_id in self._group_exercises.pop(group_id, ()):
+            self._exercises.pop(exercise_id, None)
+        self._sorted_exercises.pop(group_id, None)
+        self._sorted_groups = None
+
+    # Patch in a newly inserted exercise
+    def add_exercise(self, exercise_id, name, group_id):
+        self._exercises[exercise_id] = (name, group_id)
+        self._group_exercises.setdefault(group_id, set()).add(exercise_id)
+        self._sorted_exercises.pop(group_id, None)
+
+    # Drop a deleted exercise
+    def remove_exercise(self, exercise_id):
+        exercise = self._exercises.pop(exercise_id, None)
+        if exercise is not None:
+            self._group_exercises.get(exercise[1], set()).discard(exercise_id)
+            self._sorted_exercises.pop(exercise[1], None)
+
+    # Patch in a newly inserted workout
+    def add_workout(self, workout_id, name, timer):
+        self._workouts[workout_id] = (workout_id, name, timer)
+
+    # Drop a deleted workout
+    def remove_workout(self, workout_id):
+        self._workouts.pop(workout_id, None)
+
+
+# Buffers the sets of the running workout in memory and saves the session in one transaction.
+# The buffer is checkpointed to a JSON file so a crash loses at most one checkpoint interval.
+class SessionRecorder:
+    def __init__(self, checkpoint_prefix):
+        self.checkpoint_prefix = checkpoint_prefix
+        self._session = None
+        self._dirty = False
+
+    # Whether a session is being recorded
+    @property
+    def active(self):
+        return self._session is not None
+
+    # Workout of the session being recorded, or None
+    @property
+    def workout_id(self):
+        return self._session["workout_id"] if self._session else None
+
+    # Start buffering a new session for a workout
+    def start(self, workout_id):
+        self._session = {
+            "workout_id": workout_id,
+            "started_at": time.time(),
+            "ended_at": None,
+            "duration": None,
+            "sets": [],
+        }
+        self._dirty = True
+
+    # Log a completed set and return its index for the exercise
+    def log_set(self, exercise_id, reps, weight):
+        set_index = self.sets_done(exercise_id) + 1
+        self._session["sets"].append([exercise_id, set_index, reps, weight])
+        self._dirty = True
+        return set_index
+
+    # Number of sets logged so far for an exercise
+    def sets_done(self, exercise_id):
+        if not self._session:
+            return 0
+        return sum(1 for logged in self._session["sets"] if logged[0] == exercise_id)
+
+    # Persist the buffer to its checkpoint file if it changed, with the elapsed time if known
+    def checkpoint(self, duration=None):
+        if not self._session:
+            return
+        if duration is not None and duration != self._session["duration"]:
+            self._session["duration"] = duration
+            self._dirty = True
+        if self._dirty:
+            self._write_checkpoint(self._session)
+            self._dirty = False
+
+    # Close the running session and return it for saving, or None when no set was logged
+    def finish(self, duration):
+        session, self._session = self._session, None
+        if not session:
+            return None
+        if not session["sets"]:
+            self._remove_checkpoint(session)
+            return None
+        session["ended_at"] = time.time()
+        session["duration"] = duration
+        self._write_checkpoint(session)
+        return session
+
+    # Write a finished session and all its sets in a single transaction
+    def save(self, conn, session):
+        # The workout or some exercises may have been deleted while the session was running
+        c = conn.execute("""
+            INSERT OR IGNORE INTO workout_sessions (workout_id, started_at, ended_at, duration)
+            VALUES ((SELECT id FROM workouts WHERE id = ?), ?, ?, ?)
+        """, (session["workout_id"], session["started_at"], session["ended_at"], session["duration"]))
+        # Nothing inserted means it was saved before a crash and only the checkpoint was left
+        if c.rowcount:
+            session_id = c.lastrowid
+            conn.executemany("""
+                INSERT INTO session_sets (session_id, exercise_id, set_index, reps, weight)
+                SELECT ?, id, ?, ?, ? FROM exercises WHERE id = ?
+            """, [(session_id, set_index, reps, weight, exercise_id)
+                  for exercise_id, set_index, reps, weight in session["sets"]])
+        conn.commit()
+        self._remove_checkpoint(session)
+
+    # Save sessions left behind by a crash, returning how many were found
+    def recover(self, conn):
+        recovered = 0
+        for path in sorted(glob.glob(glob.escape(self.checkpoint_prefix) + "-*.json")):
+            try:
+                with open(path) as f:
+                    session = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Session checkpoint error: {e}")
+                continue
+            if session.get("sets"):
+                if session.get("ended_at") is None:
+                    session["ended_at"] = os.path.getmtime(path)
+                self.save(conn, session)
+                recovered += 1
+            else:
+                self._remove_checkpoint(session)
+        return recovered
+
+    def _write_checkpoint(self, session):
+        path = self._checkpoint_path(session)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(session, f)
+        os.replace(tmp_path, path)
+
+    def _checkpoint_path(self, session):
+        return f"{self.checkpoint_prefix}-{int(session['started_at'] * 1000)}.json"
+
+    def _remove_checkpoint(self, session):
+        try:
+            os.remove(self._checkpoint_path(session))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,92 @@
+# Parsed KV rule sets cached on disk, so that later launches skip parsing and compiling the rules.
+# A cache file is keyed by the KV file content and path, the Kivy version and the Python bytecode
+# version (compiled rule expressions are stored as code objects).
+import copyreg
+import hashlib
+import importlib.util
+import marshal
+import os
+import pickle
+import types
+
+import kivy
+from kivy.lang import Builder
+from kivy.lang import builder as builder_module
+from kivy.lang.parser import Parser
+
+CACHE_SUFFIX = ".kvc"
+
+
+def _reduce_code(code):
+    return marshal.loads, (marshal.dumps(code),)
+
+
+class _RulePickler(pickle.Pickler):
+    dispatch_table = {**copyreg.dispatch_table, types.CodeType: _reduce_code}
+
+
+# Load a KV file like Builder.load_file, from the cached rule set when it is up to date
+def load_file(path, cache_dir):
+    path = os.path.abspath(path)
+    with open(path, encoding="utf-8") as f:
+        content = f.read()
+
+    cache_path = cache_file(path, content, cache_dir)
+    parser = _read_cache(cache_path)
+    if parser is None:
+        parser = Parser(content=content, filename=path)
+        _write_cache(cache_path, parser)
+    else:
+        # Imports and constants declared with #: directives are not part of the cached rules
+        parser.execute_directives()
+    return _apply(parser, content, path)
+
+
+# Cache file of a KV file, one per file name and key
+def cache_file(path, content, cache_dir):
+    key = hashlib.sha256()
+    for part in (content, path, kivy.__version__):
+        key.update(part.encode("utf-8"))
+        key.update(b"\0")
+    key.update(importlib.util.MAGIC_NUMBER)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{name}-{key.hexdigest()[:16]}{CACHE_SUFFIX}")
+
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path, "rb") as f:
+            parser = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"KV cache read error: {e}")
+        return None
+    return parser if isinstance(parser, Parser) else None
+
+
+# Save a parsed rule set, removing the caches of earlier versions of the same file
+def _write_cache(cache_path, parser):
+    cache_dir = os.path.dirname(cache_path)
+    prefix = os.path.basename(cache_path).rsplit("-", 1)[0] + "-"
+    tmp_path = cache_path + ".tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            _RulePickler(f, pickle.HIGHEST_PROTOCOL).dump(parser)
+        os.replace(tmp_path, cache_path)
+        for name in os.listdir(cache_dir):
+            stale = os.path.join(cache_dir, name)
+            if name.startswith(prefix) and name.endswith(CACHE_SUFFIX) and stale != cache_path:
+                os.remove(stale)
+    except Exception as e:
+        print(f"KV cache write error: {e}")
+
+
+# Hand an already parsed rule set to the Builder, which otherwise only accepts KV source
+def _apply(parser, content, path):
+    builder_module.Parser = lambda **kwargs: parser
+    try:
+        return Builder.load_string(content, filename=path)
+    finally:
+        builder_module.Parser = Parser
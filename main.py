@@ -1,1057 +1,1469 @@
-# Import necessary KivyMD and Kivy components
-from kivymd.app import MDApp
-from kivy.lang import Builder
-from kivy.uix.screenmanager import ScreenManager, Screen
-from kivymd.uix.button import MDRaisedButton, MDIconButton
-from kivymd.uix.dialog import MDDialog
-from kivymd.uix.textfield import MDTextField
-from kivymd.uix.list import OneLineListItem, TwoLineListItem, MDList
-from kivymd.uix.boxlayout import MDBoxLayout
-from kivymd.uix.label import MDLabel
-from kivymd.uix.selectioncontrol import MDCheckbox
-from kivymd.uix.tab import MDTabs, MDTabsBase
-from kivymd.uix.card import MDCard
-from kivy.clock import Clock
-from kivy.metrics import dp
-from kivy.properties import StringProperty, ObjectProperty, BooleanProperty, NumericProperty
-from functools import partial
-from kivy.utils import get_color_from_hex, platform
-import sqlite3
-import os
-
-# Custom Tab class for MDTabs implementation
-class Tab(MDBoxLayout, MDTabsBase):
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.orientation = "vertical"
-
-# Custom list item for draggable functionality
-class DraggableListItem(MDList):
-    pass
-
-# Main menu screen class
-class MainMenu(Screen):
-    pass
-
-# Base screen class with common functionality
-class BaseScreen(Screen):
-    dialog = None
-    confirm_dialog = None
-    
-    # Show confirmation dialog with custom title, text and callback
-    def show_confirm_dialog(self, title, text, on_confirm):
-        self.confirm_dialog = MDDialog(
-            title=title,
-            text=text,
-            buttons=[
-                MDRaisedButton(
-                    text="ANNULLA",
-                    on_release=lambda x: self.dismiss_confirm_dialog()
-                ),
-                MDRaisedButton(
-                    text="CONFERMA",
-                    on_release=lambda x: self._handle_confirm(on_confirm)
-                ),
-            ],
-        )
-        self.confirm_dialog.open()
-    
-    # Dismiss confirmation dialog
-    def dismiss_confirm_dialog(self):
-        if self.confirm_dialog:
-            self.confirm_dialog.dismiss()
-            self.confirm_dialog = None
-    
-    # Handle confirmation callback
-    def _handle_confirm(self, callback):
-        if self.confirm_dialog:
-            self.confirm_dialog.dismiss()
-            self.confirm_dialog = None
-            callback()
-
-    # Get database connection with error handling
-    def get_db_connection(self):
-        try:
-            return sqlite3.connect(MDApp.get_running_app().get_database_path())
-        except sqlite3.Error as e:
-            print(f"Database connection error: {e}")
-            return None
-
-# Exercise Manager screen for handling muscle groups
-class ExerciseManager(BaseScreen):
-    def on_enter(self):
-        self.load_muscle_groups()
-    
-    # Show delete confirmation for muscle group
-    def show_delete_confirmation(self, group_id):
-        self.show_confirm_dialog(
-            "Conferma eliminazione",
-            "Sei sicuro di voler eliminare questo gruppo muscolare?",
-            lambda: self.delete_group(group_id)
-        )
-    
-    # Load and display muscle groups
-    def load_muscle_groups(self):
-        self.ids.muscle_group_list.clear_widgets()
-        conn = self.get_db_connection()
-        if not conn:
-            return
-        
-        try:
-            c = conn.cursor()
-            c.execute("SELECT * FROM muscle_groups")
-            groups = c.fetchall()
-            
-            for group in groups:
-                # Create list item with delete button for each group
-                item = OneLineListItem(text=group[1], text_color=(1, 1, 1, 1))
-                layout = MDBoxLayout(
-                    adaptive_height=True,
-                    spacing="10dp",
-                    padding=("10dp", "0dp", "10dp", "0dp")
-                )
-                
-                delete_btn = MDIconButton(
-                    icon="delete",
-                    theme_text_color="Custom",
-                    text_color=(1, 0, 0, 1),
-                    on_release=lambda x, gid=group[0]: self.show_delete_confirmation(gid)
-                )
-                
-                layout.add_widget(item)
-                layout.add_widget(delete_btn)
-                
-                item.bind(on_release=lambda x, gid=group[0]: self.show_exercises(gid))
-                self.ids.muscle_group_list.add_widget(layout)
-        finally:
-            conn.close()
-
-    # Show dialog to add new muscle group
-    def show_add_group_dialog(self):
-        if not self.dialog:
-            self.dialog = MDDialog(
-                title="Aggiungi Gruppo Muscolare",
-                type="custom",
-                content_cls=MDTextField(hint_text="Nome del gruppo muscolare"),
-                buttons=[
-                    MDRaisedButton(
-                        text="ANNULLA",
-                        on_release=lambda x: self.dialog.dismiss()
-                    ),
-                    MDRaisedButton(
-                        text="AGGIUNGI",
-                        on_release=lambda x: self.add_muscle_group()
-                    ),
-                ],
-            )
-        self.dialog.open()
-    
-    # Add new muscle group to database
-    def add_muscle_group(self):
-        if not self.dialog.content_cls.text:
-            return
-            
-        conn = self.get_db_connection()
-        if not conn:
-            return
-            
-        try:
-            c = conn.cursor()
-            c.execute("INSERT INTO muscle_groups (name) VALUES (?)",
-                     (self.dialog.content_cls.text,))
-            conn.commit()
-        finally:
-            conn.close()
-            
-        self.dialog.dismiss()
-        self.dialog = None
-        self.load_muscle_groups()
-    
-    # Delete muscle group and related exercises
-    def delete_group(self, group_id):
-        conn = self.get_db_connection()
-        if not conn:
-            return
-            
-        try:
-            c = conn.cursor()
-            # Delete related exercises first
-            c.execute("DELETE FROM exercises WHERE muscle_group_id = ?", (group_id,))
-            # Then delete the group
-            c.execute("DELETE FROM muscle_groups WHERE id = ?", (group_id,))
-            conn.commit()
-        finally:
-            conn.close()
-        self.load_muscle_groups()
-    
-    # Navigate to exercise list screen
-    def show_exercises(self, group_id):
-        screen = self.manager.get_screen('exercise_list')
-        screen.current_group = group_id
-        screen.load_exercises()
-        self.manager.current = 'exercise_list'
-
-# Exercise List screen for managing exercises within a muscle group
-class ExerciseList(BaseScreen):
-    current_group = NumericProperty(None)
-    
-    def on_enter(self):
-        if self.current_group:
-            self.load_exercises()
-    
-    # Load and display exercises for selected muscle group
-    def load_exercises(self):
-        conn = self.get_db_connection()
-        if not conn:
-            return
-            
-        try:
-            c = conn.cursor()
-            # Get muscle group name
-            c.execute("SELECT name FROM muscle_groups WHERE id = ?", (self.current_group,))
-            group_name = c.fetchone()[0]
-            self.ids.topbar.title = f"Esercizi - {group_name}"
-            
-            # Load exercises
-            self.ids.exercise_list.clear_widgets()
-            c.execute("SELECT id, name FROM exercises WHERE muscle_group_id = ?", (self.current_group,))
-            exercises = c.fetchall()
-            
-            for exercise in exercises:
-                self._add_exercise_item(exercise)
-        finally:
-            conn.close()
-    
-    # Add exercise item to the list with delete button
-    def _add_exercise_item(self, exercise):
-        item = OneLineListItem(text=exercise[1])
-        layout = MDBoxLayout(
-            adaptive_height=True,
-            spacing="10dp",
-            padding=("10dp", "0dp", "10dp", "0dp")
-        )
-        
-        delete_btn = MDIconButton(
-            icon="delete",
-            theme_text_color="Custom",
-            text_color=(1, 0, 0, 1),
-            on_release=lambda x, eid=exercise[0]: self.show_delete_confirmation(eid)
-        )
-        
-        layout.add_widget(item)
-        layout.add_widget(delete_btn)
-        self.ids.exercise_list.add_widget(layout)
-    
-    # Show delete confirmation for exercise
-    def show_delete_confirmation(self, exercise_id):
-        self.show_confirm_dialog(
-            "Conferma eliminazione",
-            "Sei sicuro di voler eliminare questo esercizio?",
-            lambda: self.delete_exercise(exercise_id)
-        )
-    
-    # Show dialog to add new exercise
-    def show_add_exercise_dialog(self):
-        if not self.dialog:
-            self.dialog = MDDialog(
-                title="Aggiungi Esercizio",
-                type="custom",
-                content_cls=MDTextField(hint_text="Nome dell'esercizio"),
-                buttons=[
-                    MDRaisedButton(
-                        text="ANNULLA",
-                        on_release=lambda x: self.dialog.dismiss()
-                    ),
-                    MDRaisedButton(
-                        text="AGGIUNGI",
-                        on_release=lambda x: self.add_exercise()
-                    ),
-                ],
-            )
-        self.dialog.open()
-    
-    # Add new exercise to database
-    def add_exercise(self):
-        if not self.dialog.content_cls.text:
-            return
-            
-        conn = self.get_db_connection()
-        if not conn:
-            return
-            
-        try:
-            c = conn.cursor()
-            c.execute("""
-                INSERT INTO exercises (name, muscle_group_id)
-                VALUES (?, ?)
-            """, (self.dialog.content_cls.text, self.current_group))
-            conn.commit()
-        finally:
-            conn.close()
-            
-        self.dialog.dismiss()
-        self.dialog = None
-        self.load_exercises()
-    
-    # Delete exercise from database
-    def delete_exercise(self, exercise_id):
-        conn = self.get_db_connection()
-        if not conn:
-            return
-            
-        try:
-            c = conn.cursor()
-            c.execute("DELETE FROM exercises WHERE id = ?", (exercise_id,))
-            conn.commit()
-        finally:
-            conn.close()
-        self.load_exercises()
-
-# Workout Creator screen for managing workout routines
-class WorkoutCreator(BaseScreen):
-    def on_enter(self):
-        self.load_workouts()
-    
-    # Load and display workout routines
-    def load_workouts(self):
-        conn = self.get_db_connection()
-        if not conn:
-            return
-            
-        try:
-            c = conn.cursor()
-            c.execute("SELECT id, name, timer FROM workouts")
-            workouts = c.fetchall()
-            
-            self.ids.workout_list.clear_widgets()
-            for workout in workouts:
-                self._add_workout_item(workout)
-        finally:
-            conn.close()
-    
-    # Add workout item to the list with timer and delete button
-    def _add_workout_item(self, workout):
-        item = TwoLineListItem(
-            text=workout[1],
-            secondary_text=f"Timer: {workout[2]} min"
-        )
-        
-        layout = MDBoxLayout(
-            adaptive_height=True,
-            spacing="10dp",
-            padding=("10dp", "0dp", "10dp", "0dp")
-        )
-        
-        delete_btn = MDIconButton(
-            icon="delete",
-            theme_text_color="Custom",
-            text_color=(1, 0, 0, 1),
-            on_release=lambda x, wid=workout[0]: self.show_delete_confirmation(wid)
-        )
-        
-        item.bind(on_release=lambda x, wid=workout[0]: self.show_workout_detail(wid))
-        layout.add_widget(item)
-        layout.add_widget(delete_btn)
-        self.ids.workout_list.add_widget(layout)
-
-    # Show delete confirmation for workout
-    def show_delete_confirmation(self, workout_id):
-        self.show_confirm_dialog(
-            "Conferma eliminazione",
-            "Sei sicuro di voler eliminare questa scheda?",
-            lambda: self.delete_workout(workout_id)
-        )
-    
-    # Delete workout and related exercises
-    def delete_workout(self, workout_id):
-        conn = self.get_db_connection()
-        if not conn:
-            return
-            
-        try:
-            c = conn.cursor()
-            # Delete workout exercises first
-            c.execute("DELETE FROM workout_exercises WHERE workout_id = ?", (workout_id,))
-            # Then delete the workout
-            c.execute("DELETE FROM workouts WHERE id = ?", (workout_id,))
-            conn.commit()
-        finally:
-            conn.close()
-        self.load_workouts()
-    
-    # Show dialog to add new workout
-    def show_add_workout_dialog(self):
-        if not self.dialog:
-            # Create input fields for workout name and timer
-            content = MDBoxLayout(
-                orientation='vertical',
-                spacing="10dp",
-                padding="10dp",
-                size_hint_y=None,
-                height="120dp"
-            )
-            
-            content.add_widget(MDTextField(
-                hint_text="Nome Scheda",
-                mode="rectangle",
-            ))
-            
-            content.add_widget(MDTextField(
-                hint_text="Timer (minuti)",
-                mode="rectangle",
-                input_filter="int"
-            ))
-            
-            self.dialog = MDDialog(
-                title="Nuova Scheda",
-                type="custom",
-                content_cls=content,
-                buttons=[
-                    MDRaisedButton(
-                        text="ANNULLA",
-                        on_release=lambda x: self.dialog.dismiss()
-                    ),
-                    MDRaisedButton(
-                        text="CREA",
-                        on_release=lambda x: self.add_workout()
-                    ),
-                ],
-            )
-        self.dialog.open()
-
-    # Add new workout to database
-    def add_workout(self):
-        content = self.dialog.content_cls
-        name = content.children[1].text
-        timer = content.children[0].text
-        
-        if not name or not timer:
-            return
-            
-        conn = self.get_db_connection()
-        if not conn:
-            return
-            
-        try:
-            c = conn.cursor()
-            # Insert new workout
-            c.execute("INSERT INTO workouts (name, timer) VALUES (?, ?)",
-                     (name, int(timer)))
-            workout_id = c.lastrowid
-            conn.commit()
-            
-            self.dialog.dismiss()
-            self.dialog = None
-            self.show_workout_detail(workout_id)
-        finally:
-            conn.close()
-    
-    # Navigate to workout detail screen
-    def show_workout_detail(self, workout_id):
-        screen = self.manager.get_screen('workout_detail')
-        screen.workout_id = workout_id
-        screen.load_workout()
-        self.manager.current = 'workout_detail'
-
-# Workout Detail screen for managing exercises within a workout
-class WorkoutDetail(BaseScreen):
-    workout_id = NumericProperty(None)
-    selected_group = NumericProperty(None)
-    
-    # Load workout details and exercises
-    def load_workout(self):
-        if not self.workout_id:
-            return
-            
-        conn = self.get_db_connection()
-        if not conn:
-            return
-            
-        try:
-            c = conn.cursor()
-            # Get workout name
-            c.execute("SELECT name FROM workouts WHERE id = ?", (self.workout_id,))
-            workout_name = c.fetchone()[0]
-            self.ids.detail_topbar.title = f"Modifica - {workout_name}"
-        finally:
-            conn.close()
-            
-        self.load_groups()
-        self.load_preview()
-
-    # Load and display muscle groups
-    def load_groups(self):
-        conn = self.get_db_connection()
-        if not conn:
-            return
-            
-        try:
-            c = conn.cursor()
-            c.execute("SELECT id, name FROM muscle_groups")
-            groups = c.fetchall()
-            
-            self.ids.group_list.clear_widgets()
-            for group in groups:
-                item = OneLineListItem(text=group[1])
-                item.bind(on_release=lambda x, gid=group[0]: self.select_group(gid))
-                self.ids.group_list.add_widget(item)
-        finally:
-            conn.close()
-    
-    # Select muscle group and load its exercises
-    def select_group(self, group_id):
-        self.selected_group = group_id
-        self.load_exercises(group_id)
-        self.ids.tabs.switch_tab("Esercizi")
-    
-    # Load exercises for selected muscle group
-    def load_exercises(self, group_id):
-        self.selected_group = group_id
-        conn = self.get_db_connection()
-        if not conn:
-            return
-            
-        try:
-            c = conn.cursor()
-            c.execute("SELECT id, name FROM exercises WHERE muscle_group_id = ?", (group_id,))
-            exercises = c.fetchall()
-            
-            self.ids.exercise_list.clear_widgets()
-            for exercise in exercises:
-                self._add_exercise_item(exercise)
-        finally:
-            conn.close()
-
-    # Add exercise item to list with add button
-    def _add_exercise_item(self, exercise):
-        ex_layout = MDBoxLayout(
-            orientation='horizontal',
-            adaptive_height=True,
-            spacing="10dp",
-            padding=["10dp", "5dp", "10dp", "5dp"]
-        )
-        
-        item = OneLineListItem(text=exercise[1])
-        add_btn = MDIconButton(
-            icon="plus",
-            on_release=lambda x, eid=exercise[0], name=exercise[1]: self.show_add_exercise_dialog(eid, name)
-        )
-        
-        ex_layout.add_widget(item)
-        ex_layout.add_widget(add_btn)
-        self.ids.exercise_list.add_widget(ex_layout)
-    
-    # Show dialog to add exercise to workout
-    def show_add_exercise_dialog(self, exercise_id, exercise_name):
-        if not self.dialog:
-            content = MDBoxLayout(
-                orientation='vertical',
-                spacing="10dp",
-                padding="10dp",
-                size_hint_y=None,
-                height="120dp"
-            )
-            
-            # Fields for sets and reps
-            content.add_widget(MDTextField(
-                hint_text="Serie",
-                mode="rectangle",
-                input_filter="int"
-            ))
-            
-            content.add_widget(MDTextField(
-                hint_text="Ripetizioni",
-                mode="rectangle",
-                input_filter="int"
-            ))
-            
-            self.dialog = MDDialog(
-                title=f"Aggiungi {exercise_name}",
-                type="custom",
-                content_cls=content,
-                buttons=[
-                    MDRaisedButton(
-                        text="ANNULLA",
-                        on_release=lambda x: self.dialog.dismiss()
-                    ),
-                    MDRaisedButton(
-                        text="AGGIUNGI",
-                        on_release=lambda x, eid=exercise_id: self.add_exercise_to_workout(eid)
-                    ),
-                ],
-            )
-        self.dialog.open()
-    
-    # Add exercise to workout with sets and reps
-    def add_exercise_to_workout(self, exercise_id):
-        content = self.dialog.content_cls
-        sets = content.children[1].text
-        reps = content.children[0].text
-        
-        if not sets or not reps:
-            return
-            
-        conn = self.get_db_connection()
-        if not conn:
-            return
-            
-        try:
-            c = conn.cursor()
-            c.execute("""
-                INSERT INTO workout_exercises (workout_id, exercise_id, sets, reps)
-                VALUES (?, ?, ?, ?)
-            """, (self.workout_id, exercise_id, int(sets), int(reps)))
-            conn.commit()
-        finally:
-            conn.close()
-            
-        self.dialog.dismiss()
-        self.dialog = None
-        self.load_preview()
-
-    # Load workout preview with exercises grouped by muscle group
-    def load_preview(self):
-        conn = self.get_db_connection()
-        if not conn:
-            return
-            
-        try:
-            c = conn.cursor()
-            # Get exercises with muscle group info
-            c.execute("""
-                SELECT mg.name as group_name, e.name as ex_name, we.sets, we.reps, we.id
-                FROM workout_exercises we
-                JOIN exercises e ON we.exercise_id = e.id
-                JOIN muscle_groups mg ON e.muscle_group_id = mg.id
-                WHERE we.workout_id = ?
-                ORDER BY mg.name
-            """, (self.workout_id,))
-            exercises = c.fetchall()
-            
-            self.ids.preview_list.clear_widgets()
-            current_group = None
-            for group_name, ex_name, sets, reps, exercise_id in exercises:
-                if group_name != current_group:
-                    current_group = group_name
-                    self._add_group_header(group_name)
-                self._add_exercise_preview(ex_name, sets, reps, exercise_id)
-        finally:
-            conn.close()
-    
-    # Add muscle group header to preview
-    def _add_group_header(self, group_name):
-        self.ids.preview_list.add_widget(
-            MDLabel(
-                text=group_name,
-                theme_text_color="Custom",
-                text_color=(1, 1, 1, 1),
-                bold=True,
-                size_hint_y=None,
-                height="40dp"
-            )
-        )
-    
-    # Add exercise item to preview with delete button
-    def _add_exercise_preview(self, ex_name, sets, reps, exercise_id):
-        exercise_layout = MDBoxLayout(
-            orientation='horizontal',
-            adaptive_height=True,
-            spacing="10dp"
-        )
-
-        exercise_layout.add_widget(
-            OneLineListItem(text=f"{ex_name}: {sets}x{reps}")
-        )
-
-        delete_btn = MDIconButton(
-            icon="delete",
-            theme_text_color="Custom",
-            text_color=(1, 0, 0, 1),
-            on_release=lambda x, eid=exercise_id: self.show_delete_confirmation(eid)
-        )
-        exercise_layout.add_widget(delete_btn)
-        
-        self.ids.preview_list.add_widget(exercise_layout)
-    
-    # Show delete confirmation for exercise in workout
-    def show_delete_confirmation(self, exercise_id):
-        self.show_confirm_dialog(
-            "Conferma eliminazione",
-            "Sei sicuro di voler eliminare questo esercizio dalla scheda?",
-            lambda: self.delete_exercise(exercise_id)
-        )
-    
-    # Delete exercise from workout
-    def delete_exercise(self, exercise_id):
-        conn = self.get_db_connection()
-        if not conn:
-            return
-            
-        try:
-            c = conn.cursor()
-            c.execute("DELETE FROM workout_exercises WHERE id = ?", (exercise_id,))
-            conn.commit()
-        finally:
-            conn.close()
-        self.load_preview()
-
-# Workout Executor screen for running workouts
-class WorkoutExecutor(BaseScreen):
-    timer_active = BooleanProperty(False)
-    current_time = NumericProperty(0)
-    selected_workout = ObjectProperty(None)
-    background_mode = BooleanProperty(False)
-    
-    def on_enter(self):
-        self._update_view_state(True)
-        self.load_workouts()
-        Clock.schedule_interval(self.update_timer, 1)
-
-    def on_leave(self):
-        if not self.background_mode:
-            Clock.unschedule(self.update_timer)
-
-    # Update view state between selection and execution screens
-    def _update_view_state(self, show_selection):
-        self.ids.workout_screen_manager.current = 'selection' if show_selection else 'execution'
-    
-    # Load available workouts
-    def load_workouts(self):
-        conn = self.get_db_connection()
-        if not conn: 
-            return
-            
-        try:
-            c = conn.cursor()
-            c.execute("SELECT id, name, timer FROM workouts")
-            workouts = c.fetchall()
-            
-            self.ids.execution_list.clear_widgets()
-            for workout in workouts:
-                self.ids.execution_list.add_widget(
-                    MDBoxLayout(size_hint_y=None, height="10dp")
-                )
-                self._add_workout_card(workout)
-        finally:
-            conn.close()
-    
-    # Add workout card with timer info
-    def _add_workout_card(self, workout):
-        card = MDCard(
-            size_hint=(0.9, None),
-            height="80dp",
-            md_bg_color=get_color_from_hex("#283593"),
-            radius=[8],
-            pos_hint={"center_x": 0.5},
-            elevation=0,
-            ripple_behavior=True,
-            on_release=lambda x: self.select_workout(workout)
-        )
-        
-        box = MDBoxLayout(
-            orientation='vertical',
-            padding=["20dp", "10dp"]
-        )
-        
-        box.add_widget(MDLabel(
-            text=workout[1],
-            halign="center",
-            theme_text_color="Custom",
-            text_color=(1, 1, 1, 1),
-            bold=True
-        ))
-        
-        box.add_widget(MDLabel(
-            text=f"Timer: {workout[2]} min",
-            halign="center",
-            theme_text_color="Custom",
-            text_color=(0.8, 0.8, 0.8, 1),
-            font_style="Caption"
-        ))
-        
-        card.add_widget(box)
-        self.ids.execution_list.add_widget(card)
-    
-    # Select workout and initialize timer
-    def select_workout(self, workout):
-        self.selected_workout = workout
-        self.current_time = workout[2] * 60
-        self.update_timer_display()
-        self.load_workout_exercises(workout[0])
-        self._update_view_state(False)
-    
-    # Load exercises for selected workout
-    def load_workout_exercises(self, workout_id):
-        conn = self.get_db_connection()
-        if not conn: 
-            return
-            
-        try:
-            c = conn.cursor()
-            # Get exercises with weight information
-            c.execute("""
-                SELECT mg.name, e.name, we.sets, we.reps, we.id, e.id, 
-                    COALESCE((SELECT weight FROM exercise_weights WHERE exercise_id = e.id), 0) as weight
-                FROM workout_exercises we
-                JOIN exercises e ON we.exercise_id = e.id
-                JOIN muscle_groups mg ON e.muscle_group_id = mg.id
-                WHERE we.workout_id = ?
-                ORDER BY mg.name
-            """, (workout_id,))
-            exercises = c.fetchall()
-            
-            self.ids.exercise_execution_list.clear_widgets()
-            current_group = None
-            exercise_count = 1
-            
-            for group, exercise, sets, reps, we_id, ex_id, weight in exercises:
-                if group != current_group:
-                    current_group = group
-                    self._add_group_label(group)
-                self._add_exercise_box(exercise_count, exercise, sets, reps, we_id, ex_id, weight)
-                exercise_count += 1
-        finally:
-            conn.close()
-
-    # Add group label to exercise list
-    def _add_group_label(self, group):
-        self.ids.exercise_execution_list.add_widget(
-            MDLabel(
-                text=group,
-                theme_text_color="Custom",
-                text_color=(1, 1, 1, 1),
-                bold=True,
-                size_hint_y=None,
-                height="50dp",
-                padding=["20dp", "10dp"]
-            )
-        )
-    
-    # Add exercise box with weight tracking
-    def _add_exercise_box(self, number, exercise, sets, reps, we_id, ex_id, weight):
-        card = MDCard(
-            orientation='horizontal',
-            size_hint_y=None,
-            height="70dp",
-            md_bg_color=get_color_from_hex("#283593"),
-            radius=[8],
-            padding=["16dp", "8dp"],
-            spacing="8dp",
-            elevation=0
-        )
-        
-        # Exercise info layout
-        info_box = MDBoxLayout(
-            orientation='vertical',
-            size_hint_x=0.6,
-            spacing="4dp"
-        )
-        
-        info_box.add_widget(MDLabel(
-            text=f"{exercise}",
-            theme_text_color="Custom",
-            text_color=(1, 1, 1, 1),
-            font_style="H6",
-            bold=True
-        ))
-        
-        info_box.add_widget(MDLabel(
-            text=f"{sets}x{reps}",
-            theme_text_color="Custom",
-            text_color=(0.9, 0.9, 0.9, 1),
-            font_style="Body1"
-        ))
-        
-        card.add_widget(info_box)
-        
-        # Weight tracking layout
-        weight_layout = MDBoxLayout(
-            orientation='horizontal',
-            size_hint_x=0.4,
-            spacing="4dp"
-        )
-        
-        saved_weight_label = MDLabel(
-            text=f"[{str(weight)}kg]" if weight > 0 else "",
-            theme_text_color="Custom",
-            text_color=(0.9, 0.9, 0.9, 1),
-            size_hint_x=0.4
-        )
-        weight_layout.add_widget(saved_weight_label)
-
-        # Weight input field with auto-save
-        def on_text(instance, value):
-            try:
-                if value:
-                    weight = float(value)
-                    saved_weight_label.text = f"[{weight}kg]"
-                    self.save_weight(ex_id, value)
-                else:
-                    saved_weight_label.text = ""
-            except ValueError:
-                pass
-
-        weight_field = MDTextField(
-            text="",
-            hint_text="kg",
-            size_hint_x=0.6,
-            input_filter="float",
-            text_color_normal=(1, 1, 1, 1),
-            text_color_focus=(1, 1, 1, 1),
-            mode="line",
-            line_color_focus=(1, 1, 1, 1)
-        )
-        weight_field.bind(text=on_text)
-        weight_layout.add_widget(weight_field)
-        
-        card.add_widget(weight_layout)
-        self.ids.exercise_execution_list.add_widget(card)
-    
-    # Save weight for exercise
-    def save_weight(self, exercise_id, weight_text):
-        if not weight_text: 
-            return
-            
-        try:
-            weight = float(weight_text)
-            conn = self.get_db_connection()
-            if not conn:
-                return
-                
-            try:
-                c = conn.cursor()
-                # Check if weight record exists
-                c.execute("SELECT id FROM exercise_weights WHERE exercise_id = ?", (exercise_id,))
-                exists = c.fetchone()
-                
-                if exists:
-                    c.execute("""UPDATE exercise_weights 
-                               SET weight = ?, last_updated = CURRENT_TIMESTAMP 
-                               WHERE exercise_id = ?""", (weight, exercise_id))
-                else:
-                    c.execute("""INSERT INTO exercise_weights (exercise_id, weight)
-                               VALUES (?, ?)""", (exercise_id, weight))
-                conn.commit()
-            finally:
-                conn.close()
-        except ValueError:
-            return
-    
-    # Update timer every second
-    def update_timer(self, dt):
-        if self.timer_active and self.current_time > 0:
-            self.current_time -= 1
-            self.update_timer_display()
-            if self.current_time == 0:
-                self.timer_active = False
-    
-    # Update timer display
-    def update_timer_display(self):
-        minutes = self.current_time // 60
-        seconds = self.current_time % 60
-        self.ids.timer_label.text = f"{minutes:02d}:{seconds:02d}"
-    
-    # Toggle timer start/stop
-    def toggle_timer(self):
-        if not self.selected_workout:
-            return
-        self.timer_active = not self.timer_active
-    
-    # Reset timer to initial value
-    def reset_workout_timer(self):
-        if not self.selected_workout:
-            return
-        self.current_time = self.selected_workout[2] * 60
-        self.update_timer_display()
-        self.timer_active = False
-
-# Main application class
-class WorkoutApp(MDApp):
-    # Get platform-specific database path
-    def get_database_path(self):
-        if platform == 'android':
-            from android.storage import app_storage_path
-            return os.path.join(app_storage_path(), 'workout.db')
-        return 'workout.db'
-
-    # Get database connection
-    def get_db_connection(self):
-        try:
-            return sqlite3.connect(self.get_database_path())
-        except sqlite3.Error as e:
-            print(f"Database connection error: {e}")
-            return None
-
-    # Build application
-    def build(self):
-        # Set theme colors
-        self.theme_cls.primary_palette = "Blue"
-        self.theme_cls.primary_hue = "900"
-        self.theme_cls.accent_palette = "DeepOrange"
-        self.theme_cls.theme_style = "Dark"
-        
-        self.create_database()
-        
-        # Create screen manager and add screens
-        sm = ScreenManager()
-        
-        sm.add_widget(MainMenu(name='menu'))
-        sm.add_widget(ExerciseManager(name='exercises'))
-        sm.add_widget(ExerciseList(name='exercise_list'))
-        sm.add_widget(WorkoutCreator(name='creator'))
-        sm.add_widget(WorkoutDetail(name='workout_detail'))
-        sm.add_widget(WorkoutExecutor(name='executor'))
-        
-        Builder.load_file('workout.kv')
-        return sm
-
-    # Create database tables
-    def create_database(self):
-        conn = self.get_db_connection()
-        if not conn:
-            return
-            
-        try:
-            c = conn.cursor()
-            
-            # Create muscle groups table
-            c.execute('''CREATE TABLE IF NOT EXISTS muscle_groups
-                        (id INTEGER PRIMARY KEY, name TEXT UNIQUE)''')
-            
-            # Create exercises table
-            c.execute('''CREATE TABLE IF NOT EXISTS exercises
-                        (id INTEGER PRIMARY KEY,
-                        name TEXT,
-                        muscle_group_id INTEGER,
-                        FOREIGN KEY (muscle_group_id) REFERENCES muscle_groups (id))''')
-            
-            # Create workouts table
-            c.execute('''CREATE TABLE IF NOT EXISTS workouts
-                        (id INTEGER PRIMARY KEY,
-                        name TEXT,
-                        timer INTEGER)''')
-            
-            # Create workout exercises table
-            c.execute('''CREATE TABLE IF NOT EXISTS workout_exercises
-                        (id INTEGER PRIMARY KEY,
-                        workout_id INTEGER,
-                        exercise_id INTEGER,
-                        sets INTEGER,
-                        reps INTEGER,
-                        FOREIGN KEY (workout_id) REFERENCES workouts (id),
-                        FOREIGN KEY (exercise_id) REFERENCES exercises (id))''')
-            
-            # Create exercise weights table
-            c.execute('''CREATE TABLE IF NOT EXISTS exercise_weights
-                        (id INTEGER PRIMARY KEY,
-                        exercise_id INTEGER UNIQUE,
-                        weight REAL,
-                        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (exercise_id) REFERENCES exercises (id))''')
-            
-            conn.commit()
-        finally:
-            conn.close()
-
-if __name__ == '__main__':
+import sys
+
+# Headless import/export and maintenance commands, handled before Kivy is loaded
+if __name__ == '__main__' and len(sys.argv) > 1 and sys.argv[1] in ('import', 'export', 'rebuild-records'):
+    from transfer import run_cli
+    sys.exit(run_cli(sys.argv[1:]))
+if __name__ == '__main__' and len(sys.argv) > 1 and sys.argv[1] == 'sync':
+    from sync import run_cli
+    sys.exit(run_cli(sys.argv[2:]))
+
+# Startup profiling, enabled with the WORKOUT_PROFILE environment variable.
+# Kivy and KivyMD imports are timed from here on.
+from profiler import profiler
+profiler.track_imports()
+
+# Import necessary KivyMD and Kivy components
+from kivymd.app import MDApp
+from kivy.uix.screenmanager import ScreenManager, Screen
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview import views as recycle_views
+from kivy.uix.recycleview.views import RecycleDataAdapter, RecycleDataViewBehavior
+from kivymd.uix.boxlayout import MDBoxLayout
+from kivymd.uix.tab import MDTabsBase
+from kivymd.uix.card import MDCard
+from kivy.clock import Clock
+from kivy.core.window import Window
+from kivy.metrics import dp
+from kivy.properties import StringProperty, ObjectProperty, BooleanProperty, NumericProperty
+from functools import partial
+import bisect
+from kivy.utils import platform
+from database import (Catalog, ConnectionManager, ExerciseRecord, QueryExecutor, SessionRecorder,
+                      WeightWriteQueue, apply_migrations, load_preview_row, load_workout_detail,
+                      load_workout_run, raise_record, search_exercises)
+import kvcache
+from progression import ProgressionEngine
+from timers import TimerEngine
+import os
+
+profiler.mark("imports done")
+
+# KV files are looked up next to this module, whatever the working directory
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Delay after the last keystroke before an exercise search runs
+SEARCH_DELAY = 0.25
+
+# Rest countdown started each time a set is logged
+REST_SECONDS = 90
+
+# Unused rows of each row class kept for reuse by the lists. RecycleView rebinds pooled rows to new
+# data, so reopening or switching workouts reuses the execution cards and group labels already built.
+ROW_POOL_SIZE = 120
+
+# Drop pooled rows beyond limit for the given row classes, or for every class.
+# Kivy has no public setting for its view cache, so this trims the module-level cache of
+# kivy.uix.recycleview.views (_cached_views and _cache_count, as of Kivy 2.3) directly.
+# Other Kivy versions may not have them, then the pool is left to Kivy.
+def trim_row_pool(limit=0, row_classes=None):
+    cached_views = getattr(recycle_views, "_cached_views", None)
+    if not isinstance(cached_views, dict) or not hasattr(recycle_views, "_cache_count"):
+        return
+    for row_class, rows in cached_views.items():
+        if row_classes is None or row_class in row_classes:
+            del rows[limit:]
+    recycle_views._cache_count = sum(len(rows) for rows in cached_views.values())
+
+# View adapter of RowList: once its rows go back to Kivy's shared cache, keep at most
+# ROW_POOL_SIZE of each of its row classes. Other RecycleViews keep Kivy's own cache limit.
+class RowPoolAdapter(RecycleDataAdapter):
+    def invalidate(self):
+        row_classes = {view.__class__ for view in self.views.values()}
+        row_classes.update(self.dirty_views)
+        super().invalidate()
+        trim_row_pool(ROW_POOL_SIZE, row_classes)
+
+# Custom Tab class for MDTabs implementation
+class Tab(MDBoxLayout, MDTabsBase):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.orientation = "vertical"
+
+# Virtualized list laid out in workout.kv, only the visible rows are instantiated
+class RowList(RecycleView):
+    def __init__(self, **kwargs):
+        kwargs.setdefault("view_adapter", RowPoolAdapter())
+        super().__init__(**kwargs)
+
+# Row of a RecycleView list, filled from one entry of the list data
+class RecycledRow(RecycleDataViewBehavior):
+    rv = None
+    index = None
+
+    def refresh_view_attrs(self, rv, index, data):
+        self.rv = rv
+        self.index = index
+        return super().refresh_view_attrs(rv, index, data)
+
+    # Write a changed value back to the row data so it survives recycling
+    def store(self, key, value):
+        self.rv.data[self.index][key] = value
+
+# List row with a tappable label and a delete or add action, or a selection toggle in multi-select mode
+class ActionRow(RecycledRow, MDBoxLayout):
+    item_id = NumericProperty(0)
+    text = StringProperty("")
+    secondary_text = StringProperty("")
+    icon = StringProperty("")
+    tap = ObjectProperty(None, allownone=True)
+    action = ObjectProperty(None, allownone=True)
+    select = ObjectProperty(None, allownone=True)
+    selection_mode = BooleanProperty(False)
+    selected = BooleanProperty(False)
+
+    def on_row_press(self):
+        if self.selection_mode:
+            self.toggle_selected()
+        elif self.tap:
+            self.tap()
+
+    def on_row_action(self):
+        if self.selection_mode:
+            self.toggle_selected()
+        elif self.action:
+            self.action()
+
+    def toggle_selected(self):
+        self.selected = not self.selected
+        self.store("selected", self.selected)
+        self.select(self.item_id, self.selected)
+
+# Single line row, laid out in workout.kv
+class ListRow(ActionRow):
+    pass
+
+# Two line row, laid out in workout.kv
+class TwoLineRow(ActionRow):
+    pass
+
+# Workout card of the executor selection list
+class WorkoutCardRow(RecycledRow, MDCard):
+    text = StringProperty("")
+    secondary_text = StringProperty("")
+    tap = ObjectProperty(None, allownone=True)
+
+# Executor card of one workout exercise, with weight tracking and set logging
+class ExerciseCardRow(RecycledRow, MDCard):
+    screen = ObjectProperty(None)
+    exercise_id = NumericProperty(0)
+    text = StringProperty("")
+    sets = NumericProperty(0)
+    reps = NumericProperty(0)
+    weight = NumericProperty(0)
+    weight_text = StringProperty("")
+    # Reps done in the next set when fewer or more than the target, typed by the user
+    reps_text = StringProperty("")
+    weight_label = StringProperty("")
+    sets_text = StringProperty("")
+    rest_text = StringProperty("")
+    record_text = StringProperty("")
+    # Suggested weight for this session, shown as the hint of the weight field
+    target_weight = NumericProperty(0)
+    _refreshing = False
+
+    def refresh_view_attrs(self, rv, index, data):
+        # Filling the weight field from the data must not save it again
+        self._refreshing = True
+        try:
+            result = super().refresh_view_attrs(rv, index, data)
+            self.sets_text = self.screen._sets_text(self.sets, self.reps, self.exercise_id)
+            self.rest_text = self.screen._rest_text(self.exercise_id)
+            self.record_text = self.screen._record_text(self.exercise_id)
+        finally:
+            self._refreshing = False
+        return result
+
+    # Weight input with auto-save
+    def update_weight(self, value):
+        if self._refreshing or value == self.weight_text:
+            return
+        self.weight_text = value
+        self.store("weight_text", value)
+        if value:
+            try:
+                weight = float(value)
+            except ValueError:
+                return
+            self.weight_label = f"[{weight}kg]"
+            self.screen.save_weight(self.exercise_id, value)
+        else:
+            self.weight_label = ""
+        self.store("weight_label", self.weight_label)
+
+    # Reps input of the next set, kept with the row data
+    def update_reps(self, value):
+        if self._refreshing or value == self.reps_text:
+            return
+        self.reps_text = value
+        self.store("reps_text", value)
+
+    # Log a completed set with the typed reps, or else the target ones, and the typed weight,
+    # or else the suggested or the saved one. The next set starts again from the target reps.
+    def on_set_done(self):
+        try:
+            set_weight = float(self.weight_text)
+        except ValueError:
+            set_weight = self.target_weight or self.weight or None
+        try:
+            set_reps = int(self.reps_text)
+        except ValueError:
+            set_reps = self.reps
+        self.screen.log_set(self.exercise_id, set_reps, set_weight)
+        self.update_reps("")
+        self.sets_text = self.screen._sets_text(self.sets, self.reps, self.exercise_id)
+        self.rest_text = self.screen._rest_text(self.exercise_id)
+        self.record_text = self.screen._record_text(self.exercise_id)
+
+# Dialogs shared by every screen. Each kind is built once and reconfigured on every open.
+class DialogRegistry:
+    # Kinds built ahead of their first use, one per frame
+    KINDS = ("confirm", "prompt1", "prompt2")
+
+    def __init__(self):
+        self._dialogs = {}
+        self._on_submit = None
+
+    # Build the dialogs during idle time after startup
+    def prebuild(self, *args):
+        pending = [kind for kind in self.KINDS if kind not in self._dialogs]
+        if pending:
+            self._get(pending[0])
+            Clock.schedule_once(self.prebuild)
+
+    # Ask for confirmation, calling on_confirm if the user confirms
+    def confirm(self, title, text, on_confirm):
+        dialog = self._get("confirm")
+        dialog.title = title
+        dialog.text = text
+        self._on_submit = on_confirm
+        dialog.open()
+
+    # Ask for the values of one or two fields given as (hint, input_filter), prefilled with values.
+    # on_submit is called with the typed texts once every field is filled in.
+    def prompt(self, title, fields, submit_text, on_submit, values=()):
+        dialog = self._get(f"prompt{len(fields)}")
+        dialog.title = title
+        dialog.buttons[1].text = submit_text
+        texts = list(values) + [""] * (len(fields) - len(values))
+        for field, (hint, input_filter), text in zip(self._fields(dialog), fields, texts):
+            field.text = text
+            field.hint_text = hint
+            field.input_filter = input_filter
+        self._on_submit = on_submit
+        dialog.open()
+
+    def _get(self, kind):
+        if kind not in self._dialogs:
+            self._dialogs[kind] = self._build(kind)
+        return self._dialogs[kind]
+
+    def _build(self, kind):
+        # Widgets used only by dialogs are imported when the first dialog is built, off the startup path
+        from kivymd.uix.button import MDRaisedButton
+        from kivymd.uix.dialog import MDDialog
+        from kivymd.uix.textfield import MDTextField
+
+        # MDDialog drops the space above the text for good when built without a title, so the
+        # dialogs are built with a placeholder title and get the real one when opened
+        if kind == "confirm":
+            return MDDialog(
+                title=" ",
+                text="",
+                buttons=[
+                    MDRaisedButton(
+                        text="ANNULLA",
+                        on_release=lambda x: self._dismiss("confirm")
+                    ),
+                    MDRaisedButton(
+                        text="CONFERMA",
+                        on_release=lambda x: self._submit("confirm")
+                    ),
+                ],
+            )
+
+        if kind == "prompt1":
+            content = MDTextField()
+        else:
+            # Input fields stacked in a fixed height box
+            content = MDBoxLayout(
+                orientation='vertical',
+                spacing="10dp",
+                padding="10dp",
+                size_hint_y=None,
+                height="120dp"
+            )
+            content.add_widget(MDTextField(mode="rectangle"))
+            content.add_widget(MDTextField(mode="rectangle"))
+        return MDDialog(
+            title=" ",
+            type="custom",
+            content_cls=content,
+            buttons=[
+                MDRaisedButton(
+                    text="ANNULLA",
+                    on_release=lambda x: self._dismiss(kind)
+                ),
+                MDRaisedButton(
+                    text="AGGIUNGI",
+                    on_release=lambda x: self._submit(kind)
+                ),
+            ],
+        )
+
+    # Text fields of a prompt dialog, top to bottom
+    @staticmethod
+    def _fields(dialog):
+        content = dialog.content_cls
+        return list(reversed(content.children)) if isinstance(content, MDBoxLayout) else [content]
+
+    def _dismiss(self, kind):
+        self._on_submit = None
+        self._dialogs[kind].dismiss()
+
+    # Run the callback of the open dialog, a prompt stays open until every field is filled in
+    def _submit(self, kind):
+        dialog = self._dialogs[kind]
+        values = [] if kind == "confirm" else [field.text for field in self._fields(dialog)]
+        if not all(values):
+            return
+        callback = self._on_submit
+        self._dismiss(kind)
+        if callback:
+            callback(*values)
+
+# Main menu screen class
+class MainMenu(Screen):
+    pass
+
+# Base screen class with common functionality
+class BaseScreen(Screen):
+    loading = BooleanProperty(False)
+    selection_mode = BooleanProperty(False)
+    # Id of the list whose rows can be selected in multi-select mode
+    selectable_list = None
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.selected_ids = set()
+        self._pending_queries = 0
+        self._load_generations = {}
+        self._search_event = None
+
+    def on_leave(self):
+        if self.selection_mode:
+            self._set_selection_mode(False)
+    
+    # Show confirmation dialog with custom title, text and callback
+    def show_confirm_dialog(self, title, text, on_confirm):
+        MDApp.get_running_app().dialogs.confirm(title, text, on_confirm)
+
+    # Show dialog asking for the values of one or two fields, passed to on_submit
+    def show_prompt_dialog(self, title, fields, submit_text, on_submit):
+        MDApp.get_running_app().dialogs.prompt(title, fields, submit_text, on_submit)
+
+    # Delete rows by id in a single transaction, implemented by screens supporting multi-select
+    def delete_items(self, item_ids):
+        pass
+
+    # Enter or leave multi-select mode
+    def toggle_selection_mode(self):
+        self._set_selection_mode(not self.selection_mode)
+
+    # Switch the deletable rows between their delete button and a selection toggle
+    def _set_selection_mode(self, active):
+        self.selection_mode = active
+        self.selected_ids.clear()
+        if self.selectable_list:
+            rv = self.ids[self.selectable_list]
+            for row in rv.data:
+                if row.get("icon") == "delete":
+                    row["selection_mode"] = active
+                    row["selected"] = False
+            rv.refresh_from_data()
+
+    # Ask for confirmation and delete every selected row at once
+    def confirm_delete_selected(self):
+        if not self.selected_ids:
+            return
+        item_ids = sorted(self.selected_ids)
+        self.show_confirm_dialog(
+            "Conferma eliminazione",
+            f"Sei sicuro di voler eliminare {len(item_ids)} elementi selezionati?",
+            lambda: self._delete_selected(item_ids)
+        )
+
+    def _delete_selected(self, item_ids):
+        self._set_selection_mode(False)
+        self.delete_items(item_ids)
+
+    # Data of one recycled list row. Rows with the delete action become selectable in multi-select mode
+    def _row_data(self, item_id, text, tap=None, action=None, icon="delete",
+                  secondary_text="", viewclass="ListRow", height=48):
+        if icon == "delete" and action is None:
+            action = partial(self.show_delete_confirmation, item_id)
+        return {
+            "viewclass": viewclass,
+            "height": dp(height),
+            "item_id": item_id,
+            "text": text,
+            "secondary_text": secondary_text,
+            "icon": icon,
+            "tap": tap,
+            "action": action,
+            "select": self._set_selected,
+            "selection_mode": self.selection_mode and icon == "delete",
+            "selected": item_id in self.selected_ids,
+        }
+
+    # Fill a list with row_factory(row) for each row, or the rows themselves. The data is assigned
+    # once: RecycleView builds widgets only for the visible rows and lays the list out in one pass.
+    def fill_list(self, rv, rows, row_factory=None):
+        rv.data = [row_factory(row) for row in rows] if row_factory else list(rows)
+
+    # Insert one row among rows lo to hi, which are sorted by key
+    def _insert_row(self, rv, row, key, lo=0, hi=None):
+        hi = len(rv.data) if hi is None else hi
+        # bisect takes no key before Python 3.10, so the keys are listed first
+        keys = [key(other) for other in rv.data[lo:hi]]
+        index = lo + bisect.bisect_left(keys, key(row))
+        rv.data.insert(index, row)
+        return index
+
+    # Remove the rows with the given ids, only the visible rows are rebuilt
+    def _remove_rows(self, rv, item_ids):
+        item_ids = set(item_ids)
+        for index in reversed(range(len(rv.data))):
+            if rv.data[index].get("item_id") in item_ids:
+                del rv.data[index]
+
+    # Sort key of rows listed by name
+    @staticmethod
+    def _name_key(row):
+        return row["text"].casefold(), row["item_id"]
+
+    def _set_selected(self, item_id, active):
+        if active:
+            self.selected_ids.add(item_id)
+        else:
+            self.selected_ids.discard(item_id)
+
+    # Run a read query in the background and pass its result to on_result on the main thread.
+    # Only the latest load for a given key is delivered, older ones are dropped.
+    def load_async(self, key, query_fn, *args, on_result=None):
+        generation = self._load_generations.get(key, 0) + 1
+        self._load_generations[key] = generation
+
+        def deliver(result):
+            if self._load_generations.get(key) == generation and on_result:
+                on_result(result)
+
+        self._run_query(MDApp.get_running_app().queries.read, query_fn, args, deliver)
+
+    # Call on_ready with the shared catalog, loading it in the background on first use
+    def with_catalog(self, key, on_ready):
+        catalog = MDApp.get_running_app().catalog
+        if catalog.loaded:
+            self._load_generations[key] = self._load_generations.get(key, 0) + 1
+            on_ready(catalog)
+            return
+
+        def ready(rows):
+            catalog.populate(rows)
+            on_ready(catalog)
+
+        self.load_async(key, catalog.fetch, on_result=ready)
+
+    # Debounced search across all exercises, results are passed to on_result on the main thread
+    def run_exercise_search(self, text, on_result):
+        self.cancel_exercise_search()
+        self._search_event = Clock.schedule_once(
+            lambda dt: self.load_async("exercises", search_exercises, text, on_result=on_result),
+            SEARCH_DELAY
+        )
+
+    # Drop a search that has not started yet
+    def cancel_exercise_search(self):
+        if self._search_event is not None:
+            self._search_event.cancel()
+            self._search_event = None
+
+    # Run a write query in the background and pass its result to on_result on the main thread
+    def write_async(self, query_fn, *args, on_result=None):
+        self._run_query(MDApp.get_running_app().queries.write, query_fn, args, on_result)
+
+    def _run_query(self, submit, query_fn, args, on_result):
+        self._pending_queries += 1
+        self.loading = True
+
+        def finish():
+            self._pending_queries -= 1
+            self.loading = self._pending_queries > 0
+
+        def done(result):
+            finish()
+            if on_result:
+                on_result(result)
+
+        def failed(error):
+            finish()
+            print(f"Database error: {error}")
+
+        submit(query_fn, *args, on_result=done, on_error=failed)
+
+# Exercise Manager screen for handling muscle groups
+class ExerciseManager(BaseScreen):
+    selectable_list = "muscle_group_list"
+
+    def on_enter(self):
+        self.load_muscle_groups()
+    
+    # Show delete confirmation for muscle group
+    def show_delete_confirmation(self, group_id):
+        self.show_confirm_dialog(
+            "Conferma eliminazione",
+            "Sei sicuro di voler eliminare questo gruppo muscolare?",
+            lambda: self.delete_group(group_id)
+        )
+    
+    # Load and display muscle groups
+    def load_muscle_groups(self):
+        self.with_catalog("groups", self._show_muscle_groups)
+
+    # Build muscle group rows from the catalog, each with a delete button
+    def _show_muscle_groups(self, catalog):
+        self.fill_list(self.ids.muscle_group_list, catalog.groups(), lambda group: self._group_row(*group))
+
+    def _group_row(self, group_id, name):
+        return self._row_data(group_id, name, tap=partial(self.show_exercises, group_id))
+
+    # Show dialog to add new muscle group
+    def show_add_group_dialog(self):
+        self.show_prompt_dialog(
+            "Aggiungi Gruppo Muscolare",
+            [("Nome del gruppo muscolare", None)],
+            "AGGIUNGI",
+            self.add_muscle_group
+        )
+    
+    # Add new muscle group to database
+    def add_muscle_group(self, name):
+        def added(group_id):
+            MDApp.get_running_app().catalog.add_group(group_id, name)
+            self._insert_row(self.ids.muscle_group_list, self._group_row(group_id, name), self._name_key)
+
+        self.write_async(
+            lambda conn: conn.execute("INSERT INTO muscle_groups (name) VALUES (?)", (name,)).lastrowid,
+            on_result=added
+        )
+    
+    # Delete muscle group and related exercises
+    def delete_group(self, group_id):
+        self.delete_items([group_id])
+
+    # Delete muscle groups; their exercises, weights and workout entries go with them by cascade
+    def delete_items(self, group_ids):
+        def deleted(_):
+            catalog = MDApp.get_running_app().catalog
+            for group_id in group_ids:
+                catalog.remove_group(group_id)
+            self._remove_rows(self.ids.muscle_group_list, group_ids)
+
+        self.write_async(
+            lambda conn: conn.executemany("DELETE FROM muscle_groups WHERE id = ?",
+                                          [(group_id,) for group_id in group_ids]),
+            on_result=deleted
+        )
+
+    
+    # Navigate to exercise list screen
+    def show_exercises(self, group_id):
+        screen = self.manager.get_screen('exercise_list')
+        screen.current_group = group_id
+        self.manager.current = 'exercise_list'
+
+# Exercise List screen for managing exercises within a muscle group
+class ExerciseList(BaseScreen):
+    current_group = NumericProperty(None)
+    selectable_list = "exercise_list"
+    
+    def on_enter(self):
+        if self.ids.search_field.text:
+            # Clearing the search reloads the group
+            self.ids.search_field.text = ""
+        elif self.current_group:
+            self.load_exercises()
+    
+    # Load and display exercises for selected muscle group
+    def load_exercises(self):
+        self.with_catalog("exercises", self._show_exercises)
+
+    # Search all exercises as the user types, or show the group again when the field is cleared
+    def on_search_text(self, text):
+        if text.strip():
+            self.run_exercise_search(text, self._show_search_results)
+        else:
+            self.cancel_exercise_search()
+            if self.current_group:
+                self.load_exercises()
+
+    # Build rows for exercises matching the search, from every muscle group
+    def _show_search_results(self, exercises):
+        self.fill_list(
+            self.ids.exercise_list, exercises,
+            lambda exercise: self._row_data(exercise[0], f"{exercise[1]} - {exercise[2]}")
+        )
+
+    # Build exercise rows from the catalog, each with a delete button
+    def _show_exercises(self, catalog):
+        self.ids.topbar.title = f"Esercizi - {catalog.group_name(self.current_group)}"
+        self.fill_list(
+            self.ids.exercise_list, catalog.exercises_in_group(self.current_group),
+            lambda exercise: self._row_data(*exercise)
+        )
+    
+    # Show delete confirmation for exercise
+    def show_delete_confirmation(self, exercise_id):
+        self.show_confirm_dialog(
+            "Conferma eliminazione",
+            "Sei sicuro di voler eliminare questo esercizio?",
+            lambda: self.delete_exercise(exercise_id)
+        )
+    
+    # Show dialog to add new exercise
+    def show_add_exercise_dialog(self):
+        self.show_prompt_dialog(
+            "Aggiungi Esercizio",
+            [("Nome dell'esercizio", None)],
+            "AGGIUNGI",
+            self.add_exercise
+        )
+    
+    # Add new exercise to database
+    def add_exercise(self, name):
+        group_id = self.current_group
+
+        def added(exercise_id):
+            MDApp.get_running_app().catalog.add_exercise(exercise_id, name, group_id)
+            if self.ids.search_field.text.strip():
+                # The new exercise may or may not match the current search
+                self.on_search_text(self.ids.search_field.text)
+            elif group_id == self.current_group:
+                self._insert_row(self.ids.exercise_list, self._row_data(exercise_id, name), self._name_key)
+
+        self.write_async(
+            lambda conn: conn.execute("""
+                INSERT INTO exercises (name, muscle_group_id)
+                VALUES (?, ?)
+            """, (name, group_id)).lastrowid,
+            on_result=added
+        )
+    
+    # Delete exercise from database
+    def delete_exercise(self, exercise_id):
+        self.delete_items([exercise_id])
+
+    # Delete exercises; their weights and workout entries go with them by cascade
+    def delete_items(self, exercise_ids):
+        def deleted(_):
+            catalog = MDApp.get_running_app().catalog
+            for exercise_id in exercise_ids:
+                catalog.remove_exercise(exercise_id)
+            self._remove_rows(self.ids.exercise_list, exercise_ids)
+
+        self.write_async(
+            lambda conn: conn.executemany("DELETE FROM exercises WHERE id = ?",
+                                          [(exercise_id,) for exercise_id in exercise_ids]),
+            on_result=deleted
+        )
+
+# Workout Creator screen for managing workout routines
+class WorkoutCreator(BaseScreen):
+    selectable_list = "workout_list"
+
+    def on_enter(self):
+        self.load_workouts()
+    
+    # Load and display workout routines
+    def load_workouts(self):
+        self.with_catalog("workouts", self._show_workouts)
+
+    # Build workout rows from the catalog
+    def _show_workouts(self, catalog):
+        self.fill_list(self.ids.workout_list, catalog.workouts(), lambda workout: self._workout_row(*workout))
+
+    # Workout row with timer and delete button
+    def _workout_row(self, workout_id, name, timer):
+        return self._row_data(
+            workout_id, name,
+            tap=partial(self.show_workout_detail, workout_id),
+            secondary_text=f"Timer: {timer} min",
+            viewclass="TwoLineRow",
+            height=72
+        )
+
+    # Show delete confirmation for workout
+    def show_delete_confirmation(self, workout_id):
+        self.show_confirm_dialog(
+            "Conferma eliminazione",
+            "Sei sicuro di voler eliminare questa scheda?",
+            lambda: self.delete_workout(workout_id)
+        )
+    
+    # Delete workout and related exercises
+    def delete_workout(self, workout_id):
+        self.delete_items([workout_id])
+
+    # Delete workouts; their exercises go with them by cascade, recorded sessions are kept
+    def delete_items(self, workout_ids):
+        def deleted(_):
+            catalog = MDApp.get_running_app().catalog
+            for workout_id in workout_ids:
+                catalog.remove_workout(workout_id)
+            self._remove_rows(self.ids.workout_list, workout_ids)
+
+        self.write_async(
+            lambda conn: conn.executemany("DELETE FROM workouts WHERE id = ?",
+                                          [(workout_id,) for workout_id in workout_ids]),
+            on_result=deleted
+        )
+    
+    # Show dialog to add new workout
+    def show_add_workout_dialog(self):
+        self.show_prompt_dialog(
+            "Nuova Scheda",
+            [("Nome Scheda", None), ("Timer (minuti)", "int")],
+            "CREA",
+            self.add_workout
+        )
+
+    # Add new workout to database
+    def add_workout(self, name, timer):
+        def added(workout_id):
+            MDApp.get_running_app().catalog.add_workout(workout_id, name, int(timer))
+            # Workouts are listed by id, so the new one goes last
+            self.ids.workout_list.data.append(self._workout_row(workout_id, name, int(timer)))
+            self.show_workout_detail(workout_id)
+
+        self.write_async(
+            # Insert new workout
+            lambda conn: conn.execute("INSERT INTO workouts (name, timer) VALUES (?, ?)",
+                                      (name, int(timer))).lastrowid,
+            on_result=added
+        )
+    
+    # Navigate to workout detail screen
+    def show_workout_detail(self, workout_id):
+        screen = self.manager.get_screen('workout_detail')
+        screen.workout_id = workout_id
+        screen.load_workout()
+        self.manager.current = 'workout_detail'
+
+# Workout Detail screen for managing exercises within a workout
+class WorkoutDetail(BaseScreen):
+    workout_id = NumericProperty(None)
+    selected_group = NumericProperty(None)
+    selectable_list = "preview_list"
+    
+    # Load workout details and exercises
+    def load_workout(self):
+        if not self.workout_id:
+            return
+            
+        self.load_groups()
+        self.load_preview()
+
+    # Load and display muscle groups
+    def load_groups(self):
+        self.with_catalog("groups", self._show_groups)
+
+    # Build muscle group rows from the catalog
+    def _show_groups(self, catalog):
+        self.fill_list(
+            self.ids.group_list, catalog.groups(),
+            lambda group: self._row_data(group[0], group[1], tap=partial(self.select_group, group[0]), icon="")
+        )
+    
+    # Select muscle group and load its exercises
+    def select_group(self, group_id):
+        self.selected_group = group_id
+        if self.ids.search_field.text:
+            # Clearing the search loads the selected group
+            self.ids.search_field.text = ""
+        else:
+            self.load_exercises(group_id)
+        self.ids.tabs.switch_tab("Esercizi")
+    
+    # Load exercises for selected muscle group
+    def load_exercises(self, group_id):
+        self.selected_group = group_id
+        self.with_catalog("exercises", self._show_exercises)
+
+    # Build exercise rows of the selected group from the catalog
+    def _show_exercises(self, catalog):
+        self.fill_list(
+            self.ids.exercise_list, catalog.exercises_in_group(self.selected_group),
+            lambda exercise: self._exercise_row(*exercise)
+        )
+
+    # Search all exercises as the user types, or show the selected group when the field is cleared
+    def on_search_text(self, text):
+        if text.strip():
+            self.run_exercise_search(text, self._show_search_results)
+        else:
+            self.cancel_exercise_search()
+            if self.selected_group:
+                self.load_exercises(self.selected_group)
+            else:
+                self.fill_list(self.ids.exercise_list, [])
+
+    # Build rows for exercises matching the search, from every muscle group
+    def _show_search_results(self, exercises):
+        self.fill_list(
+            self.ids.exercise_list, exercises,
+            lambda exercise: self._exercise_row(exercise[0], exercise[1], label=f"{exercise[1]} - {exercise[2]}")
+        )
+
+    # Exercise row with add button
+    def _exercise_row(self, exercise_id, name, label=None):
+        return self._row_data(
+            exercise_id, label or name,
+            action=partial(self.show_add_exercise_dialog, exercise_id, name),
+            icon="plus"
+        )
+    
+    # Show dialog to add exercise to workout
+    def show_add_exercise_dialog(self, exercise_id, exercise_name):
+        self.show_prompt_dialog(
+            f"Aggiungi {exercise_name}",
+            [("Serie", "int"), ("Ripetizioni", "int")],
+            "AGGIUNGI",
+            partial(self.add_exercise_to_workout, exercise_id)
+        )
+    
+    # Add exercise to workout with sets and reps
+    def add_exercise_to_workout(self, exercise_id, sets, reps):
+        def add(conn, workout_id):
+            we_id = conn.execute("""
+                INSERT INTO workout_exercises (workout_id, exercise_id, sets, reps)
+                VALUES (?, ?, ?, ?)
+            """, (workout_id, exercise_id, int(sets), int(reps))).lastrowid
+            # Read back just the new preview row
+            return load_preview_row(conn, we_id)
+
+        self.write_async(add, self.workout_id, on_result=self._insert_preview_row)
+
+    # Load the workout with its exercises grouped by muscle group, in one query
+    def load_preview(self):
+        self.load_async("preview", load_workout_detail, self.workout_id, on_result=self._show_preview)
+
+    # Show the workout name and preview rows once the query has finished
+    def _show_preview(self, view):
+        if view is None:
+            return
+        self.ids.detail_topbar.title = f"Modifica - {view.workout.name}"
+        self.fill_list(self.ids.preview_list, self._preview_rows(view.preview))
+
+    # Preview rows with a header for each muscle group
+    def _preview_rows(self, exercises):
+        current_group = None
+        for exercise in exercises:
+            if exercise.group_name != current_group:
+                current_group = exercise.group_name
+                yield self._preview_header(current_group)
+            yield self._preview_row(exercise)
+
+    def _preview_header(self, group_name):
+        return {"viewclass": "PreviewHeader", "height": dp(40), "text": group_name}
+
+    # Preview row with delete button
+    def _preview_row(self, exercise):
+        return self._row_data(
+            exercise.workout_exercise_id, f"{exercise.exercise_name}: {exercise.sets}x{exercise.reps}"
+        )
+
+    # Insert one exercise at the end of its muscle group, adding the group header if it is the first
+    def _insert_preview_row(self, exercise):
+        if exercise is None:
+            return
+        group_name = exercise.group_name
+        data = self.ids.preview_list.data
+        headers = [index for index, row in enumerate(data) if row["viewclass"] == "PreviewHeader"]
+        position = bisect.bisect_left([data[index]["text"] for index in headers], group_name)
+        if position < len(headers) and data[headers[position]]["text"] == group_name:
+            end = headers[position + 1] if position + 1 < len(headers) else len(data)
+            data.insert(end, self._preview_row(exercise))
+        else:
+            index = headers[position] if position < len(headers) else len(data)
+            data.insert(index, self._preview_row(exercise))
+            data.insert(index, self._preview_header(group_name))
+
+    # Remove exercises from the preview, dropping the header of a group left empty
+    def _remove_preview_rows(self, we_ids):
+        we_ids = set(we_ids)
+        data = self.ids.preview_list.data
+        index = len(data) - 1
+        while index >= 0:
+            if data[index]["viewclass"] != "PreviewHeader" and data[index]["item_id"] in we_ids:
+                start = index
+                last_in_group = index + 1 == len(data) or data[index + 1]["viewclass"] == "PreviewHeader"
+                if index > 0 and data[index - 1]["viewclass"] == "PreviewHeader" and last_in_group:
+                    start = index - 1
+                del data[start:index + 1]
+                index = start
+            index -= 1
+    
+    # Show delete confirmation for exercise in workout
+    def show_delete_confirmation(self, exercise_id):
+        self.show_confirm_dialog(
+            "Conferma eliminazione",
+            "Sei sicuro di voler eliminare questo esercizio dalla scheda?",
+            lambda: self.delete_exercise(exercise_id)
+        )
+    
+    # Delete exercise from workout
+    def delete_exercise(self, exercise_id):
+        self.delete_items([exercise_id])
+
+    # Remove exercises from the workout
+    def delete_items(self, workout_exercise_ids):
+        self.write_async(
+            lambda conn: conn.executemany("DELETE FROM workout_exercises WHERE id = ?",
+                                          [(we_id,) for we_id in workout_exercise_ids]),
+            on_result=lambda _: self._remove_preview_rows(workout_exercise_ids)
+        )
+
+# Workout Executor screen for running workouts
+class WorkoutExecutor(BaseScreen):
+    timer_active = BooleanProperty(False)
+    current_time = NumericProperty(0)
+    selected_workout = ObjectProperty(None)
+    background_mode = BooleanProperty(False)
+    workout_timer = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Personal records of the shown exercises, raised in memory as sets are logged.
+        # Typed weights reach the records table once the debounced write lands.
+        self.records = {}
+        # Weight and rep targets, kept per workout for the rest of the day
+        self.progression = ProgressionEngine()
+    
+    # A running workout is shown again, the workout selection only once it is finished
+    def on_enter(self):
+        running = self._running_workout()
+        self._update_view_state(running is None)
+        self.load_workouts()
+        if running is not None:
+            self._resume_workout()
+        self._watch_timers(True)
+
+    def on_leave(self):
+        super().on_leave()
+        MDApp.get_running_app().weight_queue.flush(wait=False)
+        # Hidden timers keep running, but only wake the app when they complete
+        if not self.background_mode:
+            self._watch_timers(False)
+
+    # Timers shared by the whole app, so they survive leaving the screen
+    @staticmethod
+    def _timers():
+        return MDApp.get_running_app().timers
+
+    @staticmethod
+    def _is_rest_timer(name):
+        return isinstance(name, tuple) and name[0] == "rest"
+
+    # Attach or detach the display updates of the timers
+    def _watch_timers(self, active):
+        if self.workout_timer:
+            self.workout_timer.watch(self._on_workout_tick if active else None)
+        for timer in self._timers().find(self._is_rest_timer):
+            timer.watch(self._on_rest_tick if active else None)
+
+    # Update view state between selection and execution screens
+    def _update_view_state(self, show_selection):
+        self.ids.workout_screen_manager.current = 'selection' if show_selection else 'execution'
+    
+    # Load available workouts
+    def load_workouts(self):
+        self.with_catalog("workouts", self._show_workouts)
+
+    # Build workout cards with timer info from the catalog
+    def _show_workouts(self, catalog):
+        self.fill_list(self.ids.execution_list, catalog.workouts(), self._workout_card)
+
+    def _workout_card(self, workout):
+        return {
+            "viewclass": "WorkoutCardRow",
+            "height": dp(80),
+            "text": workout[1],
+            "secondary_text": f"Timer: {workout[2]} min",
+            "tap": partial(self.select_workout, workout),
+        }
+    
+    # The selected workout while its session is being recorded, else None
+    def _running_workout(self):
+        sessions = MDApp.get_running_app().sessions
+        if self.selected_workout and sessions.active and sessions.workout_id == self.selected_workout[0]:
+            return self.selected_workout
+        return None
+
+    # Show the running workout again, with its session and timers as they are
+    def _resume_workout(self):
+        self.update_timer_display()
+        self.load_workout_exercises(self.selected_workout[0])
+        self._update_view_state(False)
+
+    # Select workout and initialize timer; selecting the running one goes back to it
+    def select_workout(self, workout):
+        running = self._running_workout()
+        if running is not None and running[0] == workout[0]:
+            self._resume_workout()
+            return
+        self.end_session()
+        MDApp.get_running_app().sessions.start(workout[0])
+        Clock.schedule_interval(self._checkpoint_session, 30)
+        self.selected_workout = workout
+        self.workout_timer = self._timers().create(
+            "workout", workout[2] * 60,
+            on_tick=self._on_workout_tick, on_complete=self._on_workout_complete
+        )
+        self.timer_active = False
+        self.update_timer_display()
+        self.load_workout_exercises(workout[0])
+        self._update_view_state(False)
+    
+    # Load the exercises of the selected workout with their saved weights, in one query,
+    # and their targets for this session
+    def load_workout_exercises(self, workout_id):
+        self.load_async("exercises", self._read_workout_run, workout_id, on_result=self._show_workout_exercises)
+
+    # Runs on the query thread. Targets are computed once a day per workout, for all its exercises at once.
+    def _read_workout_run(self, conn, workout_id):
+        view = load_workout_run(conn, workout_id)
+        if view is None:
+            return None, {}
+        return view, self.progression.suggest(conn, workout_id, view.exercises)
+
+    # Show exercise cards once the query has finished
+    def _show_workout_exercises(self, result):
+        view, suggestions = result
+        exercises = view.exercises if view else []
+        self.records = {card.exercise_id: ExerciseRecord(card.max_weight, card.epley_1rm, card.brzycki_1rm)
+                        for card in exercises}
+        self.fill_list(self.ids.exercise_execution_list, self._exercise_cards(exercises, suggestions))
+
+    # Exercise cards with a label for each muscle group, at the suggested reps when there is a target
+    def _exercise_cards(self, exercises, suggestions=None):
+        suggestions = suggestions or {}
+        current_group = None
+        for card in exercises:
+            target = suggestions.get(card.workout_exercise_id)
+            if card.group_name != current_group:
+                current_group = card.group_name
+                yield {"viewclass": "ExecutionGroupLabel", "height": dp(50), "text": current_group}
+            yield {
+                "viewclass": "ExerciseCardRow",
+                "height": dp(84),
+                "screen": self,
+                "exercise_id": card.exercise_id,
+                "text": card.exercise_name,
+                "sets": card.sets,
+                "reps": target.reps if target else card.reps,
+                "weight": card.weight,
+                "target_weight": target.weight if target else 0,
+                "weight_text": "",
+                "reps_text": "",
+                "weight_label": f"[{card.weight}kg]" if card.weight > 0 else "",
+            }
+
+    # Record a completed set in the running session and start resting
+    def log_set(self, exercise_id, reps, weight):
+        MDApp.get_running_app().sessions.log_set(exercise_id, reps, weight)
+        self.records[exercise_id] = raise_record(self.records.get(exercise_id), weight, reps)
+        self._timers().create(
+            ("rest", exercise_id), REST_SECONDS,
+            on_tick=self._on_rest_tick, on_complete=self._on_rest_complete
+        ).start()
+    
+    # Sets and reps text with the number of sets logged in this session
+    def _sets_text(self, sets, reps, exercise_id):
+        done = MDApp.get_running_app().sessions.sets_done(exercise_id)
+        return f"{sets}x{reps}  ({done}/{sets})" if done else f"{sets}x{reps}"
+    
+    # Queue weight for exercise, written to disk in the background
+    def save_weight(self, exercise_id, weight_text):
+        if not weight_text: 
+            return
+            
+        try:
+            weight = float(weight_text)
+        except ValueError:
+            return
+        MDApp.get_running_app().weight_queue.put(exercise_id, weight)
+    
+    # Seconds of workout timer used so far
+    def _elapsed_seconds(self):
+        if not self.selected_workout:
+            return 0
+        return self.workout_timer.elapsed()
+
+    # Periodically checkpoint the buffered session to disk
+    def _checkpoint_session(self, dt):
+        MDApp.get_running_app().sessions.checkpoint(self._elapsed_seconds())
+
+    # Save the running session, if any set was logged, in one background transaction
+    def end_session(self):
+        Clock.unschedule(self._checkpoint_session)
+        self._timers().remove_all(self._is_rest_timer)
+        sessions = MDApp.get_running_app().sessions
+        session = sessions.finish(self._elapsed_seconds())
+        if session:
+            self.write_async(sessions.save, session)
+
+    # Finish the workout and go back to the workout selection
+    def finish_workout(self):
+        if not self.selected_workout:
+            return
+        self.end_session()
+        self.workout_timer.pause()
+        self.timer_active = False
+        self._update_view_state(True)
+
+    @staticmethod
+    def _format_time(seconds):
+        return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+    def _on_workout_tick(self, timer):
+        self.update_timer_display()
+
+    # One-shot notice when the workout time is over
+    def _on_workout_complete(self, timer):
+        from kivymd.toast import toast
+
+        self.timer_active = False
+        toast("Tempo scaduto")
+    
+    # Update timer display
+    def update_timer_display(self):
+        self.current_time = self.workout_timer.seconds()
+        self.ids.timer_label.text = self._format_time(self.current_time)
+    
+    # Toggle timer start/stop
+    def toggle_timer(self):
+        if not self.selected_workout:
+            return
+        self.workout_timer.toggle()
+        self.timer_active = self.workout_timer.running
+    
+    # Reset timer to initial value
+    def reset_workout_timer(self):
+        if not self.selected_workout:
+            return
+        self.workout_timer.reset()
+        self.update_timer_display()
+        self.timer_active = False
+
+    # Heaviest weight and estimated one-rep max of an exercise, shown on its card.
+    # The two formulas differ slightly, so the estimate is shown as their range.
+    def _record_text(self, exercise_id):
+        record = self.records.get(exercise_id)
+        if not record or not record.max_weight:
+            return ""
+        text = f"PR {record.max_weight:g}kg"
+        estimates = [value for value in (record.epley_1rm, record.brzycki_1rm) if value]
+        if estimates:
+            low, high = round(min(estimates)), round(max(estimates))
+            text += f"  1RM {low}kg" if low == high else f"  1RM {low}-{high}kg"
+        return text
+
+    # Rest left after the last set of an exercise, shown on its card
+    def _rest_text(self, exercise_id):
+        timer = self._timers().get(("rest", exercise_id))
+        if not timer or not timer.running:
+            return ""
+        return f"Recupero {self._format_time(timer.seconds())}"
+
+    # Update the card of a resting exercise, when it is on screen
+    def _on_rest_tick(self, timer):
+        exercise_id = timer.name[1]
+        rv = self.ids.exercise_execution_list
+        for index, row in enumerate(rv.data):
+            if row.get("exercise_id") == exercise_id:
+                card = rv.view_adapter.get_visible_view(index)
+                if card:
+                    card.rest_text = self._rest_text(exercise_id)
+                return
+
+    # One-shot notice when a rest is over
+    def _on_rest_complete(self, timer):
+        from kivymd.toast import toast
+
+        self._timers().remove(timer.name)
+        toast("Recupero terminato")
+
+# Training statistics per muscle group, computed on the query thread from the logged sets
+class StatisticsScreen(BaseScreen):
+    summary = StringProperty("")
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # NumPy is only imported once the statistics are first opened
+        from analytics import ROLLING_WEEKS, TrainingVolume
+        self.rolling_weeks = ROLLING_WEEKS
+        self.volume = TrainingVolume()
+
+    def on_enter(self):
+        self.load_stats()
+
+    # Bring the statistics up to date with the sets saved since they were last shown
+    def load_stats(self):
+        self.load_async("stats", self._read_stats, on_result=self._on_stats)
+
+    def _read_stats(self, conn):
+        self.volume.refresh(conn)
+        return self.volume.stats()
+
+    # Muscle group names come from the catalog
+    def _on_stats(self, stats):
+        self.with_catalog("groups", lambda catalog: self._show_stats(catalog, stats))
+
+    def _show_stats(self, catalog, stats):
+        if stats.groups:
+            self.summary = f"{stats.sets} serie, {self._format_kg(stats.tonnage)} in {stats.weeks} settimane"
+        else:
+            self.summary = "Nessun allenamento registrato"
+        self.fill_list(self.ids.stats_list, stats.groups, partial(self._stats_row, catalog))
+
+    def _stats_row(self, catalog, group):
+        return self._row_data(
+            group.group_id,
+            catalog.group_name(group.group_id) or "Senza gruppo",
+            secondary_text=(f"{self._format_kg(group.rolling_volume)} in {self.rolling_weeks} sett. · "
+                            f"{group.frequency:.2f} sedute/sett. · "
+                            f"trend {'+' if group.trend >= 0 else '-'}{self._format_kg(abs(group.trend))}/sett."),
+            icon="",
+            viewclass="TwoLineRow",
+            height=72,
+        )
+
+    # Kilograms with a dot as thousands separator
+    @staticmethod
+    def _format_kg(value):
+        return f"{value:,.0f} kg".replace(",", ".")
+
+# Screen manager creating each screen, along with its KV rules, the first time it is needed
+class LazyScreenManager(ScreenManager):
+    def __init__(self, screen_factory, screen_names, **kwargs):
+        self._screen_factory = screen_factory
+        self._lazy_names = set(screen_names)
+        super().__init__(**kwargs)
+
+    # Every lookup, including setting current, goes through here
+    def get_screen(self, name):
+        if name in self._lazy_names:
+            self._lazy_names.discard(name)
+            self.add_widget(self._screen_factory(name))
+        return super().get_screen(name)
+
+    def has_screen(self, name):
+        return name in self._lazy_names or super().has_screen(name)
+
+    # Create a screen ahead of time without showing it
+    def warm(self, name):
+        if name in self._lazy_names:
+            self.get_screen(name)
+
+# Main application class
+class WorkoutApp(MDApp):
+    # Screens created on first use, with the KV file holding their rules.
+    # The menu rules live in workout.kv, loaded by MDApp before build.
+    SCREENS = {
+        'exercises': (ExerciseManager, 'exercises.kv'),
+        'exercise_list': (ExerciseList, 'exercise_list.kv'),
+        'creator': (WorkoutCreator, 'creator.kv'),
+        'workout_detail': (WorkoutDetail, 'workout_detail.kv'),
+        'executor': (WorkoutExecutor, 'executor.kv'),
+        'statistics': (StatisticsScreen, 'statistics.kv'),
+    }
+    # Screen most likely opened next from each screen, built while the user looks at the current one
+    NEXT_SCREENS = {
+        'menu': 'executor',
+        'exercises': 'exercise_list',
+        'creator': 'workout_detail',
+    }
+    # Seconds to wait after a screen change before warming the next screen
+    WARM_DELAY = 0.5
+
+    # Get platform-specific database path
+    def get_database_path(self):
+        if platform == 'android':
+            from android.storage import app_storage_path
+            return os.path.join(app_storage_path(), 'workout.db')
+        return 'workout.db'
+
+    # Parsed KV rules, reused while the KV files and the Kivy version are unchanged
+    # They are kept next to the database, like the session checkpoint.
+    def get_kv_cache_dir(self):
+        return os.path.join(os.path.dirname(os.path.abspath(self.get_database_path())), 'kvcache')
+
+    # Rules shared by every screen, loaded from workout.kv before build
+    def load_kv(self, filename=None):
+        with profiler.phase("load_kv workout.kv"):
+            kvcache.load_file(os.path.join(APP_DIR, 'workout.kv'), self.get_kv_cache_dir())
+        return True
+
+    # Build application
+    def build(self):
+        with profiler.phase("theme"):
+            # Set theme colors
+            self.theme_cls.primary_palette = "Blue"
+            self.theme_cls.primary_hue = "900"
+            self.theme_cls.accent_palette = "DeepOrange"
+            self.theme_cls.theme_style = "Dark"
+        
+        with profiler.phase("database"):
+            # Long-lived connections shared by every screen.
+            # The schema is created or upgraded on the query thread, before any other query runs.
+            self.db = ConnectionManager(self.get_database_path())
+            self.catalog = Catalog()
+            self.dialogs = DialogRegistry()
+            self.timers = TimerEngine(Clock.schedule_once)
+            self.queries = QueryExecutor(self.db, Clock.schedule_once, setup=self.create_database)
+            self.weight_queue = WeightWriteQueue(self.db)
+            # Save sessions interrupted by a crash before recording new ones
+            self.sessions = SessionRecorder(self.get_database_path() + "-session")
+            self.queries.write(self.sessions.recover)
+            # Load the catalog while the menu is shown
+            self.queries.read(profiler.timed("catalog fetch", self.catalog.fetch),
+                              on_result=self.catalog.populate)
+        
+        with profiler.phase("create menu"):
+            # Only the menu is created now, the other screens when first shown
+            sm = LazyScreenManager(self._create_screen, self.SCREENS)
+            sm.add_widget(self._profile_screen(MainMenu(name='menu')))
+            sm.bind(current=self._schedule_warm)
+            self._schedule_warm(sm, sm.current)
+        
+        Window.bind(on_memorywarning=self.on_memorywarning)
+        Clock.schedule_once(self.dialogs.prebuild, 1)
+        if profiler.enabled:
+            Window.bind(on_flip=self._on_first_frame)
+        return sm
+
+    # Load the KV rules of a screen, then create it. The widgets used only by those rules are
+    # imported by them, when the screen is first needed.
+    def _create_screen(self, name):
+        screen_class, kv_file = self.SCREENS[name]
+        with profiler.phase(f"load_kv {kv_file}"):
+            kvcache.load_file(os.path.join(APP_DIR, 'kv', kv_file), self.get_kv_cache_dir())
+        with profiler.phase(f"create {name}"):
+            return self._profile_screen(screen_class(name=name))
+
+    # Record the first on_enter of a screen when profiling
+    def _profile_screen(self, screen):
+        if profiler.enabled:
+            screen.fbind('on_enter', self._on_screen_enter)
+        return screen
+
+    def _on_screen_enter(self, screen):
+        if profiler.first(f"first on_enter {screen.name}", "screen"):
+            profiler.write()
+
+    # Startup is over once the first frame is on screen: stop timing imports and write the report
+    def _on_first_frame(self, *args):
+        import kivy
+        import kivymd
+
+        Window.unbind(on_flip=self._on_first_frame)
+        profiler.mark("first frame")
+        profiler.stop_imports()
+        profiler.metadata.update(kivy=kivy.__version__, kivymd=kivymd.__version__)
+        profiler.write()
+
+    def _schedule_warm(self, sm, current):
+        next_screen = self.NEXT_SCREENS.get(current)
+        if next_screen:
+            Clock.schedule_once(lambda dt: sm.warm(next_screen), self.WARM_DELAY)
+
+    # Release the rows of hidden screens and the pooled rows when the OS is low on memory.
+    # Every list is filled again when its screen is entered.
+    def on_memorywarning(self, *args):
+        for screen in self.root.screens:
+            if screen is self.root.current_screen:
+                continue
+            for widget in screen.walk(restrict=True):
+                if isinstance(widget, RowList) and widget.data:
+                    widget.data = []
+                    # Hand the rows over to the pool now rather than on the next frame
+                    widget.refresh_views()
+        trim_row_pool()
+
+    # Write queued weights before the OS may kill the paused app
+    def on_pause(self):
+        self.weight_queue.flush()
+        self.sessions.checkpoint()
+        return True
+
+    # Catch the timers up with the time the app was paused, wakeups may have been held back
+    def on_resume(self):
+        self.timers.update()
+
+    # Write queued weights and close pooled connections when the app exits
+    def on_stop(self):
+        profiler.write()
+        self.sessions.checkpoint()
+        self.weight_queue.close()
+        self.queries.shutdown()
+        self.db.close()
+
+    # Ask for the sync server, prefilled with the last one used
+    def show_sync_dialog(self):
+        from sync import get_sync_server
+
+        self.queries.read(get_sync_server, on_result=self._open_sync_dialog)
+
+    def _open_sync_dialog(self, server):
+        self.dialogs.prompt("Sincronizza", [("Indirizzo del server", None)], "SINCRONIZZA",
+                            self.sync_now, values=[server or ""])
+
+    # Sync with the server on a query thread; the screens read the synced data when next shown
+    def sync_now(self, server):
+        from sync import SyncClient, open_transport, set_sync_server
+
+        def sync():
+            with self.db.writer() as conn:
+                set_sync_server(conn, server)
+            transport = open_transport(server)
+            try:
+                return SyncClient(self.db, transport).sync()
+            finally:
+                transport.close()
+
+        # Weights still queued are written first, or sent with the next sync
+        self.weight_queue.flush(wait=False)
+        self.queries.run(sync, on_result=self._on_synced, on_error=self._on_sync_error)
+
+    def _on_synced(self, result):
+        from kivymd.toast import toast
+
+        self.catalog.invalidate()
+        for screen in self.root.screens:
+            if isinstance(screen, WorkoutExecutor):
+                screen.progression.invalidate()
+        toast(f"Sincronizzati: {result.pushed} inviati, {result.pulled} ricevuti")
+
+    def _on_sync_error(self, error):
+        from kivymd.toast import toast
+
+        print(f"Sync error: {error}")
+        toast("Sincronizzazione non riuscita")
+
+    # Create or upgrade database schema
+    def create_database(self, conn):
+        with profiler.phase("create_database"):
+            apply_migrations(conn)
+
+if __name__ == '__main__':
     WorkoutApp().run()
\ No newline at end of file
@@ -0,0 +1,197 @@
+# Startup phase tracer, enabled through environment variables:
+#   WORKOUT_PROFILE=report.json        write a JSON timing report (1 for startup-profile.json)
+#   WORKOUT_PROFILE_TRACE=trace.json   also write a Chrome trace-event file (chrome://tracing, Perfetto)
+import builtins
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+PROFILE_ENV = "WORKOUT_PROFILE"
+TRACE_ENV = "WORKOUT_PROFILE_TRACE"
+DEFAULT_REPORT = "startup-profile.json"
+REPORT_VERSION = 1
+
+# Top-level packages whose import times are recorded
+IMPORT_PACKAGES = ("kivy", "kivymd")
+
+
+class StartupProfiler:
+    def __init__(self, report_path=None, trace_path=None):
+        self.enabled = report_path is not None
+        self.report_path = report_path
+        self.trace_path = trace_path
+        self.origin = time.perf_counter()
+        self.metadata = {}
+        self._spans = []
+        self._marks = []
+        self._imports = []
+        self._firsts = set()
+        self._lock = threading.Lock()
+        self._original_import = None
+        self._import_stack = []
+        self._main_thread = threading.get_ident()
+
+    # Profiler configured from the environment, disabled unless WORKOUT_PROFILE is set
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        report_path = environ.get(PROFILE_ENV)
+        if not report_path or report_path == "0":
+            return cls()
+        if report_path == "1":
+            report_path = DEFAULT_REPORT
+        return cls(report_path, environ.get(TRACE_ENV) or None)
+
+    # Seconds since the profiler was created
+    def now(self):
+        return time.perf_counter() - self.origin
+
+    # Time the enclosed block as a named phase
+    def phase(self, name, category="startup"):
+        if not self.enabled:
+            return nullcontext()
+        return self._phase(name, category)
+
+    @contextmanager
+    def _phase(self, name, category):
+        start = self.now()
+        try:
+            yield
+        finally:
+            self._add_span(name, category, start, self.now())
+
+    # Wrap fn so that each call is recorded as a phase, fn itself when disabled
+    def timed(self, name, fn, category="startup"):
+        if not self.enabled:
+            return fn
+
+        def wrapper(*args, **kwargs):
+            with self._phase(name, category):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    # Record an instant event
+    def mark(self, name, category="startup"):
+        if self.enabled:
+            with self._lock:
+                self._marks.append((name, category, self.now(), threading.get_ident()))
+
+    # Record an instant event only the first time it happens, returns True if it was recorded
+    def first(self, name, category="startup"):
+        if not self.enabled or name in self._firsts:
+            return False
+        self._firsts.add(name)
+        self.mark(name, category)
+        return True
+
+    # Start timing imports of IMPORT_PACKAGES modules made from the main thread
+    def track_imports(self):
+        if self.enabled and self._original_import is None:
+            self._original_import = builtins.__import__
+            builtins.__import__ = self._timed_import
+
+    # Stop timing imports, restoring the original import function
+    def stop_imports(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original_import
+        if (level or name in sys.modules or name.partition(".")[0] not in IMPORT_PACKAGES
+                or threading.get_ident() != self._main_thread):
+            return original(name, globals, locals, fromlist, level)
+
+        start = self.now()
+        self._import_stack.append(0.0)
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            end = self.now()
+            # Time spent in nested tracked imports is not counted as this module's own time
+            nested = self._import_stack.pop()
+            if self._import_stack:
+                self._import_stack[-1] += end - start
+            self._imports.append((name, start, end, end - start - nested))
+            self._add_span(f"import {name}", "import", start, end)
+
+    def _add_span(self, name, category, start, end):
+        with self._lock:
+            self._spans.append((name, category, start, end, threading.get_ident()))
+
+    # Timing report as a JSON-serializable dict, times in milliseconds since the profiler started
+    def report(self):
+        with self._lock:
+            spans = list(self._spans)
+            marks = list(self._marks)
+            imports = list(self._imports)
+        return {
+            "version": REPORT_VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": sys.platform,
+            **self.metadata,
+            "phases": [
+                {"name": name, "category": category, "start_ms": _ms(start),
+                 "duration_ms": _ms(end - start), "thread": thread}
+                for name, category, start, end, thread in spans if category != "import"
+            ],
+            "marks": [
+                {"name": name, "category": category, "time_ms": _ms(at), "thread": thread}
+                for name, category, at, thread in marks
+            ],
+            "imports": [
+                {"module": name, "start_ms": _ms(start), "inclusive_ms": _ms(end - start),
+                 "self_ms": _ms(own)}
+                for name, start, end, own in sorted(imports, key=lambda i: i[2] - i[1], reverse=True)
+            ],
+        }
+
+    # Chrome trace-event document: phases and imports as complete events, marks as instants
+    def trace(self):
+        pid = os.getpid()
+        with self._lock:
+            events = [
+                {"name": name, "cat": category, "ph": "X", "ts": _us(start), "dur": _us(end - start),
+                 "pid": pid, "tid": thread}
+                for name, category, start, end, thread in self._spans
+            ]
+            events.extend(
+                {"name": name, "cat": category, "ph": "i", "s": "g", "ts": _us(at), "pid": pid, "tid": thread}
+                for name, category, at, thread in self._marks
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": dict(self.metadata)}
+
+    # Write the report, and the trace if requested, replacing earlier versions
+    def write(self):
+        if not self.enabled:
+            return
+        try:
+            _write_json(self.report_path, self.report())
+            if self.trace_path:
+                _write_json(self.trace_path, self.trace())
+        except OSError as e:
+            print(f"Profile write error: {e}")
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def _us(seconds):
+    return round(seconds * 1000000)
+
+
+def _write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+# Process-wide profiler, created as early as possible so its origin is close to process start
+profiler = StartupProfiler.from_env()
@@ -0,0 +1,112 @@
+# Progressive overload suggestions: the next target weight and reps of every exercise of a workout,
+# from the sets logged in its last sessions. The history of the whole workout is read in one query
+# and the suggestions are kept for the rest of the day, so reopening the workout costs nothing and
+# the sets logged today do not move the targets again.
+import threading
+from collections import namedtuple
+from datetime import date, datetime
+
+# How the targets move:
+#   scheme        "linear" adds increment after every completed session, at the planned reps;
+#                 "double" first adds one rep per completed session up to rep_range above the
+#                 planned reps, then adds increment and goes back to the planned reps
+#   deload_after  consecutive sessions with fewer sets or reps than planned before the weight is cut
+#   deload        fraction of the weight kept by a deload
+#   rounding      weights are rounded to a multiple of this, the smallest plate pair
+#   history       sessions read per exercise
+ProgressionRules = namedtuple("ProgressionRules", "scheme increment rep_range deload_after deload rounding history")
+
+RULES = ProgressionRules(scheme="double", increment=2.5, rep_range=4, deload_after=3, deload=0.9,
+                         rounding=1.25, history=5)
+
+# Target of an exercise for its next session; deload is True when the weight was cut
+Suggestion = namedtuple("Suggestion", "weight reps deload")
+
+# Last sessions of one exercise before a day, newest first, as
+# (exercise_id, sets logged, heaviest weight, fewest reps); sets without a weight are ignored.
+# Sessions are ordered by their start time, which every set keeps a copy of: session ids do not
+# follow time for imported, recovered or synced sessions. The index on (exercise_id, started_at)
+# is walked backwards and only the sessions returned are read, however long the history.
+HISTORY_SQL = """
+    SELECT * FROM (
+        SELECT exercise_id, COUNT(*), MAX(weight), MIN(reps)
+        FROM session_sets
+        WHERE exercise_id = ? AND started_at < ? AND weight > 0
+        GROUP BY started_at, session_id
+        ORDER BY started_at DESC, session_id DESC
+        LIMIT ?
+    )"""
+# Exercises read per statement, SQLite joins at most 500 selects in one compound statement
+HISTORY_BATCH = 100
+
+
+def round_weight(weight, rounding):
+    return round(round(weight / rounding) * rounding, 2)
+
+
+# Next target from the planned sets and reps and the sessions as (sets, weight, reps), newest first
+def next_target(rules, planned_sets, planned_reps, sessions):
+    if not sessions:
+        return None
+    sets, weight, reps = sessions[0]
+    reps = reps or planned_reps
+    failures = 0
+    for logged_sets, _, logged_reps in sessions:
+        if logged_sets >= planned_sets and (logged_reps or planned_reps) >= planned_reps:
+            break
+        failures += 1
+
+    if failures >= rules.deload_after:
+        return Suggestion(round_weight(weight * rules.deload, rules.rounding), planned_reps, True)
+    if failures:
+        return Suggestion(weight, max(reps, planned_reps), False)
+    if rules.scheme == "linear" or reps >= planned_reps + rules.rep_range:
+        return Suggestion(round_weight(weight + rules.increment, rules.rounding), planned_reps, False)
+    return Suggestion(weight, max(reps, planned_reps) + 1, False)
+
+
+class ProgressionEngine:
+    def __init__(self, rules=RULES):
+        self.rules = rules
+        self._lock = threading.Lock()
+        self._day = None
+        # (workout_id, workout_exercise_id) -> (planned sets, planned reps, Suggestion or None),
+        # for the current day
+        self._cache = {}
+
+    # Suggestions by workout exercise id for the exercise cards of a workout. Those not cached yet,
+    # or whose planned sets and reps were edited, are computed together in one query.
+    # Safe to call from a query thread.
+    def suggest(self, conn, workout_id, cards, day=None):
+        day = day or date.today()
+        with self._lock:
+            if day != self._day:
+                self._day = day
+                self._cache.clear()
+            missing = [card for card in cards
+                       if self._cache.get((workout_id, card.workout_exercise_id), ())[:2] != (card.sets, card.reps)]
+            if missing:
+                history = self._history(conn, sorted({card.exercise_id for card in missing}), day)
+                for card in missing:
+                    suggestion = next_target(self.rules, card.sets, card.reps, history.get(card.exercise_id, ()))
+                    self._cache[workout_id, card.workout_exercise_id] = (card.sets, card.reps, suggestion)
+            return {card.workout_exercise_id: self._cache[workout_id, card.workout_exercise_id][2]
+                    for card in cards}
+
+    # Drop the cached suggestions, after sessions were added other than by logging them
+    def invalidate(self):
+        with self._lock:
+            self._cache.clear()
+
+    # Sessions of each exercise before the day, newest first, read in one statement per
+    # HISTORY_BATCH exercises
+    def _history(self, conn, exercise_ids, day):
+        start_of_day = datetime.combine(day, datetime.min.time()).timestamp()
+        history = {}
+        for i in range(0, len(exercise_ids), HISTORY_BATCH):
+            batch = exercise_ids[i:i + HISTORY_BATCH]
+            sql = " UNION ALL ".join([HISTORY_SQL] * len(batch))
+            args = [arg for exercise_id in batch for arg in (exercise_id, start_of_day, self.rules.history)]
+            for exercise_id, sets, weight, reps in conn.execute(sql, args):
+                history.setdefault(exercise_id, []).append((sets, weight, reps))
+        return history
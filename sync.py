@@ -0,0 +1,419 @@
+# Delta sync of the database between devices through a sync server.
+# Triggers log every local change in sync_rows (one row per synced row, with a uid shared by every
+# device and the local version of its last change) and sync_stamps (the stamp of every field edited
+# since the row was created). A sync pushes the rows changed since the last pushed version and pulls
+# the rows the server merged since the last token, both in compressed batches, so its cost follows
+# the number of changes. Conflicts are settled field by field, the newest stamp wins.
+#
+# sync_state holds the device id, the version and clock of the last local change, whether sync is
+# applying remote changes (the triggers stay quiet then), the last pushed version, the server token
+# and the server address and id.
+import argparse
+import json
+import sqlite3
+import time
+import urllib.request
+import zlib
+from collections import namedtuple
+
+from database import SYNC_REFERENCES, SYNC_TABLES, ConnectionManager, apply_migrations
+
+# Rows pushed per request, and pulled per response
+PUSH_BATCH = 500
+PULL_BATCH = 500
+# Host variables per statement when reading rows by id, below SQLite's oldest limit of 999
+IN_BATCH = 500
+# References that may point nowhere: a session outlives its deleted workout, the history its exercise
+OPTIONAL_REFERENCES = {
+    ("workout_sessions", "workout_id"),
+    ("weight_history", "exercise_id"),
+    ("session_sets", "exercise_id"),
+}
+# Stamp of the field telling whether a row was deleted; deletes are an ordinary field so a row
+# deleted on one device stays deleted whatever older edits other devices send
+DELETED = "_deleted"
+
+TABLE_ORDER = {table: index for index, table in enumerate(SYNC_TABLES)}
+
+SyncResult = namedtuple("SyncResult", "pushed pulled applied")
+
+
+# Requests and responses travel as zlib-compressed JSON
+def encode(payload):
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+
+def decode(data):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+# Whether a field value with its stamp replaces the current one. Equal stamps only come from copies
+# of one device, the values then decide so every side picks the same one.
+def newer(stamp, value, current_stamp, current_value):
+    if stamp != current_stamp:
+        return stamp > current_stamp
+    return json.dumps(value, sort_keys=True) > json.dumps(current_value, sort_keys=True)
+
+
+# Fields of a change that win over the current values as {field: (value, stamp)};
+# fields missing from the current values always win
+def merge(values, stamps, remote_values, remote_stamps):
+    won = {}
+    for field, value in remote_values.items():
+        stamp = remote_stamps.get(field, "")
+        if field not in values or newer(stamp, value, stamps.get(field, ""), values[field]):
+            won[field] = (value, stamp)
+    return won
+
+
+def _chunks(items, size=IN_BATCH):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# Uids of rows of a table by local id
+def _uids(conn, table, row_ids):
+    uids = {}
+    for chunk in _chunks(sorted(row_ids)):
+        marks = ",".join("?" * len(chunk))
+        uids.update(conn.execute(
+            f"SELECT row_id, uid FROM sync_rows WHERE tbl = ? AND row_id IN ({marks})", (table, *chunk)))
+    return uids
+
+
+# Local changes after a version, oldest first, as changes for the server and the last version read
+def collect_changes(conn, after_version, limit=PUSH_BATCH):
+    rows = conn.execute(
+        """SELECT uid, tbl, row_id, deleted, stamp, version FROM sync_rows
+           WHERE version > ? ORDER BY version LIMIT ?""", (after_version, limit)).fetchall()
+    if not rows:
+        return [], after_version
+
+    stamps = {}
+    for chunk in _chunks([row[0] for row in rows]):
+        marks = ",".join("?" * len(chunk))
+        for uid, field, stamp in conn.execute(
+                f"SELECT uid, field, stamp FROM sync_stamps WHERE uid IN ({marks})", chunk):
+            stamps.setdefault(uid, {})[field] = stamp
+
+    # Field values of the live rows, with references turned into uids
+    values = {}
+    for table, fields in SYNC_TABLES.items():
+        row_ids = [row[2] for row in rows if row[1] == table and not row[3]]
+        if not row_ids:
+            continue
+        table_values = {}
+        for chunk in _chunks(row_ids):
+            marks = ",".join("?" * len(chunk))
+            for row in conn.execute(f"SELECT id, {', '.join(fields)} FROM {table} WHERE id IN ({marks})", chunk):
+                table_values[row[0]] = dict(zip(fields, row[1:]))
+        for field in fields:
+            if field in SYNC_REFERENCES:
+                uids = _uids(conn, SYNC_REFERENCES[field],
+                             {row[field] for row in table_values.values() if row[field] is not None})
+                for row in table_values.values():
+                    row[field] = uids.get(row[field])
+        values.update(((table, row_id), row) for row_id, row in table_values.items())
+
+    changes = []
+    for uid, table, row_id, deleted, base, _ in rows:
+        row_stamps = stamps.get(uid, {})
+        row_values = {DELETED: deleted}
+        if not deleted:
+            row_values.update(values.get((table, row_id), {}))
+        changes.append({
+            "table": table,
+            "uid": uid,
+            "values": row_values,
+            "stamps": {field: row_stamps.get(field, base) for field in row_values},
+        })
+    return changes, rows[-1][5]
+
+
+# A change references a row this device has not received yet
+class MissingParent(Exception):
+    def __init__(self, uid):
+        super().__init__(uid)
+        self.uid = uid
+
+
+# Apply changes pulled from the server in the current transaction, returning how many changed the
+# database. Parents are applied before their children of the same batch. A child whose parent comes
+# in a later batch waits in sync_pending until it arrives, parents edited after their children are
+# sent after them. A change breaking a constraint is skipped.
+def apply_changes(conn, changes):
+    applied = 0
+    latest = ""
+    conn.execute("UPDATE sync_state SET applying = 1")
+    try:
+        queue = [change for change in changes if change["table"] in SYNC_TABLES]
+        while queue:
+            queue.sort(key=lambda change: TABLE_ORDER[change["table"]])
+            known = []
+            for change in queue:
+                latest = max(latest, *change["stamps"].values())
+                applied += _apply_or_defer(conn, change)
+                known.append(change["uid"])
+            queue = _take_pending(conn, known)
+    finally:
+        conn.execute("UPDATE sync_state SET applying = 0")
+    # Local changes made after these are stamped later, whatever the clocks of the devices say
+    if latest:
+        conn.execute("UPDATE sync_state SET clock = MAX(clock, ?)", (int(latest.split(".")[0]),))
+    return applied
+
+
+def _apply_or_defer(conn, change):
+    uid = change["uid"]
+    pending = conn.execute("SELECT change FROM sync_pending WHERE uid = ?", (uid,)).fetchone()
+    if pending:
+        conn.execute("DELETE FROM sync_pending WHERE uid = ?", (uid,))
+        change = combine(json.loads(pending[0]), change)
+    conn.execute("SAVEPOINT sync_change")
+    try:
+        applied = _apply_change(conn, change)
+    except MissingParent as e:
+        conn.execute("ROLLBACK TO sync_change")
+        conn.execute("INSERT OR REPLACE INTO sync_pending (uid, parent, change) VALUES (?, ?, ?)",
+                     (uid, e.uid, json.dumps(change)))
+        applied = 0
+    except sqlite3.IntegrityError as e:
+        conn.execute("ROLLBACK TO sync_change")
+        print(f"Sync skipped {change['table']} {uid}: {e}")
+        applied = 0
+    conn.execute("RELEASE sync_change")
+    return applied
+
+
+# Waiting changes whose parent is among the uids, removed from sync_pending
+def _take_pending(conn, uids):
+    changes = []
+    for chunk in _chunks(uids):
+        marks = ",".join("?" * len(chunk))
+        rows = conn.execute(f"SELECT uid, change FROM sync_pending WHERE parent IN ({marks})", chunk).fetchall()
+        conn.executemany("DELETE FROM sync_pending WHERE uid = ?", [(uid,) for uid, _ in rows])
+        changes.extend(json.loads(change) for _, change in rows)
+    return changes
+
+
+# One change holding the newest fields of two changes of the same row
+def combine(change, newer_change):
+    values, stamps = dict(change["values"]), dict(change["stamps"])
+    for field, (value, stamp) in merge(values, stamps, newer_change["values"], newer_change["stamps"]).items():
+        values[field] = value
+        stamps[field] = stamp
+    return {"table": change["table"], "uid": change["uid"], "values": values, "stamps": stamps}
+
+
+def _apply_change(conn, change):
+    table, uid = change["table"], change["uid"]
+    fields = SYNC_TABLES[table]
+    remote_values, remote_stamps = change["values"], change["stamps"]
+    local = conn.execute("SELECT row_id, deleted, stamp FROM sync_rows WHERE uid = ?", (uid,)).fetchone()
+    if local is None:
+        base = min(remote_stamps.values())
+        if remote_values.get(DELETED):
+            # Remember the delete, references to the row are then known to point nowhere
+            conn.execute("""INSERT INTO sync_rows (uid, tbl, row_id, version, deleted, stamp)
+                            VALUES (?, ?, NULL, 0, 1, ?)""", (uid, table, base))
+            _store_stamps(conn, uid, {DELETED: (1, remote_stamps[DELETED])})
+            return 0
+        row_id = _insert_row(conn, table, fields, remote_values)
+        if row_id is None:
+            return 0
+        conn.execute("INSERT INTO sync_rows (uid, tbl, row_id, version, stamp) VALUES (?, ?, ?, 0, ?)",
+                     (uid, table, row_id, base))
+        _store_stamps(conn, uid, {field: (None, stamp) for field, stamp in remote_stamps.items()
+                                  if stamp != base})
+        return 1
+
+    row_id, deleted, base = local
+    stamps = dict(conn.execute("SELECT field, stamp FROM sync_stamps WHERE uid = ?", (uid,)))
+    values = {DELETED: deleted}
+    if row_id is not None:
+        values.update(_row_values(conn, table, fields, row_id))
+    # A deleted row has no values left to compare, only its delete is merged
+    remote = {field: value for field, value in remote_values.items() if field in values}
+    won = merge(values, {field: stamps.get(field, base) for field in values}, remote, remote_stamps)
+    if not won:
+        return 0
+
+    if won.get(DELETED, (deleted,))[0]:
+        if row_id is not None:
+            conn.execute(f"DELETE FROM {table} WHERE id = ?", (row_id,))
+        won = {DELETED: won[DELETED]}
+    elif row_id is None:
+        # Deleted here, restored on another device after the delete
+        row_id = _insert_row(conn, table, fields, remote_values)
+        if row_id is None:
+            return 0
+        conn.execute("UPDATE sync_rows SET row_id = ?, deleted = 0 WHERE uid = ?", (row_id, uid))
+        won = {field: (None, stamp) for field, stamp in remote_stamps.items()}
+    else:
+        updates = {}
+        for field, (value, _) in won.items():
+            if field == DELETED:
+                continue
+            value = _local_reference(conn, table, field, value)
+            if value is not False:
+                updates[field] = value
+        if updates:
+            assignments = ", ".join(f"{field} = ?" for field in updates)
+            conn.execute(f"UPDATE {table} SET {assignments} WHERE id = ?", (*updates.values(), row_id))
+    _store_stamps(conn, uid, won)
+    return 1
+
+
+# Field values of a local row, references as uids
+def _row_values(conn, table, fields, row_id):
+    row = conn.execute(f"SELECT {', '.join(fields)} FROM {table} WHERE id = ?", (row_id,)).fetchone()
+    values = dict(zip(fields, row))
+    for field in fields:
+        if field in SYNC_REFERENCES and values[field] is not None:
+            values[field] = _uids(conn, SYNC_REFERENCES[field], [values[field]]).get(values[field])
+    return values
+
+
+# Local value of a synced field: references are turned from uids into local ids. A reference to a
+# deleted row is None when optional and False when required; one to an unknown row has to wait.
+def _local_reference(conn, table, field, value):
+    if field not in SYNC_REFERENCES or value is None:
+        return value
+    row = conn.execute("SELECT row_id FROM sync_rows WHERE uid = ?", (value,)).fetchone()
+    if row is None:
+        raise MissingParent(value)
+    if row[0] is None and (table, field) not in OPTIONAL_REFERENCES:
+        return False
+    return row[0]
+
+
+# Insert a row received from the server, returning its local id or None when a parent was deleted
+def _insert_row(conn, table, fields, values):
+    row = []
+    for field in fields:
+        value = _local_reference(conn, table, field, values.get(field))
+        if value is False:
+            return None
+        row.append(value)
+    marks = ",".join("?" * len(fields))
+    return conn.execute(f"INSERT INTO {table} ({', '.join(fields)}) VALUES ({marks})", row).lastrowid
+
+
+def _store_stamps(conn, uid, won):
+    conn.executemany("INSERT OR REPLACE INTO sync_stamps (uid, field, stamp) VALUES (?, ?, ?)",
+                     [(uid, field, stamp) for field, (_, stamp) in won.items()])
+
+
+# Server address used by the last sync, or None
+def get_sync_server(conn):
+    return conn.execute("SELECT server FROM sync_state").fetchone()[0]
+
+
+# Remember the server address; a different server starts over with a full sync
+def set_sync_server(conn, server):
+    if get_sync_server(conn) != server:
+        conn.execute("UPDATE sync_state SET server = ?", (server,))
+        _push_all(conn, None)
+
+
+# Start over with a full sync: every row is pushed again, pulled ones included, and every row is
+# pulled again. Rows get distinct versions above the pushed mark, so that no push batch ends
+# between rows of one version, which the next batch would skip. Rows pulled afterwards keep
+# version 0, at or below the pushed mark, and are never pushed back.
+def _push_all(conn, server_id):
+    conn.execute("UPDATE sync_rows SET version = rowid + (SELECT version FROM sync_state)")
+    conn.execute("""UPDATE sync_state SET pushed = version, pulled = 0, server_id = ?,
+                    version = version + COALESCE((SELECT MAX(rowid) FROM sync_rows), 0)""", (server_id,))
+
+
+# Send requests to a sync server over HTTP
+class HttpTransport:
+    def __init__(self, url, timeout=30):
+        self.url = url
+        self.timeout = timeout
+
+    def request(self, payload):
+        request = urllib.request.Request(
+            self.url,
+            data=encode(payload),
+            headers={"Content-Type": "application/json", "Content-Encoding": "deflate"},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return decode(response.read())
+
+    def close(self):
+        pass
+
+
+# Transport to an http:// address, or to a server database file opened in this process
+def open_transport(server):
+    if server.startswith(("http://", "https://")):
+        return HttpTransport(server)
+    from sync_server import LocalTransport, SyncServer
+    return LocalTransport(SyncServer(server))
+
+
+class SyncClient:
+    def __init__(self, db, transport, push_batch=PUSH_BATCH, pull_batch=PULL_BATCH):
+        self.db = db
+        self.transport = transport
+        self.push_batch = push_batch
+        self.pull_batch = pull_batch
+
+    # Push local changes and pull remote ones until both sides are up to date.
+    # The writer is held only while reading and applying a batch, never during a request.
+    def sync(self):
+        pushed = pulled = applied = 0
+        while True:
+            with self.db.writer() as conn:
+                after, token, server_id = conn.execute(
+                    "SELECT pushed, pulled, server_id FROM sync_state").fetchone()
+                changes, version = collect_changes(conn, after, self.push_batch)
+            response = self.transport.request({
+                "server": server_id,
+                "token": token,
+                "limit": self.pull_batch,
+                "changes": changes,
+            })
+            with self.db.writer() as conn:
+                if response.get("reset"):
+                    # Another server, or the same one started afresh: send everything again
+                    _push_all(conn, response["server"])
+                    continue
+                applied += apply_changes(conn, response["changes"])
+                conn.execute("UPDATE sync_state SET pushed = MAX(pushed, ?), pulled = ?, server_id = ?",
+                             (version, response["token"], response["server"]))
+            pushed += len(changes)
+            pulled += len(response["changes"])
+            if not changes and not response["more"]:
+                return SyncResult(pushed, pulled, applied)
+
+
+# Sync a database file from the command line: main.py sync http://host:port/ or main.py sync server.db
+def run_cli(argv):
+    parser = argparse.ArgumentParser(prog="main.py sync", description="Sync the workout database")
+    parser.add_argument("server", nargs="?",
+                        help="sync server address, or server database file; defaults to the last one used")
+    parser.add_argument("--db", default="workout.db", help="database file (default: workout.db)")
+    args = parser.parse_args(argv)
+
+    db = ConnectionManager(args.db)
+    start = time.perf_counter()
+    try:
+        with db.writer() as conn:
+            apply_migrations(conn)
+            if args.server:
+                set_sync_server(conn, args.server)
+            server = get_sync_server(conn)
+        if not server:
+            parser.error("no sync server given")
+        transport = open_transport(server)
+        try:
+            result = SyncClient(db, transport).sync()
+        finally:
+            transport.close()
+    finally:
+        db.close()
+    print(f"sync: {result.pushed} pushed, {result.pulled} pulled, {result.applied} applied "
+          f"in {time.perf_counter() - start:.2f}s")
+    return 0
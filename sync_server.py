@@ -0,0 +1,152 @@
+# Reference sync server keeping the merged rows of every device in its own SQLite file.
+# Every merged row gets the next sequence number, the token a device pulls from next time.
+# It serves HTTP on localhost only, or runs inside the client process through LocalTransport:
+#   python sync_server.py --db sync-server.db --port 8765
+import argparse
+import json
+import sqlite3
+import threading
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from sync import PULL_BATCH, decode, encode, merge
+
+# Most rows returned by one pull, whatever the client asks for
+MAX_PULL = 5000
+
+SERVER_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS server (id TEXT NOT NULL)",
+    """CREATE TABLE IF NOT EXISTS rows
+       (uid TEXT PRIMARY KEY,
+       tbl TEXT NOT NULL,
+       seq INTEGER NOT NULL,
+       row_values TEXT NOT NULL,
+       stamps TEXT NOT NULL)""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_rows_seq ON rows (seq)",
+)
+
+
+class SyncServer:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self._lock = threading.Lock()
+        with self._lock:
+            for statement in SERVER_SCHEMA:
+                self.conn.execute(statement)
+            row = self.conn.execute("SELECT id FROM server").fetchone()
+            if row is None:
+                row = (uuid.uuid4().hex,)
+                self.conn.execute("INSERT INTO server (id) VALUES (?)", row)
+            self.server_id = row[0]
+
+    # Merge the pushed changes, then return the rows merged after the token. Rows the request
+    # itself pushed and that were stored as sent are left out, the client already has them.
+    def handle(self, request):
+        if request.get("server") not in (None, self.server_id):
+            return {"server": self.server_id, "reset": True}
+        limit = max(1, min(int(request.get("limit") or PULL_BATCH), MAX_PULL))
+        token = int(request.get("token") or 0)
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                unchanged = {change["uid"] for change in request.get("changes", ()) if self._merge(change)}
+                rows = self.conn.execute(
+                    """SELECT seq, tbl, uid, row_values, stamps FROM rows
+                       WHERE seq > ? ORDER BY seq LIMIT ?""", (token, limit)).fetchall()
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        changes = [{"table": table, "uid": uid, "values": json.loads(values), "stamps": json.loads(stamps)}
+                   for _, table, uid, values, stamps in rows if uid not in unchanged]
+        return {
+            "server": self.server_id,
+            "token": rows[-1][0] if rows else token,
+            "more": len(rows) == limit,
+            "changes": changes,
+        }
+
+    def handle_bytes(self, data):
+        return encode(self.handle(decode(data)))
+
+    # Merge a pushed change into its row, returning whether the row now holds the change as sent
+    def _merge(self, change):
+        uid = change["uid"]
+        row = self.conn.execute("SELECT row_values, stamps FROM rows WHERE uid = ?", (uid,)).fetchone()
+        values, stamps = (json.loads(row[0]), json.loads(row[1])) if row else ({}, {})
+        won = merge(values, stamps, change["values"], change["stamps"])
+        if not won:
+            return False
+        for field, (value, stamp) in won.items():
+            values[field] = value
+            stamps[field] = stamp
+        self.conn.execute(
+            """INSERT OR REPLACE INTO rows (uid, tbl, seq, row_values, stamps)
+               VALUES (?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM rows), ?, ?)""",
+            (uid, change["table"], json.dumps(values), json.dumps(stamps)))
+        return values == change["values"] and stamps == change["stamps"]
+
+    def close(self):
+        self.conn.close()
+
+
+# Transport handing requests to a server in the same process, encoded as they would travel
+class LocalTransport:
+    def __init__(self, server):
+        self.server = server
+
+    def request(self, payload):
+        return decode(self.server.handle_bytes(encode(payload)))
+
+    def close(self):
+        self.server.close()
+
+
+class SyncRequestHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.server.sync.handle_bytes(self.rfile.read(length))
+        except (ValueError, KeyError, TypeError, zlib.error) as e:
+            self.send_error(400, f"Bad sync request: {e}")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Encoding", "deflate")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# HTTP server answering sync requests on any path
+def make_http_server(sync, host="127.0.0.1", port=8765):
+    httpd = HTTPServer((host, port), SyncRequestHandler)
+    httpd.sync = sync
+    return httpd
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reference sync server for the workout app")
+    parser.add_argument("--db", default="sync-server.db", help="server database file (default: sync-server.db)")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+    args = parser.parse_args(argv)
+
+    sync = SyncServer(args.db)
+    httpd = make_http_server(sync, args.host, args.port)
+    print(f"Sync server on http://{args.host}:{httpd.server_port}/ with {args.db}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        sync.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,65 @@
+# Deletes cascade through the catalog and the plans, while the history stays
+import sqlite3
+import unittest
+
+from analytics import TrainingVolume
+from database import REBUILD_RECORDS, apply_migrations, record_weights
+
+
+class DeleteTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        apply_migrations(self.conn)
+        self.conn.execute("INSERT INTO muscle_groups (id, name) VALUES (1, 'Petto')")
+        self.conn.executemany("INSERT INTO exercises (id, name, muscle_group_id) VALUES (?, ?, 1)",
+                              [(1, "Panca"), (2, "Croci")])
+        self.conn.execute("INSERT INTO workouts (id, name, timer) VALUES (1, 'A', 60)")
+        self.conn.execute("INSERT INTO workout_exercises (workout_id, exercise_id, sets, reps) VALUES (1, 1, 3, 10)")
+        record_weights(self.conn, [(1, 80.0, 1), (2, 20.0, 2)])
+        self.conn.execute("INSERT INTO workout_sessions (id, workout_id, started_at) VALUES (1, 1, 3)")
+        self.conn.execute("""INSERT INTO session_sets (session_id, exercise_id, set_index, reps, weight)
+                             VALUES (1, 1, 0, 5, 90)""")
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def count(self, table):
+        return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def test_deleting_an_exercise_keeps_its_history(self):
+        self.conn.execute("DELETE FROM exercises WHERE id = 1")
+        self.assertEqual(self.count("workout_exercises"), 0)
+        self.assertEqual(self.conn.execute("SELECT exercise_id FROM exercise_weights").fetchall(), [(2,)])
+        self.assertEqual(self.conn.execute("SELECT exercise_id, weight FROM weight_history ORDER BY id").fetchall(),
+                         [(None, 80.0), (2, 20.0)])
+        self.assertEqual(self.conn.execute("SELECT exercise_id, reps, weight FROM session_sets").fetchall(),
+                         [(None, 5, 90.0)])
+        self.assertEqual(self.conn.execute("PRAGMA foreign_key_check").fetchall(), [])
+
+    def test_deleting_a_group_keeps_the_history_of_its_exercises(self):
+        self.conn.execute("DELETE FROM muscle_groups WHERE id = 1")
+        self.assertEqual(self.count("exercises"), 0)
+        self.assertEqual(self.count("weight_history"), 2)
+        self.assertEqual(self.count("session_sets"), 1)
+
+    def test_history_without_exercise_has_no_records(self):
+        self.conn.execute("DELETE FROM exercises WHERE id = 1")
+        self.conn.execute("""INSERT INTO session_sets (session_id, exercise_id, set_index, reps, weight)
+                             VALUES (1, NULL, 1, 5, 100)""")
+        for statement in REBUILD_RECORDS:
+            self.conn.execute(statement)
+        self.assertEqual(self.conn.execute("SELECT exercise_id, max_weight FROM exercise_records").fetchall(),
+                         [(2, 20.0)])
+
+    def test_sets_without_exercise_count_without_group(self):
+        self.conn.execute("DELETE FROM exercises WHERE id = 1")
+        self.conn.commit()
+        volume = TrainingVolume(utc_offset=0)
+        self.assertEqual(volume.refresh(self.conn), 1)
+        self.assertEqual([(group.group_id, group.tonnage) for group in volume.stats(now=3).groups], [(0, 450.0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+# Targets are read from the latest sessions by start time, whatever their ids
+import sqlite3
+import unittest
+from datetime import date, datetime
+from types import SimpleNamespace
+
+from database import apply_migrations
+from progression import HISTORY_SQL, ProgressionEngine
+
+DAY = 24 * 3600
+
+
+class ProgressionTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        apply_migrations(self.conn)
+        self.conn.execute("INSERT INTO exercises (id, name) VALUES (1, 'Panca')")
+        self.conn.execute("INSERT INTO workouts (id, name, timer) VALUES (1, 'A', 60)")
+        self.conn.execute("INSERT INTO workout_exercises (id, workout_id, exercise_id, sets, reps) VALUES (1, 1, 1, 2, 8)")
+        self.today = date(2026, 10, 18)
+        self.start = datetime.combine(self.today, datetime.min.time()).timestamp()
+
+    def tearDown(self):
+        self.conn.close()
+
+    # A session days before today, with one set per reps value at weight
+    def session(self, session_id, days_ago, weight, reps):
+        self.conn.execute("INSERT INTO workout_sessions (id, workout_id, started_at) VALUES (?, 1, ?)",
+                          (session_id, self.start - days_ago * DAY))
+        self.conn.executemany("""INSERT INTO session_sets (session_id, exercise_id, set_index, reps, weight)
+                                 VALUES (?, 1, ?, ?, ?)""",
+                              [(session_id, index, done, weight) for index, done in enumerate(reps, 1)])
+
+    def suggest(self):
+        card = SimpleNamespace(workout_exercise_id=1, exercise_id=1, sets=2, reps=8)
+        return ProgressionEngine().suggest(self.conn, 1, [card], self.today)[1]
+
+    def test_latest_session_is_the_last_started_not_the_highest_id(self):
+        # Session 9 was imported with a high id but happened first
+        self.session(9, 3, 50.0, (8, 8))
+        self.session(2, 1, 60.0, (9, 9))
+        self.assertEqual(self.suggest(), (60.0, 10, False))
+
+    def test_missed_reps_keep_the_target(self):
+        self.session(1, 2, 60.0, (8, 8))
+        self.session(2, 1, 60.0, (8, 6))
+        self.assertEqual(self.suggest(), (60.0, 8, False))
+
+    def test_sets_follow_a_moved_session(self):
+        self.session(1, 2, 50.0, (8, 8))
+        self.session(2, 1, 60.0, (8, 8))
+        self.conn.execute("UPDATE workout_sessions SET started_at = ? WHERE id = 1", (self.start - 0.5 * DAY,))
+        self.assertEqual(self.suggest().weight, 50.0)
+
+    def test_history_reads_the_index_backwards_without_sorting(self):
+        plan = " ".join(row[3] for row in self.conn.execute("EXPLAIN QUERY PLAN " + HISTORY_SQL, (1, 0, 5)))
+        self.assertIn("idx_session_sets_exercise_time", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
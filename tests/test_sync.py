@@ -0,0 +1,125 @@
+# Delta sync of two devices through a reference server in the same process
+import os
+import shutil
+import tempfile
+import unittest
+
+from database import MIGRATIONS, ConnectionManager, apply_migrations
+from sync import SyncClient, set_sync_server
+from sync_server import LocalTransport, SyncServer
+
+GROUPS = [(f"Gruppo {index}",) for index in range(7)]
+
+
+class SyncTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.server = SyncServer(os.path.join(self.directory, "server.db"))
+        self.databases = []
+
+    def tearDown(self):
+        for db in self.databases:
+            db.close()
+        self.server.close()
+        shutil.rmtree(self.directory)
+
+    # Database of a device, migrated up to version and set to sync with the test server
+    def device(self, name, version=None):
+        db = ConnectionManager(os.path.join(self.directory, f"{name}.db"))
+        self.databases.append(db)
+        with db.writer() as conn:
+            if version is not None:
+                for statements in MIGRATIONS[:version]:
+                    for statement in statements:
+                        conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version}")
+        return db
+
+    def migrate(self, db):
+        with db.writer() as conn:
+            apply_migrations(conn)
+            set_sync_server(conn, "test")
+
+    # Small batches by default, so that every sync takes several requests
+    def client(self, db, batch=3):
+        return SyncClient(db, LocalTransport(self.server), push_batch=batch, pull_batch=batch)
+
+    def groups(self, db):
+        with db.reader() as conn:
+            return conn.execute("SELECT name FROM muscle_groups ORDER BY name").fetchall()
+
+    def test_devices_converge_and_pulled_rows_are_not_pushed_back(self):
+        a, b, c = self.device("a"), self.device("b"), self.device("c")
+        for db in (a, b, c):
+            self.migrate(db)
+        with a.writer() as conn:
+            conn.executemany("INSERT INTO muscle_groups (name) VALUES (?)", GROUPS)
+        self.assertEqual(self.client(a).sync().pushed, len(GROUPS))
+        # b pulls the rows in several responses, c in one
+        for db, batch in ((b, 3), (c, 500)):
+            first = self.client(db, batch).sync()
+            self.assertEqual((first.pushed, first.applied), (0, len(GROUPS)))
+            again = self.client(db, batch).sync()
+            self.assertEqual((again.pushed, again.pulled), (0, 0))
+            self.assertEqual(self.groups(db), sorted(GROUPS))
+        self.assertEqual(self.client(a).sync().pulled, 0)
+
+        with b.writer() as conn:
+            conn.execute("UPDATE muscle_groups SET name = 'Petto' WHERE name = 'Gruppo 0'")
+        self.assertEqual(self.client(b).sync().pushed, 1)
+        self.client(a).sync()
+        self.assertEqual(self.groups(a), self.groups(b))
+
+    def test_rows_existing_before_sync_are_all_pushed(self):
+        a = self.device("a", version=7)
+        with a.writer() as conn:
+            conn.executemany("INSERT INTO muscle_groups (name) VALUES (?)", GROUPS)
+        self.migrate(a)
+        self.assertEqual(self.client(a).sync().pushed, len(GROUPS))
+        self.assertEqual(self.server.conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0], len(GROUPS))
+
+    def test_new_server_gets_pulled_rows_again(self):
+        a, b = self.device("a"), self.device("b")
+        self.migrate(a)
+        self.migrate(b)
+        with a.writer() as conn:
+            conn.executemany("INSERT INTO muscle_groups (name) VALUES (?)", GROUPS)
+        self.client(a).sync()
+        self.client(b).sync()
+
+        self.server.close()
+        os.remove(os.path.join(self.directory, "server.db"))
+        self.server = SyncServer(os.path.join(self.directory, "server.db"))
+        self.assertEqual(self.client(b).sync().pushed, len(GROUPS))
+        self.assertEqual(self.client(b).sync().pushed, 0)
+        self.assertEqual(self.server.conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0], len(GROUPS))
+
+    def test_devices_set_up_apart_keep_rows_with_the_same_id(self):
+        a, b = self.device("a", version=7), self.device("b", version=7)
+        for db, name in ((a, "Scheda A"), (b, "Scheda B")):
+            with db.writer() as conn:
+                conn.execute("INSERT INTO workouts (id, name, timer) VALUES (1, ?, 60)", (name,))
+            self.migrate(db)
+        self.client(a).sync()
+        self.client(b).sync()
+        self.client(a).sync()
+        for db in (a, b):
+            with db.reader() as conn:
+                self.assertEqual(conn.execute("SELECT name FROM workouts ORDER BY name").fetchall(),
+                                 [("Scheda A",), ("Scheda B",)])
+
+    def test_unsynced_rows_of_the_old_backfill_get_device_uids(self):
+        a = self.device("a", version=10)
+        with a.writer() as conn:
+            conn.execute("INSERT INTO workouts (id, name, timer) VALUES (1, 'Scheda A', 60)")
+            conn.execute("UPDATE sync_rows SET uid = tbl || '#' || row_id")
+            conn.execute("INSERT INTO sync_stamps (uid, field, stamp) VALUES ('workouts#1', 'name', 'x')")
+            device = conn.execute("SELECT device FROM sync_state").fetchone()[0]
+        self.migrate(a)
+        with a.reader() as conn:
+            self.assertEqual(conn.execute("SELECT uid FROM sync_rows").fetchall(), [(f"{device}-workouts-1",)])
+            self.assertEqual(conn.execute("SELECT uid FROM sync_stamps").fetchall(), [(f"{device}-workouts-1",)])
+
+
+if __name__ == "__main__":
+    unittest.main()
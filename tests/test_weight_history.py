@@ -0,0 +1,61 @@
+# Range, latest-N and downsampled queries over the weight history
+import sqlite3
+import unittest
+
+from database import apply_migrations, downsample_weights, latest_weights, record_weights, weight_range
+
+WEEK = 7 * 24 * 3600
+
+
+class WeightHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        apply_migrations(self.conn)
+        self.conn.execute("INSERT INTO muscle_groups (id, name) VALUES (1, 'Petto')")
+        self.conn.executemany("INSERT INTO exercises (id, name, muscle_group_id) VALUES (?, ?, 1)",
+                              [(1, "Panca"), (2, "Croci")])
+        record_weights(self.conn, [
+            (1, 60.0, 0),
+            (1, 70.0, WEEK - 1),
+            (1, 80.0, WEEK),
+            (1, 90.0, 3 * WEEK + 10),
+            (2, 20.0, WEEK),
+        ])
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_range_is_half_open_and_per_exercise(self):
+        self.assertEqual(weight_range(self.conn, 1, 0, WEEK), [(0, 60.0), (WEEK - 1, 70.0)])
+        self.assertEqual(weight_range(self.conn, 1, WEEK, WEEK + 1), [(WEEK, 80.0)])
+        self.assertEqual(weight_range(self.conn, 2, 0, 4 * WEEK), [(WEEK, 20.0)])
+        self.assertEqual(weight_range(self.conn, 3, 0, 4 * WEEK), [])
+
+    def test_latest_is_newest_first_up_to_the_limit(self):
+        self.assertEqual(latest_weights(self.conn, 1, limit=2), [(3 * WEEK + 10, 90.0), (WEEK, 80.0)])
+        self.assertEqual(len(latest_weights(self.conn, 1)), 4)
+        self.assertEqual(latest_weights(self.conn, 1, limit=0), [])
+
+    def test_downsample_gives_one_point_per_bucket(self):
+        self.assertEqual(downsample_weights(self.conn, 1), [
+            (0, 70.0, 65.0, 2),
+            (WEEK, 80.0, 80.0, 1),
+            (3 * WEEK, 90.0, 90.0, 1),
+        ])
+
+    def test_downsample_bucket_size_and_bounds(self):
+        self.assertEqual(downsample_weights(self.conn, 1, bucket_seconds=4 * WEEK),
+                         [(0, 90.0, 75.0, 4)])
+        self.assertEqual(downsample_weights(self.conn, 1, start=WEEK, end=3 * WEEK),
+                         [(WEEK, 80.0, 80.0, 1)])
+
+    def test_queries_walk_the_exercise_time_index(self):
+        plan = " ".join(row[-1] for row in self.conn.execute(
+            "EXPLAIN QUERY PLAN SELECT recorded_at, weight FROM weight_history "
+            "WHERE exercise_id = 1 AND recorded_at >= 0 AND recorded_at < 10 ORDER BY recorded_at"))
+        self.assertIn("idx_weight_history_exercise_time", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+# Countdown timers driven by deadlines rather than by counting callbacks, so they do not drift when
+# frames are late and stay right across app pauses. A single wakeup is scheduled for the timer that
+# needs one first, and none while every timer is stopped.
+import math
+import time
+
+# Wakeups may come slightly early, a timer within this many seconds of a boundary has crossed it
+TOLERANCE = 0.01
+
+
+# Monotonic clock that keeps counting while the device sleeps, where the platform has one
+if hasattr(time, "CLOCK_BOOTTIME"):
+    def monotonic():
+        return time.clock_gettime(time.CLOCK_BOOTTIME)
+else:
+    monotonic = time.monotonic
+
+
+class Countdown:
+    def __init__(self, engine, name, duration, on_tick=None, on_complete=None):
+        self.engine = engine
+        self.name = name
+        self.duration = duration
+        # Called with the timer each time its shown seconds change, while running
+        self.on_tick = on_tick
+        # Called once with the timer when it reaches zero
+        self.on_complete = on_complete
+        self.completed = False
+        self._deadline = None
+        self._remaining = duration
+
+    @property
+    def running(self):
+        return self._deadline is not None
+
+    # Seconds left, as a float
+    def remaining(self, now=None):
+        if self._deadline is None:
+            return self._remaining
+        if now is None:
+            now = self.engine.clock()
+        return max(0.0, self._deadline - now)
+
+    # Whole seconds left as shown on a display, 0 only once the timer has completed
+    def seconds(self, now=None):
+        return max(0, math.ceil(self.remaining(now) - TOLERANCE))
+
+    # Whole seconds run so far
+    def elapsed(self, now=None):
+        return max(0, round(self.duration - self.remaining(now)))
+
+    def start(self):
+        if self.running or self._remaining <= 0:
+            return
+        self._deadline = self.engine.clock() + self._remaining
+        self.engine.reschedule()
+
+    def pause(self):
+        if not self.running:
+            return
+        self._remaining = self.remaining()
+        self._deadline = None
+        self.engine.reschedule()
+
+    def toggle(self):
+        if self.running:
+            self.pause()
+        else:
+            self.start()
+
+    # Stop and rewind to the full duration, or to a new one
+    def reset(self, duration=None):
+        if duration is not None:
+            self.duration = duration
+        self._deadline = None
+        self._remaining = self.duration
+        self.completed = False
+        self.engine.reschedule()
+
+    # Attach or detach the tick callback, e.g. while the timer is on screen
+    def watch(self, on_tick):
+        self.on_tick = on_tick
+        self.engine.reschedule()
+
+    # Time of the next change of the shown seconds, or of completion when nobody watches
+    def _next_wakeup(self):
+        if not self.on_tick:
+            return self._deadline
+        return self._deadline - max(0, self.seconds() - 1)
+
+    def _complete(self):
+        self._deadline = None
+        self._remaining = 0
+        self.completed = True
+
+
+class TimerEngine:
+    def __init__(self, schedule_once, clock=monotonic):
+        self._schedule_once = schedule_once
+        self.clock = clock
+        self._timers = {}
+        self._event = None
+
+    # Create a stopped timer, replacing any timer with the same name
+    def create(self, name, duration, on_tick=None, on_complete=None):
+        self.remove(name)
+        timer = Countdown(self, name, duration, on_tick, on_complete)
+        self._timers[name] = timer
+        return timer
+
+    def get(self, name):
+        return self._timers.get(name)
+
+    def remove(self, name):
+        timer = self._timers.pop(name, None)
+        if timer and timer.running:
+            timer._deadline = None
+            self.reschedule()
+
+    # Timers whose name matches
+    def find(self, match):
+        return [timer for name, timer in self._timers.items() if match(name)]
+
+    # Remove every timer whose name matches
+    def remove_all(self, match):
+        for timer in self.find(match):
+            self.remove(timer.name)
+
+    # Bring every timer up to date now: after a resume, wakeups scheduled on the
+    # app clock may be late by the time the device slept
+    def update(self, *args):
+        now = self.clock()
+        for timer in list(self._timers.values()):
+            if not timer.running:
+                continue
+            if timer._deadline - now <= TOLERANCE:
+                timer._complete()
+                if timer.on_tick:
+                    timer.on_tick(timer)
+                if timer.on_complete:
+                    timer.on_complete(timer)
+            elif timer.on_tick:
+                timer.on_tick(timer)
+        self.reschedule()
+
+    # Schedule a single wakeup for the timer that needs one first
+    def reschedule(self):
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
+        wakeups = [timer._next_wakeup() for timer in self._timers.values() if timer.running]
+        if wakeups:
+            self._event = self._schedule_once(self.update, max(0, min(wakeups) - self.clock()))
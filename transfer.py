@@ -0,0 +1,312 @@
+# Streaming import/export of the whole database as CSV files or JSON Lines
+import argparse
+import csv
+import json
+import os
+import time
+
+from database import ConnectionManager, apply_migrations, rebuild_records
+
+# Exported tables in dependency order, with the fields of each record.
+# Muscle groups and exercises are referenced by name, workouts and sessions by their exported key.
+TABLE_FIELDS = {
+    "muscle_groups": ("name",),
+    "exercises": ("muscle_group", "name"),
+    "workouts": ("key", "name", "timer"),
+    "workout_exercises": ("workout", "muscle_group", "exercise", "sets", "reps"),
+    "exercise_weights": ("muscle_group", "exercise", "weight", "last_updated"),
+    "weight_history": ("muscle_group", "exercise", "weight", "recorded_at"),
+    "workout_sessions": ("key", "workout", "started_at", "ended_at", "duration"),
+    "session_sets": ("session", "muscle_group", "exercise", "set_index", "reps", "weight"),
+}
+
+# Queries producing the records of each table, in the order of TABLE_FIELDS
+EXPORT_QUERIES = {
+    "muscle_groups": "SELECT name FROM muscle_groups ORDER BY id",
+    "exercises": """
+        SELECT mg.name, e.name FROM exercises e
+        LEFT JOIN muscle_groups mg ON e.muscle_group_id = mg.id
+        ORDER BY e.id""",
+    "workouts": "SELECT id, name, timer FROM workouts ORDER BY id",
+    "workout_exercises": """
+        SELECT we.workout_id, mg.name, e.name, we.sets, we.reps FROM workout_exercises we
+        JOIN exercises e ON we.exercise_id = e.id
+        LEFT JOIN muscle_groups mg ON e.muscle_group_id = mg.id
+        ORDER BY we.id""",
+    "exercise_weights": """
+        SELECT mg.name, e.name, ew.weight, ew.last_updated FROM exercise_weights ew
+        JOIN exercises e ON ew.exercise_id = e.id
+        LEFT JOIN muscle_groups mg ON e.muscle_group_id = mg.id
+        ORDER BY ew.id""",
+    "weight_history": """
+        SELECT mg.name, e.name, wh.weight, wh.recorded_at FROM weight_history wh
+        LEFT JOIN exercises e ON wh.exercise_id = e.id
+        LEFT JOIN muscle_groups mg ON e.muscle_group_id = mg.id
+        ORDER BY wh.id""",
+    "workout_sessions": """
+        SELECT id, workout_id, started_at, ended_at, duration FROM workout_sessions
+        ORDER BY id""",
+    "session_sets": """
+        SELECT ss.session_id, mg.name, e.name, ss.set_index, ss.reps, ss.weight FROM session_sets ss
+        LEFT JOIN exercises e ON ss.exercise_id = e.id
+        LEFT JOIN muscle_groups mg ON e.muscle_group_id = mg.id
+        ORDER BY ss.id""",
+}
+
+# Rows written per transaction during import
+IMPORT_BATCH_SIZE = 10000
+
+
+# Yield every record of the database as a dict with a "table" key
+def iter_records(conn):
+    for table, fields in TABLE_FIELDS.items():
+        for row in conn.execute(EXPORT_QUERIES[table]):
+            record = {"table": table}
+            record.update(zip(fields, row))
+            yield record
+
+
+# Write all records to a JSON Lines file, returning the number of records written
+def export_jsonl(conn, path):
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for record in iter_records(conn):
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
+
+
+# Write one CSV file per table into a directory, returning the number of records written
+def export_csv(conn, directory):
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    for table, fields in TABLE_FIELDS.items():
+        with open(os.path.join(directory, f"{table}.csv"), "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(fields)
+            for row in conn.execute(EXPORT_QUERIES[table]):
+                writer.writerow(row)
+                count += 1
+    return count
+
+
+# Read records back from a JSON Lines file one line at a time
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+# Read records back from a directory of per-table CSV files, in dependency order
+def read_csv(directory):
+    for table in TABLE_FIELDS:
+        path = os.path.join(directory, f"{table}.csv")
+        if not os.path.exists(path):
+            continue
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                # Empty CSV cells stand for NULL
+                record = {key: (value if value != "" else None) for key, value in row.items()}
+                record["table"] = table
+                yield record
+
+
+def _int(value):
+    return None if value is None else int(float(value))
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+# Batched importer resolving names and keys through in-memory maps
+class Importer:
+    INSERTS = {
+        "muscle_groups": "INSERT INTO muscle_groups (id, name) VALUES (?, ?)",
+        "exercises": "INSERT INTO exercises (id, name, muscle_group_id) VALUES (?, ?, ?)",
+        "workouts": "INSERT INTO workouts (id, name, timer) VALUES (?, ?, ?)",
+        "workout_exercises": """INSERT INTO workout_exercises (workout_id, exercise_id, sets, reps)
+                                VALUES (?, ?, ?, ?)""",
+        "weight_history": """INSERT INTO weight_history (exercise_id, weight, recorded_at)
+                             VALUES (?, ?, ?)""",
+        "exercise_weights": """INSERT INTO exercise_weights (exercise_id, weight, last_updated)
+                               VALUES (?, ?, ?)
+                               ON CONFLICT (exercise_id) DO UPDATE
+                               SET weight = excluded.weight, last_updated = excluded.last_updated
+                               WHERE excluded.last_updated >= exercise_weights.last_updated""",
+        "workout_sessions": """INSERT INTO workout_sessions (id, workout_id, started_at, ended_at, duration)
+                               VALUES (?, ?, ?, ?, ?)""",
+        "session_sets": """INSERT INTO session_sets (session_id, exercise_id, set_index, reps, weight)
+                           VALUES (?, ?, ?, ?, ?)""",
+    }
+
+    def __init__(self, conn, batch_size=IMPORT_BATCH_SIZE):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.counts = dict.fromkeys(TABLE_FIELDS, 0)
+        self._batches = {table: [] for table in self.INSERTS}
+        self._pending = 0
+        self._groups = {name: gid for gid, name in conn.execute("SELECT id, name FROM muscle_groups")}
+        self._exercises = {
+            (group_id, name): eid
+            for eid, name, group_id in conn.execute("SELECT id, name, muscle_group_id FROM exercises")
+        }
+        self._workouts = {}
+        self._sessions = {}
+        self._next_ids = {
+            table: (conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0] + 1)
+            for table in ("muscle_groups", "exercises", "workouts", "workout_sessions")
+        }
+
+    # Import a stream of records, committing every batch_size rows
+    def run(self, records):
+        for record in records:
+            self.add(record)
+        self.flush()
+        return self.counts
+
+    # Queue one record for insertion
+    def add(self, record):
+        table = record.get("table")
+        if table == "muscle_groups":
+            self._group_id(record["name"])
+        elif table == "exercises":
+            self._exercise_id(record["muscle_group"], record["name"])
+        elif table == "workouts":
+            workout_id = self._new_id("workouts")
+            self._workouts[str(record["key"])] = workout_id
+            self._queue(table, (workout_id, record["name"], _int(record["timer"])))
+        elif table == "workout_exercises":
+            workout_id = self._workouts.get(str(record["workout"]))
+            if workout_id is None:
+                print(f"Skipping workout exercise of unknown workout {record['workout']}")
+                return
+            self._queue(table, (
+                workout_id,
+                self._exercise_id(record["muscle_group"], record["exercise"]),
+                _int(record["sets"]),
+                _int(record["reps"]),
+            ))
+        elif table == "exercise_weights":
+            self._queue(table, (
+                self._exercise_id(record["muscle_group"], record["exercise"]),
+                _float(record["weight"]),
+                record["last_updated"],
+            ))
+        elif table == "weight_history":
+            self._queue(table, (
+                self._history_exercise_id(record),
+                _float(record["weight"]),
+                _float(record["recorded_at"]),
+            ))
+        elif table == "workout_sessions":
+            session_id = self._new_id("workout_sessions")
+            self._sessions[str(record["key"])] = session_id
+            self._queue(table, (
+                session_id,
+                self._workouts.get(str(record["workout"])),
+                _float(record["started_at"]),
+                _float(record["ended_at"]),
+                _int(record["duration"]),
+            ))
+        elif table == "session_sets":
+            session_id = self._sessions.get(str(record["session"]))
+            if session_id is None:
+                print(f"Skipping set of unknown session {record['session']}")
+                return
+            self._queue(table, (
+                session_id,
+                self._history_exercise_id(record),
+                _int(record["set_index"]),
+                _int(record["reps"]),
+                _float(record["weight"]),
+            ))
+        else:
+            print(f"Skipping record of unknown table {table}")
+            return
+        self.counts[table] += 1
+
+    # Write queued rows in dependency order and commit them as one transaction
+    def flush(self):
+        for table, rows in self._batches.items():
+            if rows:
+                self.conn.executemany(self.INSERTS[table], rows)
+                rows.clear()
+        self.conn.commit()
+        self._pending = 0
+
+    def _queue(self, table, row):
+        self._batches[table].append(row)
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def _new_id(self, table):
+        new_id = self._next_ids[table]
+        self._next_ids[table] = new_id + 1
+        return new_id
+
+    # Muscle group id by name, created if missing
+    def _group_id(self, name):
+        if name is None:
+            return None
+        group_id = self._groups.get(name)
+        if group_id is None:
+            group_id = self._groups[name] = self._new_id("muscle_groups")
+            self._queue("muscle_groups", (group_id, name))
+        return group_id
+
+    # Exercise id by muscle group and exercise name, created if missing
+    def _exercise_id(self, group_name, name):
+        group_id = self._group_id(group_name)
+        exercise_id = self._exercises.get((group_id, name))
+        if exercise_id is None:
+            exercise_id = self._exercises[(group_id, name)] = self._new_id("exercises")
+            self._queue("exercises", (exercise_id, name, group_id))
+        return exercise_id
+
+    # Exercise id of a history record, None for the history of a deleted exercise
+    def _history_exercise_id(self, record):
+        if record["muscle_group"] is None and record["exercise"] is None:
+            return None
+        return self._exercise_id(record["muscle_group"], record["exercise"])
+
+
+# Guess the file format from the path: JSON Lines files or a directory of CSV files
+def detect_format(path):
+    return "jsonl" if path.endswith((".jsonl", ".json")) else "csv"
+
+
+# Command-line entry point: main.py export|import PATH [--format csv|jsonl] [--db FILE]
+# or main.py rebuild-records [--db FILE]
+def run_cli(argv):
+    parser = argparse.ArgumentParser(prog="main.py", description="Import, export or maintain the workout database")
+    parser.add_argument("command", choices=("import", "export", "rebuild-records"),
+                        help="rebuild-records recomputes the personal records from the saved data")
+    parser.add_argument("path", nargs="?", help="JSON Lines file or directory of CSV files")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="defaults to the path extension")
+    parser.add_argument("--db", default="workout.db", help="database file (default: workout.db)")
+    args = parser.parse_args(argv)
+    if args.command != "rebuild-records" and not args.path:
+        parser.error(f"{args.command} needs a path")
+
+    db = ConnectionManager(args.db)
+    start = time.perf_counter()
+    try:
+        with db.writer() as conn:
+            apply_migrations(conn)
+            if args.command == "rebuild-records":
+                count = rebuild_records(conn)
+            elif args.command == "export":
+                fmt = args.format or detect_format(args.path)
+                count = export_jsonl(conn, args.path) if fmt == "jsonl" else export_csv(conn, args.path)
+            else:
+                fmt = args.format or detect_format(args.path)
+                records = read_jsonl(args.path) if fmt == "jsonl" else read_csv(args.path)
+                count = sum(Importer(conn).run(records).values())
+    finally:
+        db.close()
+    print(f"{args.command}: {count} records in {time.perf_counter() - start:.2f}s")
+    return 0